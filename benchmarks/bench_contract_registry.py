@@ -0,0 +1,164 @@
+# encoding: UTF-8
+"""
+Memory and lookup cost of the code2contract dict of full contract objects
+against the ContractRegistry.
+
+Contracts are synthetic objects carrying the same attributes as Shioaji
+contracts, sized like the TSE+TAIFEX universe by default.
+
+    python benchmarks/bench_contract_registry.py --output registry.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from time import perf_counter
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shim  # noqa: E402
+
+shim.install()
+
+from bench_contract_snapshot import make_contracts  # noqa: E402
+from sinopac.contract_registry import ContractRegistry  # noqa: E402
+from sinopac.contract_snapshot import (  # noqa: E402
+    contract_to_row,
+    PRODUCT_FUTURES,
+    PRODUCT_OPTION,
+    PRODUCT_STOCK
+)
+
+
+def make_full_contract(contract) -> SimpleNamespace:
+    """
+    Copy of a synthetic contract with the remaining Shioaji contract fields.
+    """
+    return SimpleNamespace(
+        exchange="TAIFEX",
+        symbol=f"{contract.category}{contract.code}",
+        update_date="2019/05/16",
+        limit_up=float(len(contract.code) * 1000),
+        limit_down=float(len(contract.code) * 100),
+        reference=float(len(contract.code) * 500),
+        day_trade="Yes",
+        margin_trading_balance=0,
+        short_selling_balance=0,
+        underlying_kind="I",
+        security_type="FUT",
+        **vars(contract)
+    )
+
+
+def measure(build) -> tuple:
+    """
+    Bytes still allocated by build once it returned.
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+    result = build()
+    end = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    size = sum(stat.size_diff for stat in end.compare_to(start, "filename"))
+    return result, size
+
+
+def best_of(func, repeat: int = 5) -> float:
+    """"""
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        timings.append(perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    """"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--futures", type=int, default=2000)
+    parser.add_argument("--options", type=int, default=20000)
+    parser.add_argument("--stocks", type=int, default=30000)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    contracts = make_contracts(args.futures, args.options, args.stocks)
+    groups = (
+        (PRODUCT_FUTURES, contracts.Futures),
+        (PRODUCT_OPTION, contracts.Options),
+        (PRODUCT_STOCK, contracts.Stocks),
+    )
+
+    def build_dict():
+        return {
+            contract.code: make_full_contract(contract)
+            for _, group in groups
+            for category in group
+            for contract in category
+        }
+
+    def build_registry():
+        registry = ContractRegistry()
+        registry.load(
+            contract_to_row(contract, product)
+            for product, group in groups
+            for category in group
+            for contract in category
+        )
+        return registry
+
+    code2contract, dict_bytes = measure(build_dict)
+    registry, registry_bytes = measure(build_registry)
+
+    def scan_chain():
+        return sorted(
+            (
+                c for c in code2contract.values()
+                if getattr(c, "underlying_code", "") == "TXFF9"
+            ),
+            key=lambda c: (c.delivery_month, float(c.strike_price), c.option_right)
+        )
+
+    def scan_option():
+        return next(
+            c for c in code2contract.values()
+            if getattr(c, "underlying_code", "") == "TXFF9"
+            and c.delivery_month == "201906"
+            and c.strike_price == 10500
+            and c.option_right == "P"
+        )
+
+    chain_scan_s = best_of(scan_chain)
+    chain_index_s = best_of(lambda: registry.get_option_chain("TXFF9"))
+    assert len(scan_chain()) == len(registry.get_option_chain("TXFF9"))
+
+    option_scan_s = best_of(scan_option)
+    option_index_s = best_of(
+        lambda: registry.get_option("TXFF9", "201906", 10500, "P"))
+    assert scan_option().code == registry.get_option("TXFF9", "201906", 10500, "P").code
+
+    result = {
+        "contracts": len(registry),
+        "code2contract_bytes": dict_bytes,
+        "registry_bytes": registry_bytes,
+        "option_chain_scan_s": chain_scan_s,
+        "option_chain_index_s": chain_index_s,
+        "option_lookup_scan_s": option_scan_s,
+        "option_lookup_index_s": option_index_s,
+    }
+    print(json.dumps(result, indent=4))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
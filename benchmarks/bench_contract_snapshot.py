@@ -0,0 +1,116 @@
+# encoding: UTF-8
+"""
+Cold vs warm startup of SinopacGateway.query_contract.
+
+Cold: contract master walked from api.Contracts, snapshot written.
+Warm: contract master loaded from the snapshot of the same trading day.
+
+    python benchmarks/bench_contract_snapshot.py --stocks 30000
+"""
+
+import argparse
+import json
+import os
+import sys
+from time import perf_counter, sleep
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shim  # noqa: E402
+
+shim.install()
+
+from sinopac import SinopacGateway  # noqa: E402
+from sinopac.contract_snapshot import ContractSnapshot  # noqa: E402
+
+
+def make_contracts(futures: int, options: int, stocks: int):
+    """
+    Fake api.Contracts holding the requested number of contracts.
+    """
+    def chunk(items, size=100):
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
+    future_list = [
+        SimpleNamespace(
+            code=f"F{i:05d}", name=f"期貨{i}", category=f"F{i // 12:03d}",
+            delivery_month=f"2019{i % 12 + 1:02d}", unit=1.0
+        )
+        for i in range(futures)
+    ]
+    option_list = [
+        SimpleNamespace(
+            code=f"TXO{10000 + i // 2}{'AB'[i % 2]}9", name="臺指選擇權",
+            category="TXO", delivery_month="201906", unit=0.1,
+            strike_price=10000 + i // 2, underlying_code="TXFF9",
+            option_right="CP"[i % 2]
+        )
+        for i in range(options)
+    ]
+    stock_list = [
+        SimpleNamespace(
+            code=f"{1000 + i}", name=f"股票{i}", category="24",
+            delivery_month="", unit=0.01
+        )
+        for i in range(stocks)
+    ]
+    return SimpleNamespace(
+        Futures=chunk(future_list),
+        Options=chunk(option_list),
+        Stocks=chunk(stock_list),
+    )
+
+
+def run_startup(contracts, snapshot_path: str, total: int) -> dict:
+    """"""
+    event_engine = shim.EventEngine()
+    gateway = SinopacGateway(event_engine)
+    gateway.api = SimpleNamespace(Contracts=contracts)
+    gateway.contract_snapshot = ContractSnapshot(snapshot_path)
+
+    start = perf_counter()
+    gateway.query_contract()
+    ready = perf_counter() - start
+
+    while event_engine.count < total:
+        sleep(0.001)
+    emitted = perf_counter() - start
+
+    return {"ready_s": ready, "all_emitted_s": emitted}
+
+
+def main():
+    """"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--futures", type=int, default=2000)
+    parser.add_argument("--options", type=int, default=20000)
+    parser.add_argument("--stocks", type=int, default=30000)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    contracts = make_contracts(args.futures, args.options, args.stocks)
+    total = args.futures + args.options + args.stocks
+    snapshot_path = str(shim.TEMP_DIR.joinpath("sinopac_contracts.pkl"))
+    if os.path.exists(snapshot_path):
+        os.remove(snapshot_path)
+
+    # query_contract writes one log event besides the contracts.
+    cold = run_startup(contracts, snapshot_path, total + 1)
+    warm = run_startup(contracts, snapshot_path, total + 1)
+
+    result = {
+        "contracts": total,
+        "snapshot_bytes": os.path.getsize(snapshot_path),
+        "cold": cold,
+        "warm": warm,
+    }
+    print(json.dumps(result, indent=4))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+# encoding: UTF-8
+"""
+Benchmarks of the quote decoding hot path.
+
+Every case replays synthetic Shioaji payloads into one handler
+(quote_futures_Q, qutote_futures_L, quote_stock_MKT, qute_stock_QUT) or
+into the whole quote_callback, for several symbol counts and message
+mixes, and reports:
+
+    msgs_per_sec            throughput of a tight loop
+    p50/p90/p99/max_us      per-message latency
+    alloc_objects_per_msg   GC-tracked objects still alive after the call
+    alloc_bytes_per_msg     bytes still allocated after the call
+    peak_bytes_per_msg      peak bytes allocated during the call
+    gc_per_1k_msgs          generation 0 collections per 1000 messages
+
+Surviving allocations are counted with every emitted event retained, i.e.
+they are what strategies receive and the garbage collector has to track.
+Transient allocations (peak bytes, collections) are measured without
+retaining events: peak_bytes_per_msg also includes the temporaries freed
+before the call returned, which alloc_bytes_per_msg cannot show. It needs
+tracemalloc.reset_peak (Python 3.9+) and is None otherwise.
+
+    python benchmarks/bench_quote.py --output bench.json
+    python benchmarks/bench_quote.py --compare bench.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime
+from time import perf_counter_ns
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shim  # noqa: E402
+
+shim.install()
+
+from sinopac import SinopacGateway  # noqa: E402
+from sinopac.contract_snapshot import (  # noqa: E402
+    ContractRow,
+    PRODUCT_FUTURES,
+    PRODUCT_STOCK
+)
+from sinopac.replay import ReplayShioaji, synthetic_payloads  # noqa: E402
+
+
+HANDLER_MIXES = {
+    "quote_futures_Q": {"Q": 1},
+    "qutote_futures_L": {"L": 1},
+    "quote_stock_MKT": {"MKT": 1},
+    "qute_stock_QUT": {"QUT": 1},
+}
+
+CALLBACK_MIXES = {
+    "futures": {"L": 1, "Q": 3},
+    "stocks": {"MKT": 1, "QUT": 3},
+    "mixed": {"L": 1, "Q": 3, "MKT": 1, "QUT": 3},
+}
+
+
+class RetainingEngine:
+    """
+    Event engine keeping (or only counting) every event put into it.
+    """
+
+    def __init__(self):
+        self.retain = False
+        self.events = []
+        self.count = 0
+
+    def put(self, event):
+        self.count += 1
+        if self.retain:
+            self.events.append(event)
+
+    def register(self, type, handler):
+        pass
+
+    def unregister(self, type, handler):
+        pass
+
+
+def make_codes(mix: dict, symbols: int) -> tuple:
+    """"""
+    has_futures = "L" in mix or "Q" in mix
+    has_stocks = "MKT" in mix or "QUT" in mix
+    if has_futures and has_stocks:
+        future_count = max(symbols // 2, 1)
+        stock_count = max(symbols - future_count, 1)
+    else:
+        future_count = symbols if has_futures else 0
+        stock_count = symbols if has_stocks else 0
+
+    futures = [f"F{i:04d}" for i in range(future_count)]
+    stocks = [f"{1000 + i}" for i in range(stock_count)]
+    return futures, stocks
+
+
+def make_gateway(futures: list, stocks: list):
+    """"""
+    rows = [
+        ContractRow(code, code, PRODUCT_FUTURES, "F", "201906", 1.0, 0, "", "")
+        for code in futures
+    ]
+    rows += [
+        ContractRow(code, code, PRODUCT_STOCK, "", "", 0.01, 0, "", "")
+        for code in stocks
+    ]
+
+    event_engine = RetainingEngine()
+    gateway = SinopacGateway(event_engine, api=ReplayShioaji(contracts=rows))
+    gateway.contract_registry.load(rows)
+    return gateway, event_engine
+
+
+def make_calls(gateway, handler: str, payloads: list) -> list:
+    """
+    (function, args) of every message, resolved before timing.
+    """
+    if handler == "quote_callback":
+        func = gateway.quote_callback
+        return [(func, (topic, data)) for _, topic, data in payloads]
+
+    func = getattr(gateway, handler)
+    if handler in ("quote_stock_MKT", "qute_stock_QUT"):
+        return [(func, (topic.rsplit("/", 1)[1], data)) for _, topic, data in payloads]
+    return [(func, (data,)) for _, topic, data in payloads]
+
+
+def run_case(handler: str, mix_name: str, mix: dict, symbols: int, messages: int) -> dict:
+    """"""
+    futures, stocks = make_codes(mix, symbols)
+    gateway, event_engine = make_gateway(futures, stocks)
+
+    payloads = list(synthetic_payloads(futures, stocks, size=messages, mix=mix))
+    calls = make_calls(gateway, handler, payloads)
+
+    # Warm up: create the cached tick of every symbol.
+    for func, args in calls[:max(symbols * 4, 1000)]:
+        func(*args)
+
+    # Throughput
+    gc.collect()
+    start = perf_counter_ns()
+    for func, args in calls:
+        func(*args)
+    elapsed = perf_counter_ns() - start
+
+    # Latency
+    latencies = []
+    append = latencies.append
+    for func, args in calls:
+        t0 = perf_counter_ns()
+        func(*args)
+        append(perf_counter_ns() - t0)
+    latencies.sort()
+
+    # Allocations surviving the call
+    gc.collect()
+    gc.disable()
+    event_engine.retain = True
+    objects_before = len(gc.get_objects())
+    tracemalloc.start()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    for func, args in calls:
+        func(*args)
+    memory_after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    objects_after = len(gc.get_objects())
+    event_engine.retain = False
+    event_engine.events.clear()
+    gc.enable()
+
+    # Transient allocations
+    gc.collect()
+    collections_before = gc.get_stats()[0]["collections"]
+    for func, args in calls:
+        func(*args)
+    collections = gc.get_stats()[0]["collections"] - collections_before
+
+    peak_bytes = None
+    reset_peak = getattr(tracemalloc, "reset_peak", None)
+    if reset_peak:
+        peak_bytes = 0
+        tracemalloc.start()
+        get_traced_memory = tracemalloc.get_traced_memory
+        for func, args in calls:
+            reset_peak()
+            current = get_traced_memory()[0]
+            func(*args)
+            peak_bytes += get_traced_memory()[1] - current
+        tracemalloc.stop()
+
+    gateway.close()
+
+    def percentile(p):
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] / 1000
+
+    return {
+        "handler": handler,
+        "mix": mix_name,
+        "symbols": symbols,
+        "messages": messages,
+        "msgs_per_sec": messages / (elapsed / 1e9),
+        "p50_us": percentile(0.50),
+        "p90_us": percentile(0.90),
+        "p99_us": percentile(0.99),
+        "max_us": latencies[-1] / 1000,
+        "alloc_objects_per_msg": (objects_after - objects_before) / messages,
+        "alloc_bytes_per_msg": (memory_after - memory_before) / messages,
+        "peak_bytes_per_msg": peak_bytes / messages if peak_bytes is not None else None,
+        "gc_per_1k_msgs": collections * 1000 / messages,
+    }
+
+
+def get_meta() -> dict:
+    """"""
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        commit = ""
+
+    return {
+        "commit": commit,
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def get_key(result: dict) -> tuple:
+    """"""
+    return (result["handler"], result["mix"], result["symbols"])
+
+
+def print_results(results: list, baseline: dict = None):
+    """"""
+    header = f"{'handler':<18}{'mix':<10}{'symbols':>8}{'msgs/s':>12}" \
+             f"{'p50us':>8}{'p99us':>8}{'maxus':>9}{'objs':>7}{'bytes':>8}" \
+             f"{'peak':>8}{'gc/1k':>7}"
+    if baseline:
+        header += f"{'vs base':>9}"
+    print(header)
+
+    for result in results:
+        line = (
+            f"{result['handler']:<18}{result['mix']:<10}{result['symbols']:>8}"
+            f"{result['msgs_per_sec']:>12,.0f}{result['p50_us']:>8.2f}"
+            f"{result['p99_us']:>8.2f}{result['max_us']:>9.1f}"
+            f"{result['alloc_objects_per_msg']:>7.2f}{result['alloc_bytes_per_msg']:>8.0f}"
+        )
+        peak = result.get("peak_bytes_per_msg", None)
+        line += f"{peak:>8.0f}" if peak is not None else f"{'-':>8}"
+        line += f"{result.get('gc_per_1k_msgs', 0):>7.2f}"
+        if baseline:
+            base = baseline.get(get_key(result), None)
+            if base:
+                ratio = result["msgs_per_sec"] / base["msgs_per_sec"] - 1
+                line += f"{ratio:>+9.1%}"
+        print(line)
+
+
+def main():
+    """"""
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, nargs="+", default=[1, 100, 2000])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument(
+        "--handlers", nargs="+",
+        default=list(HANDLER_MIXES) + ["quote_callback"],
+        choices=list(HANDLER_MIXES) + ["quote_callback"])
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    args = parser.parse_args()
+
+    cases = []
+    for handler in args.handlers:
+        if handler == "quote_callback":
+            cases += [(handler, name, mix) for name, mix in CALLBACK_MIXES.items()]
+        else:
+            mix = HANDLER_MIXES[handler]
+            cases.append((handler, next(iter(mix)), mix))
+
+    results = []
+    for handler, mix_name, mix in cases:
+        for symbols in args.symbols:
+            results.append(run_case(handler, mix_name, mix, symbols, args.messages))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {get_key(result): result for result in json.load(f)["results"]}
+
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"meta": get_meta(), "results": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,513 @@
+# encoding: UTF-8
+"""
+Minimal stand-ins for the parts of vnpy and shioaji imported by the
+gateway, so the benchmarks can run on a machine without either package.
+Real packages are always preferred when they are importable.
+"""
+
+import sys
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from types import ModuleType
+
+
+TEMP_DIR = Path(tempfile.mkdtemp(prefix="sinopac_bench_"))
+
+
+class Direction(Enum):
+    LONG = "多"
+    SHORT = "空"
+    NET = "净"
+
+
+class Offset(Enum):
+    NONE = ""
+    OPEN = "开"
+    CLOSE = "平"
+    CLOSETODAY = "平今"
+    CLOSEYESTERDAY = "平昨"
+
+
+class Status(Enum):
+    SUBMITTING = "提交中"
+    NOTTRADED = "未成交"
+    PARTTRADED = "部分成交"
+    ALLTRADED = "全部成交"
+    CANCELLED = "已撤销"
+    REJECTED = "拒单"
+
+
+class Product(Enum):
+    EQUITY = "股票"
+    FUTURES = "期货"
+    OPTION = "期权"
+
+
+class OrderType(Enum):
+    LIMIT = "限价"
+    MARKET = "市价"
+
+
+class OptionType(Enum):
+    CALL = "看涨期权"
+    PUT = "看跌期权"
+
+
+class Exchange(Enum):
+    TSE = "TSE"
+    TFE = "TFE"
+
+
+class Interval(Enum):
+    MINUTE = "1m"
+    HOUR = "1h"
+    DAILY = "d"
+    WEEKLY = "w"
+
+
+ACTIVE_STATUSES = {Status.SUBMITTING, Status.NOTTRADED, Status.PARTTRADED}
+
+
+@dataclass
+class BaseData:
+    gateway_name: str
+
+
+@dataclass
+class TickData(BaseData):
+    symbol: str
+    exchange: Exchange
+    datetime: datetime
+
+    name: str = ""
+    volume: float = 0
+    open_interest: float = 0
+    last_price: float = 0
+    last_volume: float = 0
+    limit_up: float = 0
+    limit_down: float = 0
+
+    open_price: float = 0
+    high_price: float = 0
+    low_price: float = 0
+    pre_close: float = 0
+
+    bid_price_1: float = 0
+    bid_price_2: float = 0
+    bid_price_3: float = 0
+    bid_price_4: float = 0
+    bid_price_5: float = 0
+
+    ask_price_1: float = 0
+    ask_price_2: float = 0
+    ask_price_3: float = 0
+    ask_price_4: float = 0
+    ask_price_5: float = 0
+
+    bid_volume_1: float = 0
+    bid_volume_2: float = 0
+    bid_volume_3: float = 0
+    bid_volume_4: float = 0
+    bid_volume_5: float = 0
+
+    ask_volume_1: float = 0
+    ask_volume_2: float = 0
+    ask_volume_3: float = 0
+    ask_volume_4: float = 0
+    ask_volume_5: float = 0
+
+    def __post_init__(self):
+        self.vt_symbol = f"{self.symbol}.{self.exchange.value}"
+
+
+@dataclass
+class BarData(BaseData):
+    symbol: str
+    exchange: Exchange
+    datetime: datetime
+
+    interval: Interval = None
+    volume: float = 0
+    open_interest: float = 0
+    open_price: float = 0
+    high_price: float = 0
+    low_price: float = 0
+    close_price: float = 0
+
+    def __post_init__(self):
+        self.vt_symbol = f"{self.symbol}.{self.exchange.value}"
+
+
+@dataclass
+class OrderData(BaseData):
+    symbol: str
+    exchange: Exchange
+    orderid: str
+
+    type: OrderType = OrderType.LIMIT
+    direction: Direction = ""
+    offset: Offset = Offset.NONE
+    price: float = 0
+    volume: float = 0
+    traded: float = 0
+    status: Status = Status.SUBMITTING
+    time: str = ""
+
+    def __post_init__(self):
+        self.vt_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.vt_orderid = f"{self.gateway_name}.{self.orderid}"
+
+    def is_active(self):
+        return self.status in ACTIVE_STATUSES
+
+
+@dataclass
+class TradeData(BaseData):
+    symbol: str
+    exchange: Exchange
+    orderid: str
+    tradeid: str
+    direction: Direction = ""
+
+    offset: Offset = Offset.NONE
+    price: float = 0
+    volume: float = 0
+    time: str = ""
+
+    def __post_init__(self):
+        self.vt_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.vt_orderid = f"{self.gateway_name}.{self.orderid}"
+        self.vt_tradeid = f"{self.gateway_name}.{self.tradeid}"
+
+
+@dataclass
+class PositionData(BaseData):
+    symbol: str
+    exchange: Exchange
+    direction: Direction
+
+    volume: float = 0
+    frozen: float = 0
+    price: float = 0
+    pnl: float = 0
+    yd_volume: float = 0
+
+    def __post_init__(self):
+        self.vt_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.vt_positionid = f"{self.vt_symbol}.{self.direction.value}"
+
+
+@dataclass
+class AccountData(BaseData):
+    accountid: str
+
+    balance: float = 0
+    frozen: float = 0
+
+    def __post_init__(self):
+        self.available = self.balance - self.frozen
+        self.vt_accountid = f"{self.gateway_name}.{self.accountid}"
+
+
+@dataclass
+class LogData(BaseData):
+    msg: str
+    level: int = 20
+
+
+@dataclass
+class ContractData(BaseData):
+    symbol: str
+    exchange: Exchange
+    name: str
+    product: Product
+    size: int
+    pricetick: float
+
+    min_volume: float = 1
+    stop_supported: bool = False
+    net_position: bool = False
+    history_data: bool = False
+
+    option_strike: float = 0
+    option_underlying: str = ""
+    option_type: OptionType = None
+    option_expiry: datetime = None
+
+    def __post_init__(self):
+        self.vt_symbol = f"{self.symbol}.{self.exchange.value}"
+
+
+@dataclass
+class SubscribeRequest:
+    symbol: str
+    exchange: Exchange
+
+    def __post_init__(self):
+        self.vt_symbol = f"{self.symbol}.{self.exchange.value}"
+
+
+@dataclass
+class OrderRequest:
+    symbol: str
+    exchange: Exchange
+    direction: Direction
+    type: OrderType
+    volume: float
+    price: float = 0
+    offset: Offset = Offset.NONE
+
+    def __post_init__(self):
+        self.vt_symbol = f"{self.symbol}.{self.exchange.value}"
+
+    def create_order_data(self, orderid, gateway_name):
+        return OrderData(
+            symbol=self.symbol,
+            exchange=self.exchange,
+            orderid=orderid,
+            type=self.type,
+            direction=self.direction,
+            offset=self.offset,
+            price=self.price,
+            volume=self.volume,
+            gateway_name=gateway_name,
+        )
+
+
+@dataclass
+class CancelRequest:
+    orderid: str
+    symbol: str
+    exchange: Exchange
+
+    def __post_init__(self):
+        self.vt_symbol = f"{self.symbol}.{self.exchange.value}"
+
+
+@dataclass
+class HistoryRequest:
+    symbol: str
+    exchange: Exchange
+    start: datetime
+    end: datetime = None
+    interval: Interval = None
+
+    def __post_init__(self):
+        self.vt_symbol = f"{self.symbol}.{self.exchange.value}"
+
+
+class Event:
+    def __init__(self, type, data=None):
+        self.type = type
+        self.data = data
+
+
+class EventEngine:
+    """
+    Records the number of events instead of dispatching them, which keeps
+    the measured cost limited to the gateway itself.
+    """
+
+    def __init__(self, interval=1):
+        self.count = 0
+        self.handlers = {}
+
+    def put(self, event):
+        self.count += 1
+
+    def register(self, type, handler):
+        self.handlers.setdefault(type, []).append(handler)
+
+    def unregister(self, type, handler):
+        if handler in self.handlers.get(type, []):
+            self.handlers[type].remove(handler)
+
+
+class BaseGateway:
+    default_setting = {}
+    exchanges = []
+
+    def __init__(self, event_engine, gateway_name):
+        self.event_engine = event_engine
+        self.gateway_name = gateway_name
+
+    def on_event(self, type, data=None):
+        self.event_engine.put(Event(type, data))
+
+    def on_tick(self, tick):
+        self.on_event("eTick.", tick)
+        self.on_event("eTick." + tick.vt_symbol, tick)
+
+    def on_trade(self, trade):
+        self.on_event("eTrade.", trade)
+
+    def on_order(self, order):
+        self.on_event("eOrder.", order)
+
+    def on_position(self, position):
+        self.on_event("ePosition.", position)
+
+    def on_account(self, account):
+        self.on_event("eAccount.", account)
+
+    def on_contract(self, contract):
+        self.on_event("eContract.", contract)
+
+    def on_log(self, log):
+        self.on_event("eLog", log)
+
+    def write_log(self, msg):
+        self.on_log(LogData(msg=msg, gateway_name=self.gateway_name))
+
+    def send_orders(self, reqs):
+        return [self.send_order(req) for req in reqs]
+
+    def cancel_orders(self, reqs):
+        for req in reqs:
+            self.cancel_order(req)
+
+    def query_history(self, req):
+        pass
+
+
+def get_folder_path(folder_name):
+    folder_path = TEMP_DIR.joinpath(folder_name)
+    folder_path.mkdir(parents=True, exist_ok=True)
+    return folder_path
+
+
+def get_file_path(filename):
+    return TEMP_DIR.joinpath(filename)
+
+
+class SinopacStatus(str, Enum):
+    Cancelled = "Cancelled"
+    Filled = "Filled"
+    Filling = "Filling"
+    Inactive = "Inactive"
+    Failed = "Failed"
+    PendingSubmit = "PendingSubmit"
+    PreSubmitted = "PreSubmitted"
+    Submitted = "Submitted"
+
+
+class Account:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class StockAccount(Account):
+    pass
+
+
+class FutureAccount(Account):
+    pass
+
+
+class Shioaji:
+    def __init__(self, *args, **kwargs):
+        self.quote = None
+
+
+def make_module(name, **attrs):
+    """"""
+    module = ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+def install_vnpy():
+    """"""
+    vnpy = make_module("vnpy")
+    vnpy.event = make_module(
+        "vnpy.event",
+        Event=Event,
+        EventEngine=EventEngine,
+        EVENT_TIMER="eTimer",
+    )
+    vnpy.trader = make_module("vnpy.trader")
+    vnpy.trader.constant = make_module(
+        "vnpy.trader.constant",
+        Direction=Direction,
+        Offset=Offset,
+        Status=Status,
+        Product=Product,
+        OrderType=OrderType,
+        OptionType=OptionType,
+        Exchange=Exchange,
+        Interval=Interval,
+    )
+    vnpy.trader.event = make_module(
+        "vnpy.trader.event",
+        EVENT_TIMER="eTimer",
+        EVENT_TICK="eTick.",
+        EVENT_TRADE="eTrade.",
+        EVENT_ORDER="eOrder.",
+        EVENT_POSITION="ePosition.",
+        EVENT_ACCOUNT="eAccount.",
+        EVENT_CONTRACT="eContract.",
+        EVENT_LOG="eLog",
+    )
+    vnpy.trader.gateway = make_module(
+        "vnpy.trader.gateway", BaseGateway=BaseGateway)
+    vnpy.trader.object = make_module(
+        "vnpy.trader.object",
+        TickData=TickData,
+        BarData=BarData,
+        OrderData=OrderData,
+        TradeData=TradeData,
+        PositionData=PositionData,
+        AccountData=AccountData,
+        LogData=LogData,
+        ContractData=ContractData,
+        SubscribeRequest=SubscribeRequest,
+        OrderRequest=OrderRequest,
+        CancelRequest=CancelRequest,
+        HistoryRequest=HistoryRequest,
+    )
+    vnpy.trader.utility = make_module(
+        "vnpy.trader.utility",
+        get_folder_path=get_folder_path,
+        get_file_path=get_file_path,
+    )
+
+
+def install_shioaji():
+    """"""
+    shioaji = make_module("shioaji", Shioaji=Shioaji)
+    shioaji.order = make_module("shioaji.order", Status=SinopacStatus)
+    shioaji.constant = make_module(
+        "shioaji.constant",
+        ACTION_BUY="Buy",
+        ACTION_SELL="Sell",
+        FUTURES_PRICE_TYPE_LMT="LMT",
+        FUTURES_ORDER_TYPE_ROD="ROD",
+        STOCK_PRICE_TYPE_LIMITPRICE="LMT",
+        STOCK_ORDER_TYPE_COMMON="Common",
+        STOCK_FIRST_SELL_YES="true",
+        STOCK_FIRST_SELL_NO="false",
+    )
+    shioaji.account = make_module(
+        "shioaji.account",
+        StockAccount=StockAccount,
+        FutureAccount=FutureAccount,
+    )
+
+
+def install():
+    """
+    Register the stand-in modules for whichever package is missing.
+    """
+    try:
+        import vnpy.trader.gateway  # noqa: F401
+    except ImportError:
+        install_vnpy()
+
+    try:
+        import shioaji  # noqa: F401
+    except ImportError:
+        install_shioaji()
@@ -0,0 +1,213 @@
+# encoding: UTF-8
+
+from datetime import datetime
+from threading import Lock
+from time import monotonic
+
+import numpy as np
+
+from vnpy.trader.constant import Interval
+from vnpy.trader.object import BarData
+
+
+class BarAggregator:
+    """
+    Build OHLCV bars of several lengths (in seconds) for every symbol from
+    trade prints, with the state of all symbols in (symbols, lengths)
+    arrays.
+
+    Volume is the VolSum delta between prints, so no traded volume is
+    lost when prints are conflated or dropped. A VolSum lower than the
+    previous one starts a new session and counts from zero.
+
+    A bar is finished by the first print of a later bar or by flush()
+    once the stream clock (latest exchange time plus elapsed local time)
+    passed its end by grace seconds. Late prints, older than the open bar
+    or belonging to a finished one, add their volume to the open (or next)
+    bar but leave prices untouched.
+    """
+
+    def __init__(
+        self,
+        lengths: list,
+        emit,
+        gateway_name: str,
+        capacity: int = 256,
+        grace: float = 2.0
+    ):
+        """
+        emit(length, bar) is called for every finished bar.
+        """
+        self.lengths = list(lengths)
+        self.length_array = np.asarray(self.lengths, dtype=np.int64)
+        self.emit = emit
+        self.gateway_name = gateway_name
+        self.grace = grace
+
+        self.capacity = 0
+        self.size = 0
+        self.index = {}
+        self.symbols = []
+        self.exchanges = []
+        self.lock = Lock()
+
+        frames = len(self.lengths)
+        self.start = np.zeros((0, frames), dtype=np.int64)
+        self.active = np.zeros((0, frames), dtype=bool)
+        self.prices = np.zeros((0, frames, 4), dtype=np.float64)
+        self.volume = np.zeros((0, frames), dtype=np.float64)
+        self.pending = np.zeros((0, frames), dtype=np.float64)
+        self.last_volsum = np.zeros(0, dtype=np.int64)
+        self.resize(capacity)
+
+        self.clock = 0.0
+        self.clock_time = monotonic()
+
+        self.prints = 0
+        self.late = 0
+        self.resets = 0
+        self.emitted = 0
+
+    def resize(self, capacity: int):
+        """"""
+        for name in ["start", "active", "prices", "volume", "pending"]:
+            array = getattr(self, name)
+            new_array = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            new_array[:len(array)] = array
+            setattr(self, name, new_array)
+
+        last_volsum = np.full(capacity, -1, dtype=np.int64)
+        last_volsum[:len(self.last_volsum)] = self.last_volsum
+        self.last_volsum = last_volsum
+
+        self.capacity = capacity
+
+    def get_row(self, symbol: str, exchange) -> int:
+        """"""
+        row = self.index.get(symbol, None)
+        if row is None:
+            if self.size == self.capacity:
+                self.resize(self.capacity * 2)
+            row = self.size
+            self.index[symbol] = row
+            self.symbols.append(symbol)
+            self.exchanges.append(exchange)
+            self.size += 1
+        return row
+
+    def update(
+        self,
+        symbol: str,
+        exchange,
+        dt: datetime,
+        price: float,
+        volsum: int,
+        volume: int
+    ):
+        """
+        Apply one trade print. volume is the size of the print itself, only
+        used for the first print of a symbol.
+        """
+        timestamp = dt.timestamp()
+        second = int(timestamp)
+
+        with self.lock:
+            self.prints += 1
+            if timestamp > self.clock:
+                self.clock = timestamp
+                self.clock_time = monotonic()
+
+            row = self.get_row(symbol, exchange)
+            last_volsum = self.last_volsum[row]
+            if last_volsum < 0:
+                delta = volume
+            elif volsum < last_volsum:
+                delta = volsum
+                self.resets += 1
+            else:
+                delta = volsum - last_volsum
+            self.last_volsum[row] = volsum
+
+            start = self.start[row]
+            active = self.active[row]
+            prices = self.prices[row]
+            bar_volume = self.volume[row]
+            late = False
+
+            for i, length in enumerate(self.lengths):
+                bar_start = second - second % length
+                current = start[i]
+
+                if bar_start > current:
+                    if active[i]:
+                        self.finish(row, i)
+                    start[i] = bar_start
+                    active[i] = True
+                    prices[i] = price
+                    bar_volume[i] = delta + self.pending[row, i]
+                    self.pending[row, i] = 0
+                elif bar_start == current and active[i]:
+                    bar_prices = prices[i]
+                    if price > bar_prices[1]:
+                        bar_prices[1] = price
+                    if price < bar_prices[2]:
+                        bar_prices[2] = price
+                    bar_prices[3] = price
+                    bar_volume[i] += delta
+                else:
+                    late = True
+                    if active[i]:
+                        bar_volume[i] += delta
+                    else:
+                        self.pending[row, i] += delta
+
+            if late:
+                self.late += 1
+
+    def flush(self):
+        """
+        Finish every bar whose end passed on the stream clock.
+        """
+        with self.lock:
+            if not self.clock:
+                return
+            now = self.clock + monotonic() - self.clock_time
+
+            size = self.size
+            ends = self.start[:size] + self.length_array
+            expired = self.active[:size] & (ends + self.grace <= now)
+            rows, frames = np.nonzero(expired)
+
+            for row, i in zip(rows.tolist(), frames.tolist()):
+                self.finish(row, i)
+
+    def finish(self, row: int, i: int):
+        """"""
+        self.active[row, i] = False
+        length = self.lengths[i]
+        open_price, high_price, low_price, close_price = self.prices[row, i].tolist()
+
+        bar = BarData(
+            symbol=self.symbols[row],
+            exchange=self.exchanges[row],
+            datetime=datetime.fromtimestamp(int(self.start[row, i])),
+            interval=Interval.MINUTE if not length % 60 else None,
+            volume=float(self.volume[row, i]),
+            open_price=open_price,
+            high_price=high_price,
+            low_price=low_price,
+            close_price=close_price,
+            gateway_name=self.gateway_name
+        )
+        self.emitted += 1
+        self.emit(length, bar)
+
+    def get_stats(self) -> dict:
+        """"""
+        return {
+            "symbols": self.size,
+            "prints": self.prints,
+            "late": self.late,
+            "resets": self.resets,
+            "emitted": self.emitted,
+        }
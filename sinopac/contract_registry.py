@@ -0,0 +1,169 @@
+# encoding: UTF-8
+
+from collections import defaultdict
+from sys import intern
+
+from .contract_snapshot import ContractRow, PRODUCT_FUTURES, PRODUCT_OPTION
+
+
+class ContractRegistry:
+    """
+    Compact contract master indexed by code, product, category,
+    underlying, delivery month and option strike/right.
+
+    Every contract is kept as a ContractRow tuple with interned strings
+    instead of a full Shioaji contract object; the secondary indexes only
+    hold the (shared) code strings, as keys of insertion ordered dicts so
+    that replacing a contract on reload is O(1).
+    """
+
+    def __init__(self):
+        """"""
+        self.contracts = {}
+
+        self.by_product = defaultdict(dict)
+        self.by_category = defaultdict(dict)
+        self.by_underlying = defaultdict(dict)
+        self.by_delivery_month = defaultdict(dict)
+        self.by_option_key = {}
+
+    def __len__(self) -> int:
+        """"""
+        return len(self.contracts)
+
+    def __contains__(self, code: str) -> bool:
+        """"""
+        return code in self.contracts
+
+    def clear(self):
+        """"""
+        self.contracts.clear()
+        self.by_product.clear()
+        self.by_category.clear()
+        self.by_underlying.clear()
+        self.by_delivery_month.clear()
+        self.by_option_key.clear()
+
+    def load(self, rows: list):
+        """"""
+        for row in rows:
+            self.add(row)
+
+    def add(self, row: ContractRow):
+        """"""
+        row = ContractRow(
+            code=intern(row.code),
+            name=intern(row.name),
+            product=intern(row.product),
+            category=intern(row.category or ""),
+            delivery_month=intern(row.delivery_month or ""),
+            unit=row.unit,
+            strike_price=row.strike_price,
+            underlying_code=intern(row.underlying_code or ""),
+            option_right=row.option_right,
+        )
+        code = row.code
+
+        if code in self.contracts:
+            self.remove(code)
+        self.contracts[code] = row
+
+        self.by_product[row.product][code] = None
+        if row.category:
+            self.by_category[row.category][code] = None
+        if row.underlying_code:
+            self.by_underlying[row.underlying_code][code] = None
+        if row.delivery_month:
+            self.by_delivery_month[row.delivery_month][code] = None
+        if row.product == PRODUCT_OPTION:
+            self.by_option_key[self.option_key(row)] = code
+
+    def remove(self, code: str):
+        """"""
+        row = self.contracts.pop(code, None)
+        if row is None:
+            return
+
+        self.by_product[row.product].pop(code, None)
+        if row.category:
+            self.by_category[row.category].pop(code, None)
+        if row.underlying_code:
+            self.by_underlying[row.underlying_code].pop(code, None)
+        if row.delivery_month:
+            self.by_delivery_month[row.delivery_month].pop(code, None)
+        if row.product == PRODUCT_OPTION:
+            self.by_option_key.pop(self.option_key(row), None)
+
+    def get(self, code: str):
+        """"""
+        return self.contracts.get(code, None)
+
+    def get_rows(self, codes: list) -> list:
+        """"""
+        contracts = self.contracts
+        return [contracts[code] for code in codes]
+
+    def get_by_product(self, product: str) -> list:
+        """"""
+        return self.get_rows(self.by_product.get(product, []))
+
+    def get_by_category(self, category: str) -> list:
+        """"""
+        return self.get_rows(self.by_category.get(category, []))
+
+    def get_by_underlying(self, underlying_code: str) -> list:
+        """"""
+        return self.get_rows(self.by_underlying.get(underlying_code, []))
+
+    def get_by_delivery_month(self, delivery_month: str) -> list:
+        """"""
+        return self.get_rows(self.by_delivery_month.get(delivery_month, []))
+
+    def get_option(
+        self,
+        underlying_code: str,
+        delivery_month: str,
+        strike_price: float,
+        option_right: str
+    ):
+        """"""
+        code = self.by_option_key.get(
+            (underlying_code, delivery_month, float(strike_price), option_right),
+            None
+        )
+        return self.contracts[code] if code else None
+
+    def get_option_chain(self, underlying_code: str, delivery_month: str = "") -> list:
+        """
+        Options on underlying_code sorted by (delivery month, strike, right),
+        optionally limited to one delivery month.
+        """
+        rows = [
+            row for row in self.get_by_underlying(underlying_code)
+            if row.product == PRODUCT_OPTION
+            and (not delivery_month or row.delivery_month == delivery_month)
+        ]
+        rows.sort(key=lambda row: (row.delivery_month, float(row.strike_price), row.option_right))
+        return rows
+
+    def get_front_month(self, category: str):
+        """
+        Futures contract of category with the nearest delivery month.
+        """
+        rows = [
+            row for row in self.get_by_category(category)
+            if row.product == PRODUCT_FUTURES
+        ]
+        if not rows:
+            return None
+        return min(rows, key=lambda row: row.delivery_month)
+
+    @staticmethod
+    def option_key(row: ContractRow) -> tuple:
+        """"""
+        return (
+            row.underlying_code,
+            row.delivery_month,
+            float(row.strike_price),
+            row.option_right
+        )
@@ -0,0 +1,150 @@
+# encoding: UTF-8
+
+import os
+import pickle
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+
+SNAPSHOT_VERSION = 2
+
+# TAIFEX lists the contracts of the next trading day for the night session
+NIGHT_SESSION_START = time(15, 0)
+NIGHT_SESSION_END = time(5, 0)
+
+PRODUCT_FUTURES = "FUT"
+PRODUCT_OPTION = "OPT"
+PRODUCT_STOCK = "STK"
+
+ContractRow = namedtuple(
+    "ContractRow",
+    [
+        "code",
+        "name",
+        "product",
+        "category",
+        "delivery_month",
+        "unit",
+        "strike_price",
+        "underlying_code",
+        "option_right",
+    ]
+)
+
+
+def contract_to_row(contract, product: str) -> ContractRow:
+    """
+    Extract the fields the gateway needs from a Shioaji contract.
+    """
+    option_right = getattr(contract, "option_right", "")
+    return ContractRow(
+        code=contract.code,
+        name=contract.name,
+        product=product,
+        category=getattr(contract, "category", ""),
+        delivery_month=getattr(contract, "delivery_month", ""),
+        unit=contract.unit,
+        strike_price=getattr(contract, "strike_price", 0),
+        underlying_code=getattr(contract, "underlying_code", ""),
+        option_right=getattr(option_right, "value", option_right),
+    )
+
+
+def get_trading_session(now: datetime = None) -> str:
+    """
+    Key of the session the contract master belongs to: YYYYMMDD-day from
+    05:00 to 15:00, YYYYMMDD-night from 15:00 to 05:00 of the next day.
+    """
+    now = now or datetime.now()
+    if now.time() >= NIGHT_SESSION_START:
+        return now.strftime("%Y%m%d-night")
+    if now.time() < NIGHT_SESSION_END:
+        return (now - timedelta(days=1)).strftime("%Y%m%d-night")
+    return now.strftime("%Y%m%d-day")
+
+
+def find_sj_contract(contracts, row: ContractRow):
+    """
+    Shioaji contract object of row in api.Contracts: direct lookup first,
+    then a scan of its category and at last of its whole product group.
+    """
+    group = {
+        PRODUCT_FUTURES: contracts.Futures,
+        PRODUCT_OPTION: contracts.Options,
+        PRODUCT_STOCK: contracts.Stocks,
+    }[row.product]
+
+    try:
+        contract = group[row.code]
+    except Exception:
+        contract = None
+
+    if contract is None:
+        category = getattr(group, row.category, None) if row.category else None
+        if category is not None:
+            contract = scan_contracts([category], row.code)
+        if contract is None:
+            contract = scan_contracts(group, row.code)
+    return contract
+
+
+def scan_contracts(categories, code: str):
+    """"""
+    for category in categories:
+        for contract in category:
+            if contract.code == code:
+                return contract
+    return None
+
+
+class ContractSnapshot:
+    """
+    Contract master stored on disk and versioned by trading session, so
+    that later startups of the same session skip walking api.Contracts.
+    """
+
+    def __init__(self, path: str):
+        """"""
+        self.path = str(path)
+
+    def load(self, session: str):
+        """
+        Return the list of ContractRow saved for session, or None if the
+        snapshot is missing, empty, stale or unreadable.
+        """
+        if not os.path.exists(self.path):
+            return None
+
+        try:
+            with open(self.path, "rb") as f:
+                snapshot = pickle.load(f)
+        except Exception:
+            return None
+
+        if (
+            not isinstance(snapshot, dict)
+            or snapshot.get("version") != SNAPSHOT_VERSION
+            or snapshot.get("session") != session
+            or snapshot.get("fields") != ContractRow._fields
+            or not snapshot.get("rows")
+        ):
+            return None
+
+        make = ContractRow._make
+        return [make(row) for row in snapshot["rows"]]
+
+    def save(self, session: str, rows: list):
+        """
+        Write the snapshot atomically so a crash never leaves a partial file.
+        """
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "session": session,
+            "fields": ContractRow._fields,
+            "rows": [tuple(row) for row in rows],
+        }
+
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
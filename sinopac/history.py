@@ -0,0 +1,208 @@
+# encoding: UTF-8
+"""
+Historical kbars and ticks downloaded per day with a local cache.
+
+Every (kind, symbol, day) is one chunk: downloaded with one API call and
+cached as two .npy files, ts (n,) int64 and values (n, columns) float64
+in column-major order, so that both can be memory mapped and every
+column is contiguous. Days without data are cached empty. Today and
+later days are never cached as they may still be incomplete.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from time import monotonic
+
+import numpy as np
+
+
+NS_PER_DAY = 86400 * 1_000_000_000
+
+KIND_KBAR = "kbar"
+KIND_TICK = "tick"
+
+HISTORY_COLUMNS = {
+    KIND_KBAR: ["Open", "High", "Low", "Close", "Volume", "Amount"],
+    KIND_TICK: ["close", "volume", "bid_price", "bid_volume", "ask_price", "ask_volume"],
+}
+
+
+def to_arrays(kind: str, result) -> tuple:
+    """
+    (ts, values) arrays of a Shioaji Kbars/Ticks result. Columns missing
+    in the installed Shioaji version are left zero.
+    """
+    ts = np.asarray(getattr(result, "ts", []), dtype=np.int64)
+    columns = HISTORY_COLUMNS[kind]
+
+    values = np.zeros((len(ts), len(columns)), dtype=np.float64, order="F")
+    for i, column in enumerate(columns):
+        data = getattr(result, column, None)
+        if data is not None and len(data) == len(ts):
+            values[:, i] = data
+    return ts, values
+
+
+def to_datetimes(ts: np.ndarray) -> list:
+    """
+    Shioaji timestamps are the exchange local time in nanoseconds since
+    epoch, converted into naive datetimes.
+    """
+    return (ts // 1000).astype("datetime64[us]").tolist()
+
+
+def day_volume_sum(ts: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    """
+    Volume accumulated from the first tick of every calendar day.
+    """
+    volume_sum = np.cumsum(volume)
+    day = ts // NS_PER_DAY
+    first = np.ones(len(ts), dtype=bool)
+    first[1:] = day[1:] != day[:-1]
+    return volume_sum - np.maximum.accumulate(np.where(first, volume_sum - volume, 0))
+
+
+class HistoryCache:
+    """
+    <folder>/<kind>/<symbol>/<YYYYMMDD>.ts.npy and .values.npy
+
+    Daily files are small enough that reading them is faster than mapping,
+    mmap_mode="r" maps them instead.
+    """
+
+    def __init__(self, folder, mmap_mode: str = None):
+        """"""
+        self.folder = Path(folder)
+        self.mmap_mode = mmap_mode
+
+    def get_path(self, kind: str, symbol: str, day: date) -> Path:
+        """"""
+        return self.folder.joinpath(kind, symbol, day.strftime("%Y%m%d"))
+
+    def load(self, kind: str, symbol: str, day: date):
+        """
+        (ts, values) of a cached day, None if not cached.
+        """
+        path = self.get_path(kind, symbol, day)
+        ts_path = path.with_suffix(".ts.npy")
+        if not ts_path.exists():
+            return None
+
+        try:
+            ts = np.load(ts_path, mmap_mode=self.mmap_mode)
+            values = np.load(path.with_suffix(".values.npy"), mmap_mode=self.mmap_mode)
+        except (OSError, ValueError):
+            return None
+
+        if len(ts) != len(values):
+            return None
+        return ts, values
+
+    def save(self, kind: str, symbol: str, day: date, ts: np.ndarray, values: np.ndarray):
+        """
+        The ts file is written last, so a day only counts as cached once
+        both files are complete.
+        """
+        path = self.get_path(kind, symbol, day)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        for suffix, array in ((".values.npy", values), (".ts.npy", ts)):
+            target = path.with_suffix(suffix)
+            temp = target.with_suffix(".tmp")
+            with open(temp, "wb") as f:
+                np.save(f, array)
+            os.replace(temp, target)
+
+
+class HistoryLoader:
+    """
+    Load date ranges day by day, from the cache where possible and by
+    downloading the missing days concurrently on a bounded thread pool.
+
+    fetch(kind, symbol, day) returns the Shioaji result of one day.
+    """
+
+    def __init__(self, fetch, cache: HistoryCache = None, max_workers: int = 4):
+        """"""
+        self.fetch = fetch
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="SinopacHistory")
+
+        self.cached_days = 0
+        self.downloaded_days = 0
+        self.download_time = 0.0
+
+    def load(self, kind: str, symbol: str, start: datetime, end: datetime) -> tuple:
+        """
+        (ts, values) of symbol between start and end (inclusive), sorted
+        by ts without duplicates.
+        """
+        today = date.today()
+        days = [
+            start.date() + timedelta(days=i)
+            for i in range((end.date() - start.date()).days + 1)
+        ]
+
+        chunks = {}
+        futures = {}
+        for day in days:
+            chunk = self.cache.load(kind, symbol, day) if self.cache else None
+            if chunk is not None:
+                chunks[day] = chunk
+                self.cached_days += 1
+            else:
+                futures[day] = self.executor.submit(
+                    self.download, kind, symbol, day, day < today)
+
+        download_start = monotonic()
+        for day, future in futures.items():
+            chunks[day] = future.result()
+            self.downloaded_days += 1
+        if futures:
+            self.download_time += monotonic() - download_start
+
+        # Sessions of adjacent days may overlap, only the rows of a day up
+        # to the last ts of the previous one are dropped: ticks of the
+        # same day often share a ts.
+        ts_parts = [np.zeros(0, dtype=np.int64)]
+        value_parts = [np.zeros((0, len(HISTORY_COLUMNS[kind])))]
+        last_ts = None
+        for day in days:
+            day_ts, day_values = chunks[day]
+            if last_ts is not None and len(day_ts) and day_ts[0] <= last_ts:
+                keep = day_ts > last_ts
+                day_ts, day_values = day_ts[keep], day_values[keep]
+            if len(day_ts):
+                last_ts = day_ts[-1]
+            ts_parts.append(day_ts)
+            value_parts.append(day_values)
+
+        ts = np.concatenate(ts_parts)
+        values = np.concatenate(value_parts)
+
+        start_ns = np.datetime64(start, "ns").astype(np.int64)
+        end_ns = np.datetime64(end, "ns").astype(np.int64)
+        mask = (ts >= start_ns) & (ts <= end_ns)
+        return ts[mask], values[mask]
+
+    def download(self, kind: str, symbol: str, day: date, save: bool) -> tuple:
+        """"""
+        ts, values = to_arrays(kind, self.fetch(kind, symbol, day))
+        if save and self.cache:
+            self.cache.save(kind, symbol, day, ts, values)
+        return ts, values
+
+    def get_stats(self) -> dict:
+        """"""
+        return {
+            "cached_days": self.cached_days,
+            "downloaded_days": self.downloaded_days,
+            "download_time": self.download_time,
+        }
+
+    def close(self):
+        """"""
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,205 @@
+# encoding: UTF-8
+
+from datetime import timedelta, timezone
+from time import monotonic
+
+
+STAGE_EXCHANGE = "exchange"     # exchange Date/Time -> quote_callback
+STAGE_DECODE = "decode"         # quote_callback -> end of decoding
+STAGE_HANDOFF = "handoff"       # end of decoding -> on_tick returned
+STAGE_TOTAL = "total"           # quote_callback -> on_tick returned
+
+STAGES = [STAGE_EXCHANGE, STAGE_DECODE, STAGE_HANDOFF, STAGE_TOTAL]
+
+# Quote times are naive Taipei local times, whatever the host timezone
+EXCHANGE_TZ = timezone(timedelta(hours=8))
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of nanosecond values: four buckets per power of
+    two, i.e. about 20% resolution. Recording is a few integer operations
+    and needs no lock as long as a single thread records.
+    """
+
+    size = 256
+
+    def __init__(self):
+        """"""
+        self.counts = [0] * self.size
+        self.count = 0
+        self.max = 0
+
+    def record(self, value: int):
+        """"""
+        if value < 4:
+            index = max(value, 0)
+        else:
+            bits = value.bit_length()
+            index = min(bits * 4 + ((value >> (bits - 3)) & 3), self.size - 1)
+
+        self.counts[index] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> int:
+        """
+        Upper bound of the bucket holding the p-th value.
+        """
+        if not self.count:
+            return 0
+
+        target = p * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if count and cumulative >= target:
+                return min(self.get_upper_bound(index), self.max)
+        return self.max
+
+    @staticmethod
+    def get_upper_bound(index: int) -> int:
+        """"""
+        if index < 4:
+            return index
+        bits, mantissa = divmod(index, 4)
+        return (5 + mantissa) << (bits - 3)
+
+    def get_summary(self) -> dict:
+        """Percentiles in microseconds."""
+        return {
+            "count": self.count,
+            "p50": self.percentile(0.5) / 1000,
+            "p99": self.percentile(0.99) / 1000,
+            "max": self.max / 1000,
+        }
+
+
+class LatencyWindow:
+    """
+    Histograms and counters recorded since start.
+    """
+
+    def __init__(self):
+        """"""
+        self.type_histograms = {}
+        self.symbol_histograms = {}
+        self.messages = {}
+        self.errors = 0
+
+        self.start = monotonic()
+
+
+class LatencyMonitor:
+    """
+    Per-stage latency histograms of the quote path, by message type for
+    every stage and by symbol for the in-gateway (total) latency.
+
+    Histograms are windowed: get_summary returns the statistics since the
+    previous call and starts a new window. The quote thread records into
+    the window it read from self.window; get_summary replaces it with one
+    assignment and summarises the old one, so neither side needs a lock.
+    """
+
+    def __init__(self, timestamp_decoder, top_symbols: int = 5):
+        """"""
+        self.timestamp_decoder = timestamp_decoder
+        self.top_symbols = top_symbols
+
+        self.window = LatencyWindow()
+
+    def record(
+        self,
+        quote_type: str,
+        tick,
+        data: dict,
+        recv_ns: int,
+        decoded_ns: int,
+        handoff_ns: int
+    ):
+        """"""
+        window = self.window
+
+        histograms = window.type_histograms.get(quote_type, None)
+        if histograms is None:
+            histograms = {stage: LatencyHistogram() for stage in STAGES}
+            window.messages[quote_type] = 0
+            window.type_histograms[quote_type] = histograms
+
+        window.messages[quote_type] += 1
+        histograms[STAGE_DECODE].record(decoded_ns - recv_ns)
+        histograms[STAGE_HANDOFF].record(handoff_ns - decoded_ns)
+        histograms[STAGE_TOTAL].record(handoff_ns - recv_ns)
+
+        if tick is None:
+            return
+
+        exchange_ns = self.get_exchange_ns(quote_type, tick, data)
+        if exchange_ns:
+            histograms[STAGE_EXCHANGE].record(recv_ns - exchange_ns)
+
+        symbol_histogram = window.symbol_histograms.get(tick.symbol, None)
+        if symbol_histogram is None:
+            symbol_histogram = LatencyHistogram()
+            window.symbol_histograms[tick.symbol] = symbol_histogram
+        symbol_histogram.record(handoff_ns - recv_ns)
+
+    def get_exchange_ns(self, quote_type: str, tick, data: dict) -> int:
+        """
+        Exchange timestamp of the message, 0 if it has none.
+        """
+        try:
+            if quote_type in ("L", "MKT"):
+                dt = tick.datetime
+            elif "Date" in data:
+                dt = self.timestamp_decoder.decode(data["Date"], data["Time"])
+            else:
+                return 0
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=EXCHANGE_TZ)
+            return int(dt.timestamp() * 1_000_000_000)
+        except (KeyError, ValueError):
+            return 0
+
+    def record_error(self):
+        """"""
+        self.window.errors += 1
+
+    def get_summary(self) -> dict:
+        """
+        Statistics of the current window, then start a new one.
+        """
+        window = self.window
+        self.window = LatencyWindow()
+        elapsed = max(self.window.start - window.start, 1e-9)
+
+        # A record that read the old window may still be adding to it,
+        # list() copies each dict in one step before iterating.
+        messages = dict(list(window.messages.items()))
+
+        types = {}
+        for quote_type, histograms in list(window.type_histograms.items()):
+            summary = {
+                stage: histogram.get_summary()
+                for stage, histogram in histograms.items()
+            }
+            summary["rate"] = messages.get(quote_type, 0) / elapsed
+            types[quote_type] = summary
+
+        slowest = sorted(
+            list(window.symbol_histograms.items()),
+            key=lambda item: item[1].percentile(0.99),
+            reverse=True
+        )[:self.top_symbols]
+
+        return {
+            "interval": elapsed,
+            "messages": sum(messages.values()),
+            "rate": sum(messages.values()) / elapsed,
+            "errors": window.errors,
+            "types": types,
+            "slowest_symbols": {
+                symbol: histogram.get_summary() for symbol, histogram in slowest
+            },
+        }
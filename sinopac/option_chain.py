@@ -0,0 +1,323 @@
+# encoding: UTF-8
+"""
+Implied volatility and greeks of whole option chains with NumPy.
+
+Options are grouped by (underlying, delivery month). Quotes only write
+the latest bid/ask/last of an option and the underlying price
+(TargetKindPrice) of its chain; compute() then prices every dirty chain
+in one vectorised pass with Black-76, using TargetKindPrice as the
+forward and rate only for discounting.
+"""
+
+from calendar import WEDNESDAY, monthcalendar
+from datetime import datetime
+from math import pi, sqrt
+from threading import Lock
+
+import numpy as np
+
+from .contract_snapshot import ContractRow, PRODUCT_OPTION
+
+
+SECONDS_PER_YEAR = 365 * 86400
+MIN_TIME = 60 / SECONDS_PER_YEAR
+
+MIN_VOLATILITY = 1e-4
+MAX_VOLATILITY = 5.0
+
+SQRT_2PI = sqrt(2 * pi)
+
+
+def get_expiry(delivery_month: str) -> datetime:
+    """
+    Last trading time of a TAIFEX option: 13:30 of the third Wednesday of
+    a monthly delivery month "YYYYMM", of the Nth Wednesday of a weekly
+    one "YYYYMMWN". Holidays are not taken into account.
+    """
+    year, month = int(delivery_month[:4]), int(delivery_month[4:6])
+    week = int(delivery_month[7:]) if "W" in delivery_month else 3
+
+    wednesdays = [
+        week_days[WEDNESDAY] for week_days in monthcalendar(year, month)
+        if week_days[WEDNESDAY]
+    ]
+    day = wednesdays[min(week, len(wednesdays)) - 1]
+    return datetime(year, month, day, 13, 30)
+
+
+def norm_pdf(x: np.ndarray) -> np.ndarray:
+    """"""
+    return np.exp(-0.5 * x * x) / SQRT_2PI
+
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    """
+    Zelen & Severo approximation (A&S 26.2.17), error below 7.5e-8.
+    """
+    t = 1.0 / (1.0 + 0.2316419 * np.abs(x))
+    poly = t * (0.319381530 + t * (-0.356563782 + t * (
+        1.781477937 + t * (-1.821255978 + t * 1.330274429))))
+    tail = norm_pdf(x) * poly
+    return np.where(x >= 0, 1.0 - tail, tail)
+
+
+def black76(f, k, t, sigma, is_call, df) -> tuple:
+    """
+    (price, vega, d1) of calls (is_call) and puts.
+    """
+    sqrt_t = np.sqrt(t)
+    vol = sigma * sqrt_t
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d1 = (np.log(f / k) + 0.5 * vol * vol) / vol
+    d2 = d1 - vol
+
+    call = df * (f * norm_cdf(d1) - k * norm_cdf(d2))
+    price = np.where(is_call, call, call - df * (f - k))
+    vega = df * f * norm_pdf(d1) * sqrt_t
+    return price, vega, d1
+
+
+def implied_volatility(
+    price: np.ndarray,
+    f,
+    k: np.ndarray,
+    t,
+    is_call: np.ndarray,
+    df,
+    tolerance: float = 1e-6,
+    iterations: int = 20
+) -> np.ndarray:
+    """
+    Black-76 implied volatility of every option, NaN where the price is
+    outside the no-arbitrage bounds. Newton iterations first, bisection
+    between MIN_VOLATILITY and MAX_VOLATILITY for the options where
+    Newton left the bounds or did not converge.
+    """
+    intrinsic = df * np.maximum(np.where(is_call, f - k, k - f), 0)
+    upper = np.where(is_call, df * f, df * k)
+    valid = (price > intrinsic) & (price < upper)
+
+    sigma = initial_volatility(price, f, k, t, is_call, df)
+    active = valid.copy()
+    for _ in range(iterations):
+        if not active.any():
+            break
+        model, vega, _ = black76(f, k[active], t, sigma[active], is_call[active], df)
+        diff = model - price[active]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            new_sigma = sigma[active] - diff / vega
+        ok = np.isfinite(new_sigma) & (new_sigma > MIN_VOLATILITY) & (new_sigma < MAX_VOLATILITY)
+
+        index = np.flatnonzero(active)
+        sigma[index[ok]] = new_sigma[ok]
+
+        done = np.abs(diff) < tolerance
+        active[index[done | ~ok]] = False
+
+    model, _, _ = black76(f, k, t, sigma, is_call, df)
+    failed = valid & ~(np.abs(model - price) < tolerance)
+    if failed.any():
+        sigma[failed] = bisect_volatility(
+            price[failed], f, k[failed], t, is_call[failed], df, tolerance)
+
+    sigma[~valid] = np.nan
+    return sigma
+
+
+def initial_volatility(price, f, k, t, is_call, df) -> np.ndarray:
+    """
+    Corrado-Miller approximation as starting point of Newton.
+    """
+    call = price / df + np.where(is_call, 0, f - k)
+    half = call - (f - k) / 2
+    root = np.sqrt(np.maximum(half * half - (f - k) ** 2 / pi, 0))
+    sigma = SQRT_2PI / (f + k) * (half + root) / np.sqrt(t)
+    return np.clip(np.nan_to_num(sigma, nan=0.3), 0.05, 2.0)
+
+
+def bisect_volatility(price, f, k, t, is_call, df, tolerance: float) -> np.ndarray:
+    """"""
+    low = np.full(len(price), MIN_VOLATILITY)
+    high = np.full(len(price), MAX_VOLATILITY)
+    for _ in range(100):
+        mid = (low + high) / 2
+        model, _, _ = black76(f, k, t, mid, is_call, df)
+        above = model > price
+        high = np.where(above, mid, high)
+        low = np.where(above, low, mid)
+        if (high - low).max() < tolerance:
+            break
+    return (low + high) / 2
+
+
+class OptionChain:
+    """
+    Quotes of the options of one underlying and delivery month.
+    """
+
+    def __init__(self, underlying: str, delivery_month: str):
+        """"""
+        self.underlying = underlying
+        self.delivery_month = delivery_month
+        self.expiry = get_expiry(delivery_month)
+
+        self.codes = []
+        self.strikes = np.zeros(0)
+        self.is_call = np.zeros(0, dtype=bool)
+        self.bid = np.zeros(0)
+        self.ask = np.zeros(0)
+        self.last = np.zeros(0)
+
+        self.underlying_price = 0.0
+        self.dirty = False
+
+    def add(self, row: ContractRow) -> int:
+        """"""
+        self.codes.append(row.code)
+        self.strikes = np.append(self.strikes, float(row.strike_price))
+        self.is_call = np.append(self.is_call, row.option_right == "C")
+        self.bid = np.append(self.bid, 0.0)
+        self.ask = np.append(self.ask, 0.0)
+        self.last = np.append(self.last, 0.0)
+        return len(self.codes) - 1
+
+    def get_prices(self) -> np.ndarray:
+        """
+        Mid price where both sides are quoted, last price otherwise.
+        """
+        bid = self.bid.copy()
+        ask = self.ask.copy()
+        last = self.last.copy()
+        quoted = (bid > 0) & (ask > 0)
+        return np.where(quoted, (bid + ask) / 2, last)
+
+
+class OptionChainEngine:
+    """
+    Option chains of the added options, updated from their quotes.
+
+    add() replaces the arrays of a chain, so add(), remove(), update()
+    and the copies taken by compute() are serialised by a lock: a quote
+    is never written into arrays being replaced and a snapshot sees each
+    value either before or after an update.
+    """
+
+    def __init__(self, rate: float = 0.0, on_error=None):
+        """"""
+        self.rate = rate
+        self.on_error = on_error
+        self.chains = {}
+        self.index = {}
+        self.lock = Lock()
+
+    def add(self, row: ContractRow):
+        """
+        Add an option to the chain of its underlying (its category if the
+        underlying code is unknown) and delivery month. Options without a
+        valid delivery month are skipped and reported to on_error.
+        """
+        if row is None or row.product != PRODUCT_OPTION:
+            return
+
+        with self.lock:
+            if row.code in self.index:
+                return
+
+            key = (row.underlying_code or row.category, row.delivery_month)
+            chain = self.chains.get(key, None)
+            if chain is None:
+                try:
+                    chain = OptionChain(*key)
+                except ValueError as exc:
+                    if self.on_error:
+                        self.on_error(row.code, exc)
+                    return
+                self.chains[key] = chain
+
+            self.index[row.code] = (chain, chain.add(row))
+
+    def remove(self, code: str):
+        """
+        Clear the quotes of an option, its values become NaN.
+        """
+        entry = self.index.get(code, None)
+        if entry is None:
+            return
+
+        chain, i = entry
+        with self.lock:
+            chain.bid[i] = chain.ask[i] = chain.last[i] = 0
+            chain.dirty = True
+
+    def update(self, code: str, tick, underlying_price: float):
+        """"""
+        entry = self.index.get(code, None)
+        if entry is None:
+            return
+
+        chain, i = entry
+        with self.lock:
+            chain.bid[i] = tick.bid_price_1
+            chain.ask[i] = tick.ask_price_1
+            chain.last[i] = tick.last_price
+            if underlying_price:
+                chain.underlying_price = underlying_price
+            chain.dirty = True
+
+    def compute(self, chain: OptionChain, now: datetime = None) -> dict:
+        """
+        Snapshot of a chain, arrays aligned with "symbol":
+
+            strike, call, price     option definition and price used
+            iv                      Black-76 implied volatility
+            delta, gamma            per point of the underlying
+            vega                    per volatility point (1%)
+        """
+        with self.lock:
+            chain.dirty = False
+            f = chain.underlying_price
+            codes = list(chain.codes)
+            price = chain.get_prices()
+            k = chain.strikes.copy()
+            is_call = chain.is_call.copy()
+
+        now = now or datetime.now()
+        t = max((chain.expiry - now).total_seconds() / SECONDS_PER_YEAR, MIN_TIME)
+        df = np.exp(-self.rate * t)
+
+        if f > 0:
+            iv = implied_volatility(price, f, k, t, is_call, df)
+            _, vega, d1 = black76(f, k, t, iv, is_call, df)
+            delta = np.where(is_call, df * norm_cdf(d1), df * (norm_cdf(d1) - 1))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                gamma = df * norm_pdf(d1) / (f * iv * np.sqrt(t))
+            vega = vega / 100
+        else:
+            iv = delta = gamma = vega = np.full(len(price), np.nan)
+
+        return {
+            "underlying": chain.underlying,
+            "delivery_month": chain.delivery_month,
+            "expiry": chain.expiry,
+            "time_to_expiry": t,
+            "underlying_price": f,
+            "symbol": codes,
+            "strike": k,
+            "call": is_call,
+            "price": price,
+            "iv": iv,
+            "delta": delta,
+            "gamma": gamma,
+            "vega": vega,
+        }
+
+    def compute_dirty(self, now: datetime = None) -> list:
+        """
+        Snapshots of every chain quoted since the last computation.
+        """
+        return [
+            self.compute(chain, now)
+            for chain in list(self.chains.values())
+            if chain.dirty
+        ]
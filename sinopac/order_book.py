@@ -0,0 +1,191 @@
+# encoding: UTF-8
+
+import numpy as np
+
+
+BOOK_DEPTH = 5
+
+# Rows of the levels array of every symbol, in payload field order.
+LEVEL_FIELDS = [
+    "BidPrice",
+    "BidVolume",
+    "AskPrice",
+    "AskVolume",
+    "DiffBidVol",
+    "DiffAskVol",
+]
+BID_PRICE, BID_VOLUME, ASK_PRICE, ASK_VOLUME, BID_VOLUME_DIFF, ASK_VOLUME_DIFF = \
+    range(len(LEVEL_FIELDS))
+
+# Columns of the scalars array, only carried by futures Q payloads.
+SCALAR_FIELDS = [
+    "BidVolSum",
+    "AskVolSum",
+    "FirstDerivedBidPrice",
+    "FirstDerivedBidVolume",
+    "FirstDerivedAskPrice",
+    "FirstDerivedAskVolume",
+    "TargetKindPrice",
+]
+
+
+class OrderBookStore:
+    """
+    5-level order book of every quoted symbol in shared NumPy arrays, one
+    row per symbol:
+
+        levels      (symbols, LEVEL_FIELDS, depth)
+        scalars     (symbols, SCALAR_FIELDS)
+
+    update() writes a Q/QUT payload into the row of its symbol, including
+    the level volume diffs and the derived quotes that TickData has no
+    fields for. Metrics are computed in batch over all rows by
+    get_metrics(), so nothing is allocated per update.
+
+    Only the quote thread may call update(); readers see the arrays of
+    the last resize and at most one half-written row.
+    """
+
+    def __init__(self, capacity: int = 256):
+        """"""
+        self.depth = BOOK_DEPTH
+        self.capacity = 0
+        self.size = 0
+        self.index = {}
+        self.codes = []
+
+        self.levels = np.zeros((0, len(LEVEL_FIELDS), self.depth))
+        self.scalars = np.zeros((0, len(SCALAR_FIELDS)))
+        self.updates = np.zeros(0, dtype=np.int64)
+        self.resize(capacity)
+
+    def resize(self, capacity: int):
+        """"""
+        self.levels = grow(self.levels, capacity)
+        self.scalars = grow(self.scalars, capacity)
+        self.updates = grow(self.updates, capacity)
+        self.capacity = capacity
+
+    def get_row(self, code: str) -> int:
+        """"""
+        row = self.index.get(code, None)
+        if row is None:
+            if self.size == self.capacity:
+                self.resize(self.capacity * 2)
+            row = self.size
+            self.index[code] = row
+            self.codes.append(code)
+            self.size += 1
+        return row
+
+    def update(self, code: str, data: dict):
+        """
+        Apply one Q/QUT payload. QUT payloads only carry the 5 levels.
+        """
+        row = self.get_row(code)
+
+        if "DiffBidVol" in data:
+            self.levels[row] = [data[field] for field in LEVEL_FIELDS]
+            self.scalars[row] = [data.get(field, 0) for field in SCALAR_FIELDS]
+        else:
+            self.levels[row, :ASK_VOLUME + 1] = (
+                data["BidPrice"],
+                data["BidVolume"],
+                data["AskPrice"],
+                data["AskVolume"]
+            )
+
+        self.updates[row] += 1
+
+    def get_metrics(self, top: int = BOOK_DEPTH) -> dict:
+        """
+        Derived metrics of every symbol as arrays aligned with "symbol":
+
+            spread          ask 1 - bid 1
+            mid             (bid 1 + ask 1) / 2
+            microprice      mid weighted by the opposite level 1 volume
+            imbalance       (bid - ask) / (bid + ask) volume of top levels
+            depth_mid       mean of the volume-weighted bid and ask price
+                            of top levels
+
+        Values are NaN where the book side needed is empty.
+        """
+        size = self.size
+        codes = self.codes[:size]
+        top = min(max(top, 1), self.depth)
+
+        levels = self.levels[:size, :, :top]
+        bid_price = levels[:, BID_PRICE]
+        bid_volume = levels[:, BID_VOLUME]
+        ask_price = levels[:, ASK_PRICE]
+        ask_volume = levels[:, ASK_VOLUME]
+
+        bid_1 = bid_price[:, 0]
+        ask_1 = ask_price[:, 0]
+        bid_volume_1 = bid_volume[:, 0]
+        ask_volume_1 = ask_volume[:, 0]
+        valid = (bid_1 > 0) & (ask_1 > 0)
+
+        bid_depth = bid_volume.sum(axis=1)
+        ask_depth = ask_volume.sum(axis=1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            spread = np.where(valid, ask_1 - bid_1, np.nan)
+            mid = np.where(valid, (bid_1 + ask_1) / 2, np.nan)
+
+            level_1 = bid_volume_1 + ask_volume_1
+            microprice = np.where(
+                valid & (level_1 > 0),
+                (bid_1 * ask_volume_1 + ask_1 * bid_volume_1) / level_1,
+                np.nan
+            )
+
+            total_depth = bid_depth + ask_depth
+            imbalance = np.where(
+                total_depth > 0, (bid_depth - ask_depth) / total_depth, np.nan)
+
+            bid_vwap = (bid_price * bid_volume).sum(axis=1) / bid_depth
+            ask_vwap = (ask_price * ask_volume).sum(axis=1) / ask_depth
+            depth_mid = np.where(
+                valid & (bid_depth > 0) & (ask_depth > 0),
+                (bid_vwap + ask_vwap) / 2,
+                np.nan
+            )
+
+        return {
+            "symbol": codes,
+            "spread": spread,
+            "mid": mid,
+            "microprice": microprice,
+            "imbalance": imbalance,
+            "depth_mid": depth_mid,
+            "bid_volume_sum": self.scalars[:size, 0].copy(),
+            "ask_volume_sum": self.scalars[:size, 1].copy(),
+            "updates": self.updates[:size].copy(),
+        }
+
+    def get_book(self, code: str) -> dict:
+        """
+        Copy of the current book of one symbol, None if never quoted.
+        """
+        row = self.index.get(code, None)
+        if row is None:
+            return None
+
+        book = {
+            field: self.levels[row, i].copy()
+            for i, field in enumerate(LEVEL_FIELDS)
+        }
+        for i, field in enumerate(SCALAR_FIELDS):
+            book[field] = float(self.scalars[row, i])
+        return book
+
+
+def grow(array: np.ndarray, capacity: int) -> np.ndarray:
+    """
+    Copy of array with its first dimension resized to capacity.
+    """
+    new_array = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    count = min(len(array), capacity)
+    new_array[:count] = array[:count]
+    return new_array
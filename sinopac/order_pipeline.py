@@ -0,0 +1,113 @@
+# encoding: UTF-8
+
+from queue import Queue, Empty
+from threading import Lock, Thread
+
+
+class OrderPipeline:
+    """
+    Run broker calls off the caller thread.
+
+    Every account key gets its own worker lane, so requests of one
+    account are sent in submission order while different accounts do not
+    wait for each other.
+    """
+
+    def __init__(self, on_error=None):
+        """"""
+        self.on_error = on_error
+
+        self.lanes = {}
+        self.lock = Lock()
+        self.active = True
+
+        self.submitted = 0
+        self.completed = 0
+
+    def submit(self, account_key: str, func, *args):
+        """"""
+        lane = self.lanes.get(account_key, None)
+        if lane is None:
+            with self.lock:
+                lane = self.lanes.get(account_key, None)
+                if lane is None:
+                    lane = self.create_lane(account_key)
+
+        self.submitted += 1
+        lane.put((func, args))
+
+    def create_lane(self, account_key: str) -> Queue:
+        """"""
+        lane = Queue()
+        thread = Thread(
+            target=self.run,
+            args=(lane,),
+            name=f"SinopacOrder-{account_key}",
+            daemon=True
+        )
+        thread.start()
+        self.lanes[account_key] = lane
+        return lane
+
+    def run(self, lane: Queue):
+        """"""
+        while self.active:
+            try:
+                func, args = lane.get(timeout=1)
+            except Empty:
+                continue
+
+            try:
+                func(*args)
+            except Exception as exc:
+                if self.on_error:
+                    self.on_error(exc)
+            self.completed += 1
+
+    def get_pending(self) -> int:
+        """"""
+        return self.submitted - self.completed
+
+    def close(self):
+        """"""
+        self.active = False
+
+
+class BackgroundLogger:
+    """
+    Format and write verbose logs on a separate thread, so that str() of
+    requests and broker objects stays off the trading path.
+    """
+
+    def __init__(self, write_log):
+        """"""
+        self.write_log = write_log
+        self.queue = Queue()
+        self.active = True
+
+        self.thread = Thread(target=self.run, name="SinopacLogger", daemon=True)
+        self.thread.start()
+
+    def log(self, *items):
+        """
+        Every item is converted with str() and written as its own line.
+        """
+        self.queue.put(items)
+
+    def run(self):
+        """"""
+        while self.active:
+            try:
+                items = self.queue.get(timeout=1)
+            except Empty:
+                continue
+
+            for item in items:
+                try:
+                    self.write_log(str(item))
+                except Exception:
+                    pass
+
+    def close(self):
+        """"""
+        self.active = False
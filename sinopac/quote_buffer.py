@@ -0,0 +1,202 @@
+# encoding: UTF-8
+
+from collections import deque
+from threading import Condition, Lock, Thread
+
+
+POLICY_BLOCK = "block"
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_CONFLATE = "conflate"
+
+QUEUE_POLICIES = [POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_CONFLATE]
+
+TRADE_TOPIC_PREFIXES = ("L/", "MKT/")
+
+
+class QuoteRingBuffer:
+    """
+    Bounded buffer of raw (recv_ns, topic, data) quote payloads.
+
+    Overflow policy:
+        block       - producer waits until the decoder frees a slot.
+        drop_oldest - oldest pending payload is discarded.
+        conflate    - a newer payload replaces the pending one of the same
+                      topic, otherwise the oldest payload is discarded.
+                      Trade prints (L, MKT) are never replaced.
+    """
+
+    def __init__(self, capacity: int = 65536, policy: str = POLICY_BLOCK):
+        """"""
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown quote queue policy: {policy}")
+
+        self.capacity = max(int(capacity), 1)
+        self.policy = policy
+
+        self.buffer = deque()
+        self.pending = {}
+        self.active = True
+
+        self.lock = Lock()
+        self.not_empty = Condition(self.lock)
+        self.not_full = Condition(self.lock)
+
+        self.pushed = 0
+        self.popped = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.max_depth = 0
+
+    def put(self, recv_ns: int, topic: str, data: dict):
+        """"""
+        with self.lock:
+            conflate = (
+                self.policy == POLICY_CONFLATE
+                and not topic.startswith(TRADE_TOPIC_PREFIXES)
+            )
+
+            if len(self.buffer) >= self.capacity:
+                if self.policy == POLICY_BLOCK:
+                    while self.active and len(self.buffer) >= self.capacity:
+                        self.not_full.wait()
+                    if not self.active:
+                        return
+                else:
+                    if conflate:
+                        entry = self.pending.get(topic, None)
+                        if entry is not None:
+                            entry[0] = recv_ns
+                            entry[2] = data
+                            self.conflated += 1
+                            return
+
+                    oldest = self.buffer.popleft()
+                    if self.pending.get(oldest[1], None) is oldest:
+                        del self.pending[oldest[1]]
+                    self.dropped += 1
+
+            entry = [recv_ns, topic, data]
+            self.buffer.append(entry)
+            if conflate:
+                self.pending[topic] = entry
+
+            self.pushed += 1
+            depth = len(self.buffer)
+            if depth > self.max_depth:
+                self.max_depth = depth
+
+            self.not_empty.notify()
+
+    def get_batch(self, max_items: int, timeout: float = 0.5) -> list:
+        """
+        Pop up to max_items payloads, waiting at most timeout seconds
+        for the first one to arrive.
+        """
+        with self.lock:
+            if not self.buffer and self.active:
+                self.not_empty.wait(timeout)
+
+            count = min(len(self.buffer), max_items)
+            if not count:
+                return []
+
+            popleft = self.buffer.popleft
+            batch = [popleft() for _ in range(count)]
+
+            if self.policy == POLICY_CONFLATE:
+                pending = self.pending
+                for entry in batch:
+                    if pending.get(entry[1], None) is entry:
+                        del pending[entry[1]]
+            elif self.policy == POLICY_BLOCK:
+                self.not_full.notify_all()
+
+            self.popped += count
+            return batch
+
+    def close(self):
+        """Wake up every waiting producer and consumer."""
+        with self.lock:
+            self.active = False
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+
+    @property
+    def depth(self) -> int:
+        """"""
+        return len(self.buffer)
+
+    def get_stats(self) -> dict:
+        """"""
+        return {
+            "policy": self.policy,
+            "capacity": self.capacity,
+            "depth": len(self.buffer),
+            "max_depth": self.max_depth,
+            "pushed": self.pushed,
+            "popped": self.popped,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+        }
+
+
+class QuoteDecoder:
+    """
+    Worker thread draining a QuoteRingBuffer in batches and handing every
+    payload to the gateway decoding function.
+    """
+
+    def __init__(self, buffer: QuoteRingBuffer, process, batch_size: int = 256):
+        """"""
+        self.buffer = buffer
+        self.process = process
+        self.batch_size = batch_size
+
+        self.active = False
+        self.thread = None
+
+        self.batches = 0
+        self.decoded = 0
+
+    def put(self, recv_ns: int, topic: str, data: dict):
+        """"""
+        self.buffer.put(recv_ns, topic, data)
+
+    def start(self):
+        """"""
+        if self.active:
+            return
+        self.active = True
+        self.thread = Thread(target=self.run, name="SinopacQuoteDecoder", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """"""
+        if not self.active:
+            return
+        self.active = False
+        self.buffer.close()
+        self.thread.join()
+
+    def run(self):
+        """"""
+        buffer = self.buffer
+        process = self.process
+
+        while self.active:
+            batch = buffer.get_batch(self.batch_size)
+            if not batch:
+                continue
+
+            for recv_ns, topic, data in batch:
+                process(recv_ns, topic, data)
+
+            self.batches += 1
+            self.decoded += len(batch)
+
+    def get_stats(self) -> dict:
+        """"""
+        stats = self.buffer.get_stats()
+        stats["batches"] = self.batches
+        stats["decoded"] = self.decoded
+        return stats
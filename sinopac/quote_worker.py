@@ -0,0 +1,378 @@
+# encoding: UTF-8
+"""
+Quote ingestion in worker processes.
+
+Every worker process logs in with its own Shioaji session, subscribes
+the symbols routed to it (crc32 of the code modulo the worker count) and
+decodes their quotes straight into a shared-memory array, one row of
+SHARED_FIELDS per symbol. Each row is guarded by a seqlock: the writer
+makes the sequence odd while it updates the row and even again after.
+
+The trading process polls the sequence arrays and rebuilds ticks from
+the rows that changed, without pickling anything per message. Quotes are
+therefore conflated to the latest state of every symbol between polls.
+"""
+
+import zlib
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
+from threading import Thread
+from time import sleep
+
+import numpy as np
+
+from .contract_snapshot import find_sj_contract
+from .subscription import QUOTE_TYPE_TICK
+from .utility import TimestampDecoder
+
+
+SHARED_FIELDS = [
+    "datetime",
+    "last_price",
+    "volume",
+    "open_price",
+    "high_price",
+    "low_price",
+    "pre_close",
+]
+SHARED_FIELDS += [f"bid_price_{i}" for i in range(1, 6)]
+SHARED_FIELDS += [f"ask_price_{i}" for i in range(1, 6)]
+SHARED_FIELDS += [f"bid_volume_{i}" for i in range(1, 6)]
+SHARED_FIELDS += [f"ask_volume_{i}" for i in range(1, 6)]
+
+DATETIME, LAST_PRICE, VOLUME, OPEN_PRICE, HIGH_PRICE, LOW_PRICE, PRE_CLOSE = range(7)
+BID_PRICE = slice(7, 12)
+ASK_PRICE = slice(12, 17)
+BID_VOLUME = slice(17, 22)
+ASK_VOLUME = slice(22, 27)
+
+COMMAND_SUBSCRIBE = "subscribe"
+COMMAND_UNSUBSCRIBE = "unsubscribe"
+
+
+class SharedQuoteBlock:
+    """
+    Shared memory holding seq (capacity,) int64 followed by values
+    (capacity, SHARED_FIELDS) float64.
+    """
+
+    def __init__(self, capacity: int, name: str = None):
+        """
+        Create a new block without name, attach to an existing one with.
+        """
+        self.capacity = capacity
+        size = capacity * 8 * (1 + len(SHARED_FIELDS))
+
+        if name is None:
+            self.shm = SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            try:
+                self.shm = SharedMemory(name=name, track=False)
+            except TypeError:
+                self.shm = SharedMemory(name=name)
+            self.owner = False
+
+        self.seq = np.ndarray((capacity,), dtype=np.int64, buffer=self.shm.buf)
+        self.values = np.ndarray(
+            (capacity, len(SHARED_FIELDS)),
+            dtype=np.float64,
+            buffer=self.shm.buf,
+            offset=capacity * 8
+        )
+        if self.owner:
+            self.seq[:] = 0
+            self.values[:] = 0
+
+    @property
+    def name(self) -> str:
+        """"""
+        return self.shm.name
+
+    def close(self):
+        """"""
+        self.seq = None
+        self.values = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+class QuoteWorkerDecoder:
+    """
+    Decode Shioaji quote payloads into the rows of a SharedQuoteBlock.
+    """
+
+    def __init__(self, block: SharedQuoteBlock):
+        """"""
+        self.block = block
+        self.rows = {}
+        self.timestamp_decoder = TimestampDecoder()
+        self.errors = 0
+
+    def callback(self, topic: str, data: dict):
+        """"""
+        try:
+            topics = topic.split("/")
+            realtime_type = topics[0]
+            if realtime_type in ("L", "Q"):
+                code = data.get("Code", None)
+            else:
+                code = topics[3]
+
+            row = self.rows.get(code, None)
+            if row is None:
+                return
+
+            seq = self.block.seq
+            seq[row] += 1
+            try:
+                self.decode(realtime_type, self.block.values[row], data)
+            finally:
+                seq[row] += 1
+        except Exception:
+            self.errors += 1
+
+    def decode(self, realtime_type: str, values: np.ndarray, data: dict):
+        """"""
+        if realtime_type == "Q" or realtime_type == "QUT":
+            values[BID_PRICE] = data["BidPrice"]
+            values[ASK_PRICE] = data["AskPrice"]
+            values[BID_VOLUME] = data["BidVolume"]
+            values[ASK_VOLUME] = data["AskVolume"]
+        elif realtime_type == "L":
+            close = data["Close"][0]
+            dt = self.timestamp_decoder.decode(data["Date"], data["Time"])
+            values[DATETIME] = dt.timestamp()
+            values[LAST_PRICE] = close
+            values[VOLUME] = data["VolSum"][0]
+            values[OPEN_PRICE] = data["Open"]
+            values[HIGH_PRICE] = data["High"][0]
+            values[LOW_PRICE] = data["Low"][0]
+            values[PRE_CLOSE] = close - data["DiffPrice"][0]
+        elif realtime_type == "MKT":
+            close = data["Close"][0]
+            dt = self.timestamp_decoder.decode_today(data["Time"])
+            values[DATETIME] = dt.timestamp()
+            values[LAST_PRICE] = close
+            values[VOLUME] = data["VolSum"][0]
+            if not values[OPEN_PRICE]:
+                values[OPEN_PRICE] = close
+            if close > values[HIGH_PRICE]:
+                values[HIGH_PRICE] = close
+            if not values[LOW_PRICE] or close < values[LOW_PRICE]:
+                values[LOW_PRICE] = close
+            values[PRE_CLOSE] = values[OPEN_PRICE]
+
+
+def run_quote_worker(
+    index: int,
+    block_name: str,
+    capacity: int,
+    command_queue,
+    error_queue,
+    api_factory,
+    login_args: tuple
+):
+    """
+    Main function of a worker process.
+    """
+    block = SharedQuoteBlock(capacity, name=block_name)
+    decoder = QuoteWorkerDecoder(block)
+
+    try:
+        api = api_factory()
+        api.login(*login_args)
+        api.quote.set_callback(decoder.callback)
+    except Exception as exc:
+        error_queue.put(f"行情進程{index}登入失敗. [{exc}]")
+        block.close()
+        return
+
+    while True:
+        command = command_queue.get()
+        if command is None:
+            break
+
+        action, row, contract_row, quote_type = command
+        try:
+            contract = find_sj_contract(api.Contracts, contract_row)
+            if contract is None:
+                raise LookupError("無此訂閱商品")
+
+            kwargs = {} if quote_type == QUOTE_TYPE_TICK else {"quote_type": quote_type}
+            if action == COMMAND_SUBSCRIBE:
+                decoder.rows[contract_row.code] = row
+                api.quote.subscribe(contract, **kwargs)
+            else:
+                api.quote.unsubscribe(contract, **kwargs)
+        except Exception as exc:
+            error_queue.put(f"行情進程{index}訂閱失敗[{contract_row.code}]. [{exc}]")
+
+    try:
+        api.logout()
+    except Exception:
+        pass
+    block.close()
+
+
+class QuoteWorkerPool:
+    """
+    Worker processes and the reader thread of the trading process.
+
+    on_tick(code, values) is called on the reader thread with the list of
+    SHARED_FIELDS values of every row that changed.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        api_factory,
+        login_args: tuple,
+        on_tick,
+        on_error,
+        capacity: int = 4096,
+        poll_interval: float = 0.0005
+    ):
+        """"""
+        self.capacity = capacity
+        self.on_tick = on_tick
+        self.on_error = on_error
+        self.poll_interval = poll_interval
+
+        context = get_context("spawn")
+        self.error_queue = context.Queue()
+        self.blocks = [SharedQuoteBlock(capacity) for _ in range(workers)]
+        self.queues = [context.Queue() for _ in range(workers)]
+        self.processes = [
+            context.Process(
+                target=run_quote_worker,
+                args=(
+                    i, block.name, capacity, queue, self.error_queue,
+                    api_factory, login_args
+                ),
+                name=f"SinopacQuote-{i}",
+                daemon=True
+            )
+            for i, (block, queue) in enumerate(zip(self.blocks, self.queues))
+        ]
+
+        self.rows = [{} for _ in range(workers)]
+        self.codes = [[] for _ in range(workers)]
+        self.last_seq = [np.zeros(capacity, dtype=np.int64) for _ in range(workers)]
+
+        self.active = False
+        self.thread = None
+        self.ticks = 0
+
+    def get_worker(self, code: str) -> int:
+        """"""
+        return zlib.crc32(code.encode()) % len(self.processes)
+
+    def subscribe(self, contract_row, quote_type: str):
+        """"""
+        code = contract_row.code
+        worker = self.get_worker(code)
+
+        rows = self.rows[worker]
+        row = rows.get(code, None)
+        if row is None:
+            codes = self.codes[worker]
+            if len(codes) >= self.capacity:
+                raise RuntimeError("行情進程訂閱已滿")
+            row = len(codes)
+            codes.append(code)
+            rows[code] = row
+
+        self.queues[worker].put((COMMAND_SUBSCRIBE, row, contract_row, quote_type))
+
+    def unsubscribe(self, contract_row, quote_type: str):
+        """"""
+        code = contract_row.code
+        worker = self.get_worker(code)
+
+        row = self.rows[worker].get(code, None)
+        if row is not None:
+            self.queues[worker].put((COMMAND_UNSUBSCRIBE, row, contract_row, quote_type))
+
+    def start(self):
+        """"""
+        for process in self.processes:
+            process.start()
+
+        self.active = True
+        self.thread = Thread(target=self.run, name="SinopacQuoteReader", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """"""
+        if not self.active:
+            return
+        self.active = False
+        self.thread.join()
+
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+        for block in self.blocks:
+            block.close()
+
+    def run(self):
+        """"""
+        while self.active:
+            count = 0
+            for worker in range(len(self.blocks)):
+                count += self.read(worker)
+
+            while True:
+                try:
+                    self.on_error(self.error_queue.get_nowait())
+                except Empty:
+                    break
+
+            if not count:
+                sleep(self.poll_interval)
+
+    def read(self, worker: int) -> int:
+        """
+        Emit every row of worker that changed since the last read. Rows
+        being written, or rewritten while copied, are left for the next
+        read.
+        """
+        block = self.blocks[worker]
+        last_seq = self.last_seq[worker]
+
+        seq = block.seq.copy()
+        changed = np.flatnonzero((seq != last_seq) & ((seq & 1) == 0))
+        if not len(changed):
+            return 0
+
+        values = block.values[changed]
+        stable = block.seq[changed] == seq[changed]
+        changed = changed[stable]
+        values = values[stable]
+        last_seq[changed] = seq[changed]
+
+        codes = self.codes[worker]
+        for row, row_values in zip(changed.tolist(), values.tolist()):
+            self.on_tick(codes[row], row_values)
+
+        self.ticks += len(changed)
+        return len(changed)
+
+    def get_stats(self) -> dict:
+        """"""
+        return {
+            "workers": len(self.processes),
+            "alive": sum(process.is_alive() for process in self.processes),
+            "symbols": sum(len(codes) for codes in self.codes),
+            "ticks": self.ticks,
+        }
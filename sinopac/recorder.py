@@ -0,0 +1,400 @@
+# encoding: UTF-8
+
+import json
+import os
+from collections import deque
+from datetime import datetime, timedelta
+from threading import Event, Thread
+
+import numpy as np
+
+
+# (field, dtype, width): width 0 is a scalar field, otherwise the payload
+# holds a list of width values.
+PAYLOAD_SCHEMAS = {
+    "L": [
+        ("Code", "S16", 0),
+        ("Date", "S10", 0),
+        ("Time", "S15", 0),
+        ("Open", "f8", 0),
+        ("Close", "f8", 1),
+        ("High", "f8", 1),
+        ("Low", "f8", 1),
+        ("AvgPrice", "f8", 1),
+        ("Amount", "f8", 1),
+        ("AmountSum", "f8", 1),
+        ("DiffPrice", "f8", 1),
+        ("DiffRate", "f8", 1),
+        ("DiffType", "i4", 1),
+        ("TickType", "i4", 1),
+        ("VolSum", "i8", 1),
+        ("Volume", "i8", 1),
+        ("TradeAskVolSum", "i8", 0),
+        ("TradeBidVolSum", "i8", 0),
+        ("TargetKindPrice", "f8", 0),
+    ],
+    "Q": [
+        ("Code", "S16", 0),
+        ("Date", "S10", 0),
+        ("Time", "S15", 0),
+        ("BidPrice", "f8", 5),
+        ("BidVolume", "i8", 5),
+        ("AskPrice", "f8", 5),
+        ("AskVolume", "i8", 5),
+        ("DiffBidVol", "i8", 5),
+        ("DiffAskVol", "i8", 5),
+        ("BidVolSum", "i8", 0),
+        ("AskVolSum", "i8", 0),
+        ("DiffBidVolSum", "i8", 0),
+        ("DiffAskVolSum", "i8", 0),
+        ("FirstDerivedBidPrice", "f8", 0),
+        ("FirstDerivedBidVolume", "i8", 0),
+        ("FirstDerivedAskPrice", "f8", 0),
+        ("FirstDerivedAskVolume", "i8", 0),
+        ("TargetKindPrice", "f8", 0),
+    ],
+    "MKT": [
+        ("Time", "S15", 0),
+        ("Close", "f8", 1),
+        ("VolSum", "i8", 1),
+        ("Volume", "i8", 1),
+    ],
+    "QUT": [
+        ("Date", "S10", 0),
+        ("Time", "S15", 0),
+        ("BidPrice", "f8", 5),
+        ("BidVolume", "i8", 5),
+        ("AskPrice", "f8", 5),
+        ("AskVolume", "i8", 5),
+    ],
+}
+
+RECV_COLUMN = ("recv_ns", "i8", 0)
+TOPIC_COLUMN = ("topic", "S48", 0)
+
+
+def get_columns(quote_type: str) -> list:
+    """"""
+    return [RECV_COLUMN, TOPIC_COLUMN] + PAYLOAD_SCHEMAS[quote_type]
+
+
+class QuoteRecorder:
+    """
+    Append-only recorder of raw quote payloads.
+
+    record() only appends to an in-memory queue; a background writer
+    drains it and appends every field to its own column file:
+
+        <root>/<YYYYMMDD>/<quote type>/<field>.bin
+
+    Files are rotated daily by receive time and every column is a flat
+    little-endian array that QuoteLogReader maps into memory.
+    """
+
+    def __init__(self, root: str, capacity: int = 1_000_000, interval: float = 0.2):
+        """"""
+        self.root = str(root)
+        self.capacity = capacity
+        self.interval = interval
+
+        self.queue = deque()
+        self.files = {}
+
+        self.day = ""
+        self.day_start_ns = 0
+        self.day_end_ns = 0
+
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+
+        self.stop_event = Event()
+        self.thread = None
+
+    def record(self, recv_ns: int, topic: str, data: dict):
+        """
+        Non-blocking, called from the quote callback thread.
+        """
+        if len(self.queue) >= self.capacity:
+            self.dropped += 1
+            return
+        self.queue.append((recv_ns, topic, data))
+        self.recorded += 1
+
+    def start(self):
+        """"""
+        self.stop_event.clear()
+        self.thread = Thread(target=self.run, name="SinopacRecorder", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop the writer after it flushed everything already recorded.
+        """
+        if not self.thread:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        self.close_files()
+
+    def run(self):
+        """"""
+        while not self.stop_event.wait(self.interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """"""
+        queue = self.queue
+        count = len(queue)
+        if not count:
+            return
+
+        popleft = queue.popleft
+        batch = [popleft() for _ in range(count)]
+
+        groups = {}
+        for item in batch:
+            recv_ns = item[0]
+            if not self.day_start_ns <= recv_ns < self.day_end_ns:
+                self.rotate(recv_ns)
+            quote_type = item[1].split("/", 1)[0]
+            if quote_type in PAYLOAD_SCHEMAS:
+                groups.setdefault((self.day, quote_type), []).append(item)
+
+        for (day, quote_type), items in groups.items():
+            try:
+                self.write(day, quote_type, items)
+                self.written += len(items)
+            except Exception:
+                self.errors += len(items)
+
+        for f in self.files.values():
+            f.flush()
+
+    def rotate(self, recv_ns: int):
+        """
+        Switch to the day folder containing recv_ns.
+        """
+        dt = datetime.fromtimestamp(recv_ns / 1e9)
+        start = datetime(dt.year, dt.month, dt.day)
+        day = start.strftime("%Y%m%d")
+
+        if day != self.day:
+            self.close_files()
+
+        self.day = day
+        self.day_start_ns = int(start.timestamp()) * 1_000_000_000
+        self.day_end_ns = int((start + timedelta(days=1)).timestamp()) * 1_000_000_000
+
+    def write(self, day: str, quote_type: str, items: list):
+        """"""
+        columns = get_columns(quote_type)
+        arrays = [
+            np.asarray([item[0] for item in items], dtype="<i8"),
+            np.asarray([item[1] for item in items], dtype="S48"),
+        ]
+
+        payloads = [item[2] for item in items]
+        for field, dtype, width in PAYLOAD_SCHEMAS[quote_type]:
+            arrays.append(to_column(payloads, field, dtype, width))
+
+        for (field, _, _), array in zip(columns, arrays):
+            f = self.get_file(day, quote_type, field)
+            f.write(array.tobytes())
+
+    def get_file(self, day: str, quote_type: str, field: str):
+        """"""
+        key = (day, quote_type, field)
+        f = self.files.get(key, None)
+        if f is None:
+            folder = os.path.join(self.root, day, quote_type)
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+                write_meta(folder, quote_type)
+            f = open(os.path.join(folder, f"{field}.bin"), "ab")
+            self.files[key] = f
+        return f
+
+    def close_files(self):
+        """"""
+        for f in self.files.values():
+            f.close()
+        self.files.clear()
+
+    def get_stats(self) -> dict:
+        """"""
+        return {
+            "depth": len(self.queue),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+def write_meta(folder: str, quote_type: str):
+    """"""
+    meta = {
+        "quote_type": quote_type,
+        "columns": [
+            {"field": field, "dtype": np.dtype(dtype).newbyteorder("<").str, "width": width}
+            for field, dtype, width in get_columns(quote_type)
+        ],
+    }
+    with open(os.path.join(folder, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=4)
+
+
+def to_column(payloads: list, field: str, dtype: str, width: int) -> np.ndarray:
+    """
+    Gather one field of every payload into a little-endian array, using
+    zero for missing values.
+    """
+    dtype = np.dtype(dtype).newbyteorder("<")
+
+    if width == 0:
+        default = b"" if dtype.kind == "S" else 0
+        values = [data.get(field, default) for data in payloads]
+        return np.asarray(values, dtype=dtype)
+
+    if width == 1:
+        values = [(data.get(field, None) or (0,))[0] for data in payloads]
+        return np.asarray(values, dtype=dtype)
+
+    array = np.zeros((len(payloads), width), dtype=dtype)
+    for i, data in enumerate(payloads):
+        values = data.get(field, None)
+        if values:
+            values = values[:width]
+            array[i, :len(values)] = values
+    return array
+
+
+class QuoteLogReader:
+    """
+    Memory-mapped access to the column files written by QuoteRecorder.
+    """
+
+    def __init__(self, root: str):
+        """"""
+        self.root = str(root)
+
+    def get_days(self) -> list:
+        """"""
+        if not os.path.exists(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if name.isdigit() and os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def get_quote_types(self, day: str) -> list:
+        """"""
+        folder = os.path.join(self.root, day)
+        if not os.path.exists(folder):
+            return []
+        return sorted(
+            name for name in os.listdir(folder)
+            if os.path.exists(os.path.join(folder, name, "meta.json"))
+        )
+
+    def load(self, day: str, quote_type: str) -> dict:
+        """
+        Return {field: np.memmap} of one quote type. Columns are cut to
+        the shortest one, so a partially written batch is ignored.
+        """
+        folder = os.path.join(self.root, day, quote_type)
+        with open(os.path.join(folder, "meta.json")) as f:
+            meta = json.load(f)
+
+        specs = []
+        length = None
+        for column in meta["columns"]:
+            dtype = np.dtype(column["dtype"])
+            width = column["width"]
+            path = os.path.join(folder, f"{column['field']}.bin")
+
+            row_size = dtype.itemsize * max(width, 1)
+            rows = os.path.getsize(path) // row_size if os.path.exists(path) else 0
+            length = rows if length is None else min(length, rows)
+            specs.append((column["field"], dtype, width, path))
+
+        columns = {}
+        for field, dtype, width, path in specs:
+            shape = (length, width) if width > 1 else (length,)
+            if length:
+                columns[field] = np.memmap(path, dtype=dtype, mode="r", shape=shape)
+            else:
+                columns[field] = np.zeros(shape, dtype=dtype)
+        return columns
+
+    def iter_payloads(self, day: str, quote_types: list = None, chunk_size: int = 65536):
+        """
+        Yield (recv_ns, topic, data) of one day in receive order, rebuilt
+        in the same shape as the original Shioaji payloads.
+        """
+        quote_types = quote_types or self.get_quote_types(day)
+        logs = {
+            quote_type: self.load(day, quote_type)
+            for quote_type in quote_types
+        }
+
+        recv_arrays = [(log["recv_ns"], quote_type) for quote_type, log in logs.items()]
+        if not recv_arrays:
+            return
+
+        recv_ns = np.concatenate([array for array, _ in recv_arrays])
+        type_ids = np.concatenate([
+            np.full(len(array), i, dtype=np.int8)
+            for i, (array, _) in enumerate(recv_arrays)
+        ])
+        positions = np.concatenate([
+            np.arange(len(array), dtype=np.int64) for array, _ in recv_arrays
+        ])
+
+        order = np.argsort(recv_ns, kind="stable")
+        for start in range(0, len(order), chunk_size):
+            index = order[start:start + chunk_size]
+            chunk_types = type_ids[index]
+            chunk_positions = positions[index]
+
+            payloads = [None] * len(index)
+            for type_id, (_, quote_type) in enumerate(recv_arrays):
+                mask = chunk_types == type_id
+                if not mask.any():
+                    continue
+
+                slots = np.nonzero(mask)[0].tolist()
+                rows = self.get_payloads(
+                    logs[quote_type], quote_type, chunk_positions[mask])
+                for slot, payload in zip(slots, rows):
+                    payloads[slot] = payload
+
+            yield from payloads
+
+    @staticmethod
+    def get_payloads(log: dict, quote_type: str, positions: np.ndarray) -> list:
+        """
+        Rebuild (recv_ns, topic, data) of the rows at positions.
+        """
+        fields = []
+        values = []
+        for field, dtype, width in PAYLOAD_SCHEMAS[quote_type]:
+            column = log[field][positions].tolist()
+            if dtype.startswith("S"):
+                column = [value.decode() for value in column]
+            elif width == 1:
+                column = [[value] for value in column]
+            fields.append(field)
+            values.append(column)
+
+        recv_ns = log["recv_ns"][positions].tolist()
+        topics = [topic.decode() for topic in log["topic"][positions].tolist()]
+
+        return [
+            (recv, topic, dict(zip(fields, row)))
+            for recv, topic, row in zip(recv_ns, topics, zip(*values))
+        ]
@@ -0,0 +1,594 @@
+# encoding: UTF-8
+"""
+Offline stand-in for the parts of sj.Shioaji used by SinopacGateway and a
+driver replaying recorded or synthetic quote payloads into it.
+
+    api = ReplayShioaji.from_codes(futures=["TXFF9"], stocks=["2330"])
+    gateway = SinopacGateway(event_engine, api=api)
+    gateway.connect(setting)
+
+    source = QuoteLogReader(folder).iter_payloads("20190516")
+    replayer = QuoteReplayer(api, source, speed=10)
+    replayer.start()
+"""
+
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta
+from itertools import count
+from threading import Event, Lock, Thread
+from time import perf_counter_ns, sleep, time_ns
+from types import SimpleNamespace
+
+from shioaji.account import StockAccount, FutureAccount
+from shioaji.order import Status as SinopacStatus
+
+from .contract_snapshot import (
+    ContractRow,
+    PRODUCT_FUTURES,
+    PRODUCT_OPTION,
+    PRODUCT_STOCK
+)
+
+
+class ReplayContract(SimpleNamespace):
+    """
+    Contract object supporting both attribute and item access.
+    """
+
+    def __getitem__(self, key: str):
+        """"""
+        return getattr(self, key)
+
+
+class ReplayCategory(list):
+    """"""
+
+    def __init__(self, name: str, contracts: list):
+        """"""
+        super().__init__(contracts)
+        self.name = name
+        self.codes = {contract.code: contract for contract in contracts}
+
+    def __getitem__(self, key):
+        """"""
+        if isinstance(key, str):
+            return self.codes[key]
+        return super().__getitem__(key)
+
+
+class ReplayContractGroup:
+    """
+    api.Contracts.Futures/Options/Stocks: iterable over categories,
+    indexable by code and exposing every category as an attribute.
+    """
+
+    def __init__(self, contracts: list):
+        """"""
+        categories = {}
+        for contract in contracts:
+            categories.setdefault(contract.category, []).append(contract)
+
+        self.categories = {
+            name: ReplayCategory(name, items) for name, items in categories.items()
+        }
+        self.codes = {contract.code: contract for contract in contracts}
+
+    def __iter__(self):
+        """"""
+        return iter(self.categories.values())
+
+    def __getitem__(self, code: str):
+        """"""
+        return self.codes[code]
+
+    def __getattr__(self, name: str):
+        """"""
+        try:
+            return self.__dict__["categories"][name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class ReplayQuote:
+    """"""
+
+    def __init__(self):
+        """"""
+        self.callback = None
+        self.subscriptions = set()
+
+    def set_callback(self, callback):
+        """"""
+        self.callback = callback
+
+    def subscribe(self, contract, quote_type: str = "tick"):
+        """"""
+        self.subscriptions.add((contract.code, quote_type))
+
+    def unsubscribe(self, contract, quote_type: str = "tick"):
+        """"""
+        self.subscriptions.discard((contract.code, quote_type))
+
+
+class ReplayProfitLoss:
+    """"""
+
+    def __init__(self, summary: list):
+        """"""
+        self.summary = summary
+
+    def update(self):
+        """"""
+        pass
+
+    def data(self) -> dict:
+        """"""
+        return {"summary": self.summary}
+
+
+class ReplayAccountData:
+    """
+    Result of get_account_openposition/get_account_margin.
+    """
+
+    def __init__(self, rows: list):
+        """"""
+        self.rows = rows
+
+    def update(self):
+        """"""
+        pass
+
+    def data(self) -> list:
+        """"""
+        return list(self.rows)
+
+
+ReplayOrderStatus = namedtuple(
+    "ReplayOrderStatus",
+    ["status", "deal_quantity", "order_datetime", "order_id"]
+)
+
+
+class ReplayShioaji:
+    """
+    Local replacement for sj.Shioaji.
+
+    Orders are accepted as Submitted. With fill_on_update, every call of
+    update_status fills fill_quantity lots of each working order. Orders
+    and account queries take latency seconds.
+    """
+
+    def __init__(
+        self,
+        contracts: list = None,
+        accounts: list = None,
+        fill_on_update: bool = False,
+        fill_quantity: int = 1,
+        latency: float = 0
+    ):
+        """"""
+        contracts = [
+            self.make_contract(row) if isinstance(row, ContractRow) else row
+            for row in contracts or []
+        ]
+
+        self.Contracts = SimpleNamespace(
+            Futures=ReplayContractGroup(
+                [c for c in contracts if c.product == PRODUCT_FUTURES]),
+            Options=ReplayContractGroup(
+                [c for c in contracts if c.product == PRODUCT_OPTION]),
+            Stocks=ReplayContractGroup(
+                [c for c in contracts if c.product == PRODUCT_STOCK]),
+        )
+
+        self.accounts = accounts if accounts is not None else [
+            make_account(StockAccount, account_id="0000001"),
+            make_account(FutureAccount, account_id="0000002"),
+        ]
+        self.default_accounts = []
+
+        self.quote = ReplayQuote()
+        self.fill_on_update = fill_on_update
+        self.fill_quantity = fill_quantity
+        self.latency = latency
+
+        self.trades = []
+        self.seqno = count(1)
+        self.lock = Lock()
+
+        self.stock_positions = []
+        self.futures_positions = []
+        self.futures_margin = []
+
+    @staticmethod
+    def make_contract(row: ContractRow) -> ReplayContract:
+        """"""
+        exchange = "TSE" if row.product == PRODUCT_STOCK else "TAIFEX"
+        return ReplayContract(exchange=exchange, **row._asdict())
+
+    @classmethod
+    def from_codes(cls, futures: list = (), stocks: list = (), **kwargs):
+        """
+        Stand-in API knowing only the given futures and stock codes.
+        """
+        rows = [
+            ContractRow(code, code, PRODUCT_FUTURES, code[:3], "", 1.0, 0, "", "")
+            for code in futures
+        ]
+        rows += [
+            ContractRow(code, code, PRODUCT_STOCK, "", "", 0.01, 0, "", "")
+            for code in stocks
+        ]
+        return cls(contracts=rows, **kwargs)
+
+    def login(self, person_id: str, passwd: str, *args, **kwargs) -> list:
+        """"""
+        return self.accounts
+
+    def logout(self):
+        """"""
+        pass
+
+    def list_accounts(self) -> list:
+        """"""
+        return list(self.accounts)
+
+    def set_default_account(self, account):
+        """"""
+        self.default_accounts.append(account)
+
+    def activate_ca(self, ca_path: str, ca_passwd: str, person_id: str, *args, **kwargs):
+        """"""
+        return True
+
+    def Order(self, price, quantity, action, price_type, order_type, **kwargs):
+        """"""
+        return SimpleNamespace(
+            price=price,
+            quantity=quantity,
+            action=action,
+            price_type=price_type,
+            order_type=order_type,
+            seqno=f"{next(self.seqno):06d}",
+            **kwargs
+        )
+
+    def place_order(self, contract, order, *args, **kwargs):
+        """"""
+        if self.latency:
+            sleep(self.latency)
+
+        trade = SimpleNamespace(
+            contract=contract,
+            order=order,
+            status=ReplayOrderStatus(
+                status=SinopacStatus.Submitted,
+                deal_quantity=0,
+                order_datetime=datetime.now(),
+                order_id=order.seqno,
+            ),
+        )
+        with self.lock:
+            self.trades.append(trade)
+        return trade
+
+    def cancel_order(self, trade, *args, **kwargs):
+        """"""
+        if self.latency:
+            sleep(self.latency)
+
+        with self.lock:
+            if trade.status.status in (SinopacStatus.Submitted, SinopacStatus.Filling):
+                trade.status = trade.status._replace(status=SinopacStatus.Cancelled)
+        return trade
+
+    def update_status(self, *args, **kwargs):
+        """"""
+        if not self.fill_on_update:
+            return
+
+        with self.lock:
+            for trade in self.trades:
+                status = trade.status
+                if status.status not in (SinopacStatus.Submitted, SinopacStatus.Filling):
+                    continue
+
+                deal_quantity = min(
+                    status.deal_quantity + self.fill_quantity,
+                    trade.order.quantity
+                )
+                trade.status = status._replace(
+                    deal_quantity=deal_quantity,
+                    status=(
+                        SinopacStatus.Filled
+                        if deal_quantity >= trade.order.quantity
+                        else SinopacStatus.Filling
+                    )
+                )
+
+    def list_trades(self) -> list:
+        """"""
+        with self.lock:
+            return list(self.trades)
+
+    def get_stock_account_unreal_profitloss(self, *args, **kwargs):
+        """"""
+        if self.latency:
+            sleep(self.latency)
+        return ReplayProfitLoss(self.stock_positions)
+
+    def get_account_openposition(self, *args, **kwargs):
+        """"""
+        if self.latency:
+            sleep(self.latency)
+        return ReplayAccountData(self.futures_positions)
+
+    def get_account_margin(self, *args, **kwargs):
+        """"""
+        if self.latency:
+            sleep(self.latency)
+        return ReplayAccountData(self.futures_margin)
+
+    def kbars(self, contract, start: str, end: str, *args, **kwargs):
+        """
+        Synthetic 1-minute bars 08:46-13:45 of every weekday in range.
+        """
+        if self.latency:
+            sleep(self.latency)
+
+        bars = {name: [] for name in ["ts", "Open", "High", "Low", "Close", "Volume", "Amount"]}
+        day = datetime.strptime(start, "%Y-%m-%d")
+        while day <= datetime.strptime(end, "%Y-%m-%d"):
+            for dt, price in history_walk(contract.code, day, 300, 60):
+                bars["ts"].append(int((dt - EPOCH).total_seconds()) * 1_000_000_000)
+                bars["Open"].append(price)
+                bars["High"].append(price + 1)
+                bars["Low"].append(price - 1)
+                bars["Close"].append(price)
+                bars["Volume"].append(10)
+                bars["Amount"].append(price * 10)
+            day += timedelta(days=1)
+        return SimpleNamespace(**bars)
+
+    def ticks(self, contract, date: str, *args, **kwargs):
+        """
+        Synthetic ticks every 10 seconds 08:45-13:45 of a weekday.
+        """
+        if self.latency:
+            sleep(self.latency)
+
+        ticks = {name: [] for name in [
+            "ts", "close", "volume", "bid_price", "bid_volume", "ask_price", "ask_volume"]}
+        day = datetime.strptime(date, "%Y-%m-%d")
+        for dt, price in history_walk(contract.code, day, 1800, 10):
+            ticks["ts"].append(int((dt - EPOCH).total_seconds()) * 1_000_000_000)
+            ticks["close"].append(price)
+            ticks["volume"].append(1)
+            ticks["bid_price"].append(price - 1)
+            ticks["bid_volume"].append(5)
+            ticks["ask_price"].append(price + 1)
+            ticks["ask_volume"].append(5)
+        return SimpleNamespace(**ticks)
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def history_walk(code: str, day: datetime, size: int, seconds: int):
+    """
+    Yield size (datetime, price) of a random walk from 08:45 of a
+    weekday, seeded by code and day.
+    """
+    if day.weekday() >= 5:
+        return
+
+    rng = random.Random(f"{code}{day:%Y%m%d}")
+    dt = day.replace(hour=8, minute=45)
+    price = 10000.0
+    for _ in range(size):
+        dt += timedelta(seconds=seconds)
+        price += rng.choice((-1, 0, 1))
+        yield dt, price
+
+
+def make_account(account_class, account_id: str, **kwargs):
+    """
+    Shioaji account object, or a plain namespace if the installed shioaji
+    requires other fields.
+    """
+    fields = {
+        "person_id": "A123456789",
+        "broker_id": "9A95",
+        "account_id": account_id,
+        "username": "replay",
+        "signed": True,
+    }
+    fields.update(kwargs)
+
+    try:
+        return account_class(**fields)
+    except Exception:
+        return SimpleNamespace(**fields)
+
+
+class QuoteReplayer:
+    """
+    Feed (recv_ns, topic, data) payloads into the callback registered on
+    api.quote.
+
+    speed None replays as fast as possible, otherwise the gaps between
+    receive times are replayed speed times faster than real time.
+    """
+
+    def __init__(
+        self,
+        api: ReplayShioaji,
+        source,
+        speed: float = None,
+        subscribed_only: bool = False
+    ):
+        """"""
+        self.api = api
+        self.source = source
+        self.speed = speed
+        self.subscribed_only = subscribed_only
+
+        self.sent = 0
+        self.skipped = 0
+        self.start_ns = 0
+        self.end_ns = 0
+
+        self.stop_event = Event()
+        self.thread = None
+
+    def start(self):
+        """"""
+        self.stop_event.clear()
+        self.thread = Thread(target=self.run, name="SinopacReplayer", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def join(self, timeout: float = None):
+        """"""
+        if self.thread:
+            self.thread.join(timeout)
+
+    def run(self):
+        """"""
+        quote = self.api.quote
+        callback = quote.callback
+        speed = self.speed
+        subscriptions = quote.subscriptions
+        stop_event = self.stop_event
+
+        first_recv_ns = None
+        self.start_ns = perf_counter_ns()
+
+        for recv_ns, topic, data in self.source:
+            if stop_event.is_set():
+                break
+
+            if self.subscribed_only:
+                code = data.get("Code", None) or topic.rsplit("/", 1)[-1]
+                if (code, "tick") not in subscriptions and (code, "bidask") not in subscriptions:
+                    self.skipped += 1
+                    continue
+
+            if speed:
+                if first_recv_ns is None:
+                    first_recv_ns = recv_ns
+                due_ns = self.start_ns + (recv_ns - first_recv_ns) / speed
+                wait_ns = due_ns - perf_counter_ns()
+                if wait_ns > 0:
+                    sleep(wait_ns / 1e9)
+
+            callback(topic, data)
+            self.sent += 1
+
+        self.end_ns = perf_counter_ns()
+
+    def get_stats(self) -> dict:
+        """"""
+        end_ns = self.end_ns or perf_counter_ns()
+        elapsed = max(end_ns - self.start_ns, 1) / 1e9
+        return {
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "elapsed": elapsed,
+            "rate": self.sent / elapsed,
+        }
+
+
+QUOTE_MIX = {"L": 1, "Q": 3, "MKT": 1, "QUT": 3}
+
+
+def synthetic_payloads(
+    futures: list = (),
+    stocks: list = (),
+    size: int = 100_000,
+    mix: dict = None,
+    interval_ns: int = 100_000,
+    start_ns: int = None,
+    seed: int = 0
+):
+    """
+    Yield size random-walk (recv_ns, topic, data) payloads shaped like the
+    Shioaji L/Q (futures) and MKT/QUT (stocks) messages.
+    """
+    mix = mix or QUOTE_MIX
+    rng = random.Random(seed)
+
+    kinds = []
+    if futures:
+        kinds += [("L", code) for code in futures for _ in range(mix.get("L", 0))]
+        kinds += [("Q", code) for code in futures for _ in range(mix.get("Q", 0))]
+    if stocks:
+        kinds += [("MKT", code) for code in stocks for _ in range(mix.get("MKT", 0))]
+        kinds += [("QUT", code) for code in stocks for _ in range(mix.get("QUT", 0))]
+    if not kinds:
+        return
+
+    prices = {code: 10000.0 for code in futures}
+    prices.update({code: 100.0 for code in stocks})
+    volumes = dict.fromkeys(prices, 0)
+
+    recv_ns = start_ns if start_ns is not None else time_ns()
+    for _ in range(size):
+        quote_type, code = rng.choice(kinds)
+        tick = 1.0 if quote_type in ("L", "Q") else 0.5
+        price = prices[code] = max(prices[code] + rng.choice((-tick, 0, tick)), tick)
+
+        dt = datetime.fromtimestamp(recv_ns / 1e9)
+        date_text = dt.strftime("%Y/%m/%d")
+        time_text = dt.strftime("%H:%M:%S.%f")
+
+        if quote_type in ("L", "MKT"):
+            volume = rng.randint(1, 10)
+            volumes[code] += volume
+
+        if quote_type == "L":
+            topic = f"L/TFE/{code}"
+            data = {
+                "Code": code, "Date": date_text, "Time": time_text,
+                "Open": 10000.0, "Close": [price], "High": [price + 10],
+                "Low": [price - 10], "DiffPrice": [price - 10000.0],
+                "VolSum": [volumes[code]], "Volume": [volume],
+                "TargetKindPrice": price + 3.5, "TickType": [1],
+            }
+        elif quote_type == "Q":
+            topic = f"Q/TFE/{code}"
+            data = {
+                "Code": code, "Date": date_text, "Time": time_text,
+                "BidPrice": [price - i for i in range(5)],
+                "AskPrice": [price + 1 + i for i in range(5)],
+                "BidVolume": [rng.randint(1, 100) for _ in range(5)],
+                "AskVolume": [rng.randint(1, 100) for _ in range(5)],
+                "DiffBidVol": [0] * 5, "DiffAskVol": [0] * 5,
+                "TargetKindPrice": price + 3.5,
+            }
+        elif quote_type == "MKT":
+            topic = f"MKT/idcdmzpcr01/TSE/{code}"
+            data = {
+                "Time": time_text, "Close": [price],
+                "VolSum": [volumes[code]], "Volume": [volume],
+            }
+        else:
+            topic = f"QUT/idcdmzpcr01/TSE/{code}"
+            data = {
+                "Date": date_text, "Time": time_text,
+                "BidPrice": [price - 0.5 * i for i in range(5)],
+                "AskPrice": [price + 0.5 * (i + 1) for i in range(5)],
+                "BidVolume": [rng.randint(1, 500) for _ in range(5)],
+                "AskVolume": [rng.randint(1, 500) for _ in range(5)],
+            }
+
+        yield recv_ns, topic, data
+        recv_ns += interval_ns
@@ -0,0 +1,130 @@
+# encoding: UTF-8
+
+from threading import Event, Lock, Thread
+from time import monotonic
+
+
+class PollingJob:
+    """"""
+
+    def __init__(self, name: str, func, active_interval: float, idle_interval: float):
+        """"""
+        self.name = name
+        self.func = func
+        self.active_interval = active_interval
+        self.idle_interval = idle_interval
+
+        self.interval = active_interval
+        self.next_time = 0.0
+        self.last_duration = 0.0
+        self.runs = 0
+        self.errors = 0
+
+
+class PollingScheduler:
+    """
+    Run polling jobs on one worker thread with adaptive intervals.
+
+    After every run a job is rescheduled at its active interval while
+    is_active() is true, otherwise its interval grows by backoff up to its
+    idle interval. wake() brings every job back to its active interval,
+    e.g. right after an order was sent. Jobs run one at a time, so a
+    query never overlaps with itself.
+    """
+
+    def __init__(self, is_active, on_complete=None, on_error=None, backoff: float = 2.0):
+        """
+        on_complete(job) is called after every run.
+        """
+        self.is_active = is_active
+        self.on_complete = on_complete
+        self.on_error = on_error
+        self.backoff = backoff
+
+        self.jobs = []
+        self.lock = Lock()
+        self.wake_event = Event()
+        self.active = False
+        self.thread = None
+
+    def add_job(self, name: str, func, active_interval: float, idle_interval: float):
+        """"""
+        with self.lock:
+            self.jobs.append(PollingJob(name, func, active_interval, idle_interval))
+
+    def start(self):
+        """"""
+        self.active = True
+        self.thread = Thread(target=self.run, name="SinopacPolling", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """"""
+        self.active = False
+        self.wake_event.set()
+
+    def wake(self):
+        """
+        Poll at active intervals again, starting within one interval.
+        """
+        now = monotonic()
+        with self.lock:
+            for job in self.jobs:
+                job.interval = job.active_interval
+                job.next_time = min(job.next_time, now + job.active_interval)
+        self.wake_event.set()
+
+    def run(self):
+        """"""
+        while self.active:
+            with self.lock:
+                job = min(self.jobs, key=lambda job: job.next_time, default=None)
+                wait = job.next_time - monotonic() if job else 1.0
+
+            if wait > 0:
+                self.wake_event.wait(wait)
+                self.wake_event.clear()
+                continue
+
+            self.run_job(job)
+
+    def run_job(self, job: PollingJob):
+        """"""
+        start = monotonic()
+        try:
+            job.func()
+        except Exception as exc:
+            job.errors += 1
+            if self.on_error:
+                self.on_error(job.name, exc)
+        end = monotonic()
+
+        try:
+            active = self.is_active()
+        except Exception:
+            active = True
+
+        with self.lock:
+            job.runs += 1
+            job.last_duration = end - start
+            if active:
+                job.interval = job.active_interval
+            else:
+                job.interval = min(job.interval * self.backoff, job.idle_interval)
+            job.next_time = end + job.interval
+
+        if self.on_complete:
+            self.on_complete(job)
+
+    def get_stats(self) -> dict:
+        """"""
+        with self.lock:
+            return {
+                job.name: {
+                    "interval": job.interval,
+                    "duration": job.last_duration,
+                    "runs": job.runs,
+                    "errors": job.errors,
+                }
+                for job in self.jobs
+            }
@@ -2,10 +2,12 @@
 
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, wait
 from copy import copy
 from datetime import datetime
-from threading import Thread
-from time import sleep
+from operator import attrgetter
+from threading import Lock, Thread
+from time import monotonic, sleep, time_ns
 import shioaji as sj
 from shioaji.order import Status as SinopacStatus
 from shioaji import constant
@@ -19,12 +21,15 @@ from vnpy.trader.constant import (
     OptionType,
     Status,
     OrderType,
-    Offset
+    Offset,
+    Interval
 )
 from vnpy.trader.event import EVENT_TIMER
 from vnpy.trader.gateway import BaseGateway
+from vnpy.trader.utility import get_file_path, get_folder_path
 from vnpy.trader.object import (
     TickData,
+    BarData,
     OrderData,
     TradeData,
     AccountData,
@@ -32,9 +37,46 @@ from vnpy.trader.object import (
     PositionData,
     SubscribeRequest,
     OrderRequest,
-    CancelRequest
+    CancelRequest,
+    HistoryRequest
 )
 
+from .bar_aggregator import BarAggregator
+from .contract_snapshot import (
+    ContractSnapshot,
+    contract_to_row,
+    find_sj_contract,
+    get_trading_session,
+    PRODUCT_FUTURES,
+    PRODUCT_OPTION,
+    PRODUCT_STOCK
+)
+from .contract_registry import ContractRegistry
+from .history import (
+    HistoryCache,
+    HistoryLoader,
+    day_volume_sum,
+    to_datetimes,
+    KIND_KBAR,
+    KIND_TICK
+)
+from .quote_buffer import QuoteRingBuffer, QuoteDecoder, QUEUE_POLICIES
+from .quote_worker import QuoteWorkerPool, SHARED_FIELDS
+from .latency import LatencyMonitor, STAGE_TOTAL
+from .option_chain import OptionChainEngine
+from .order_book import OrderBookStore
+from .order_pipeline import OrderPipeline, BackgroundLogger
+from .recorder import QuoteRecorder
+from .scheduler import PollingScheduler
+from .snapshot import SnapshotService
+from .startup import StartupPipeline
+from .subscription import (
+    SubscriptionManager,
+    QUOTE_TYPE_TICK,
+    QUOTE_TYPE_BOTH
+)
+from .utility import TickConflator, TimestampDecoder, RateLimiter, snapshot
+
 
 EXCHANGE_VT2SINOPAC = {
     Exchange.TSE: "TSE",
@@ -54,6 +96,46 @@ STATUS_SINOPAC2VT = {
     SinopacStatus.Inactive: Status.SUBMITTING,
 }
 
+SINOPAC_FINAL_STATUSES = {
+    SinopacStatus.Cancelled,
+    SinopacStatus.Failed,
+    SinopacStatus.Filled,
+}
+
+TRADE_QUOTE_TYPES = {"L", "MKT"}
+FUTURES_QUOTE_TYPES = {"L", "Q"}
+BOOK_QUOTE_TYPES = {"Q", "QUT"}
+
+EVENT_SINOPAC_LATENCY = "eSinopacLatency"
+EVENT_SINOPAC_BOOK = "eSinopacBook"
+EVENT_SINOPAC_BAR = "eSinopacBar."
+EVENT_SINOPAC_QUERY = "eSinopacQuery"
+EVENT_SINOPAC_STARTUP = "eSinopacStartup"
+EVENT_SINOPAC_CHAIN = "eSinopacChain"
+
+# (active interval, idle interval) in seconds of every polling query.
+QUERY_INTERVALS = {
+    "trade": (1, 20),
+    "position": (5, 60),
+}
+FILL_ACTIVE_SECONDS = 30
+
+# Stages an order has to wait for, at most STARTUP_TIMEOUT seconds.
+TRADING_STAGES = ("accounts", "ca")
+STARTUP_TIMEOUT = 30
+
+
+def clear_position(position: PositionData):
+    """
+    Position to emit when it disappeared from the snapshot.
+    """
+    position = copy(position)
+    position.volume = 0
+    position.frozen = 0
+    position.pnl = 0
+    position.yd_volume = 0
+    return position
+
 
 class SinopacGateway(BaseGateway):
     """
@@ -67,83 +149,215 @@ class SinopacGateway(BaseGateway):
         "憑證密碼": "",
         "環境": ["正式", "模擬"],
         "預設現貨帳號": "0",
-        "預設期貨帳號": "0"
+        "預設期貨帳號": "0",
+        "行情佇列模式": ["關閉"] + QUEUE_POLICIES,
+        "行情佇列大小": 65536,
+        "行情合併視窗(毫秒)": 0,
+        "成交不合併": ["是", "否"],
+        "合約快取": ["開啟", "關閉"],
+        "訂閱速率(次/秒)": 50,
+        "訂閱上限": 0,
+        "行情錄製": ["關閉", "開啟"],
+        "延遲統計週期(秒)": 0,
+        "非同步下單": ["關閉", "開啟"],
+        "下單速率(次/秒)": 25,
+        "批次下單併發數": 8,
+        "五檔簿": ["關閉", "開啟"],
+        "五檔指標週期(秒)": 0,
+        "K線合成": ["關閉", "開啟"],
+        "K線週期(分鐘)": 1,
+        "選擇權鏈": ["關閉", "開啟"],
+        "選擇權鏈週期(秒)": 1,
+        "行情進程數": 0,
+        "歷史快取": ["開啟", "關閉"],
+        "歷史下載併發數": 4
     }
 
     exchanges = list(EXCHANGE_SINOPAC2VT.values())
 
-    def __init__(self, event_engine):
-        """Constructor"""
+    def __init__(self, event_engine, *, api=None):
+        """
+        api: optional stand-in for sj.Shioaji, e.g. replay.ReplayShioaji.
+        """
         super(SinopacGateway, self).__init__(event_engine, "Sinopac")
 
-        self.subscribed = set()
+        self.subscription_manager = SubscriptionManager(
+            self.subscribe_quote, self.unsubscribe_quote)
         self.userid = ""
         self.password = ""
         self.ticks = {}
-        self.code2contract = {}
+        self.contract_registry = ContractRegistry()
+        self.sj_contracts = {}
+        self.contract_snapshot = None
+        self.contract_batch_size = 1000
+        self.timestamp_decoder = TimestampDecoder()
+
+        self.order_states = {}
+        self.order_lock = Lock()
+        self.seqno_orderids = {}
+        self.order_prefix = datetime.now().strftime("%H%M%S")
+        self.order_count = 0
+        self.order_pipeline = None
+        self.order_logger = BackgroundLogger(self.write_log)
+        self.sj_trades = {}
+        self.orderid_seqnos = {}
+        self.placing_orderids = set()
+        self.pending_cancels = set()
+        self.trade_query_lock = Lock()
+        self.order_executor = ThreadPoolExecutor(
+            8, thread_name_prefix="SinopacBatch")
+        self.order_limiter = RateLimiter(25)
+
+        self.working_orders = set()
+        self.last_fill_time = 0
+
+        self.quote_decoder = None
+        self.conflator = None
+        self.recorder = None
+        self.latency_monitor = None
+        self.latency_interval = 0
+        self.latency_count = 0
+        self.order_book = None
+        self.book_interval = 0
+        self.book_count = 0
+        self.bar_aggregator = None
+        self.option_chains = None
+        self.chain_interval = 0
+        self.chain_count = 0
+        self.quote_workers = None
+        self.quote_api_factory = sj.Shioaji
+        self.history_loader = None
+
+        self.api = api if api is not None else sj.Shioaji()
+
+        self.scheduler = PollingScheduler(
+            self.is_trading_active,
+            on_complete=self.process_query_complete,
+            on_error=lambda name, exc: self.write_log(f"查詢失敗[{name}]. [{exc}]")
+        )
+        self.scheduler.add_job("trade", self.query_trade, *QUERY_INTERVALS["trade"])
+        self.scheduler.add_job("position", self.query_position, *QUERY_INTERVALS["position"])
 
-        self.trades = set()
+        self.stock_account = None
+        self.futures_account = None
+        self.snapshot_service = SnapshotService(
+            on_error=lambda name, exc: self.write_log(f"查詢失敗[{name}]. [{exc}]"))
+        self.init_snapshot_sources()
 
-        self.count = 0
-        self.interval = 20
+        self.startup = StartupPipeline(self.process_startup_stage)
+        self.subscription_lock = Lock()
+        self.pending_subscriptions = []
 
-        self.thread = Thread(target=self.query_data)
-        self.query_funcs = [self.query_position, self.query_trade]
-        self.api = sj.Shioaji()
+    def init_snapshot_sources(self):
+        """
+        Futures sources are only added if the API supports them.
+        """
+        get_positionid = attrgetter("vt_positionid")
+        get_accountid = attrgetter("vt_accountid")
+
+        self.snapshot_service.add_source(
+            "stock_position", self.fetch_stock_positions, self.on_position,
+            get_positionid, clear_position)
+
+        if hasattr(self.api, "get_account_openposition"):
+            self.snapshot_service.add_source(
+                "futures_position", self.fetch_futures_positions, self.on_position,
+                get_positionid, clear_position)
+
+        if hasattr(self.api, "get_account_margin"):
+            self.snapshot_service.add_source(
+                "futures_account", self.fetch_futures_account, self.on_account,
+                get_accountid)
 
     def activate_ca(self, ca_path, ca_password, ca_id):
         self.api.activate_ca(
             ca_path=ca_path, ca_passwd=ca_password, person_id=ca_id)
 
     def query_trade(self):
-        self.api.update_status()
-        trades = self.api.list_trades()
-        for item in trades:
-            if item.status in [SinopacStatus.Filling, SinopacStatus.Filled]:  # 成交
-                tradeid = item.status.order_id
-                if tradeid in self.trades:
-                    continue
-                self.trades.add(tradeid)
-                trade = TradeData(
-                    symbol=f'{item.contract.code} {item.contract.name}',
-                    exchange=EXCHANGE_SINOPAC2VT.get(
-                        item.contract.exchange, Exchange.TSE),
-                    direction=Direction.LONG if item.order.action == "Buy" else Direction.SHORT,
-                    tradeid=tradeid,
-                    orderid=item.order.seqno,
-                    price=float(item.order.price),
-                    volume=float(item.order.quantity),
-                    time=item.status.order_datetime,
-                    gateway_name=self.gateway_name,
-                )
-                self.on_trade(trade)
-            else:
-                order = OrderData(
-                    symbol=f'{item.contract.code} {item.contract.name}',
-                    exchange=EXCHANGE_SINOPAC2VT.get(
-                        item.contract.exchange, Exchange.TSE),
-                    orderid=item.order.seqno,
-                    direction=Direction.LONG if item.order.action == "Buy" else Direction.SHORT,
-                    price=float(item.order.price),
-                    volume=float(item.order.quantity),
-                    traded=float(item.status.deal_quantity),
-                    status=STATUS_SINOPAC2VT[item.status.status],
-                    time=item.status.order_datetime,
-                    gateway_name=self.gateway_name,
-                )
-                self.on_order(order)
+        """
+        Emit order and trade updates for orders whose state changed since
+        the last query. Broker status queries are serialised by
+        trade_query_lock.
+        """
+        with self.trade_query_lock:
+            self.api.update_status()
+            items = self.api.list_trades()
+
+        for item in items:
+            self.update_trade(item)
 
-    def query_data(self):
+    def update_trade(self, item):
         """
-        Query all data necessary.
+        Compare a Shioaji trade against the cached (status, deal_quantity)
+        of its seqno and emit only the transition.
         """
-        sleep(2.0)  # Wait 2 seconds till connection completed.
+        seqno = item.order.seqno
+        status = item.status.status
+        deal_quantity = float(item.status.deal_quantity)
 
-        self.query_position()
-        self.query_trade()
+        with self.order_lock:
+            last_state = self.order_states.get(seqno, None)
+            if last_state == (status, deal_quantity):
+                return
+            self.order_states[seqno] = (status, deal_quantity)
+            self.sj_trades[seqno] = item
+            if status in SINOPAC_FINAL_STATUSES:
+                self.working_orders.discard(seqno)
+            else:
+                self.working_orders.add(seqno)
+        last_deal_quantity = last_state[1] if last_state else 0
+        orderid = self.seqno_orderids.get(seqno, seqno)
+
+        symbol = f'{item.contract.code} {item.contract.name}'
+        exchange = EXCHANGE_SINOPAC2VT.get(item.contract.exchange, Exchange.TSE)
+        direction = Direction.LONG if item.order.action == "Buy" else Direction.SHORT
+
+        if deal_quantity > last_deal_quantity:  # 成交
+            self.last_fill_time = monotonic()
+            trade = TradeData(
+                symbol=symbol,
+                exchange=exchange,
+                direction=direction,
+                tradeid=f"{seqno}-{deal_quantity:g}",
+                orderid=orderid,
+                price=float(item.order.price),
+                volume=deal_quantity - last_deal_quantity,
+                time=item.status.order_datetime,
+                gateway_name=self.gateway_name,
+            )
+            self.on_trade(trade)
 
-        # Start fixed interval query.
-        self.event_engine.register(EVENT_TIMER, self.process_timer_event)
+        order = OrderData(
+            symbol=symbol,
+            exchange=exchange,
+            orderid=orderid,
+            direction=direction,
+            price=float(item.order.price),
+            volume=float(item.order.quantity),
+            traded=deal_quantity,
+            status=STATUS_SINOPAC2VT[status],
+            time=item.status.order_datetime,
+            gateway_name=self.gateway_name,
+        )
+        self.on_order(order)
+
+    def is_trading_active(self):
+        """
+        Poll at active intervals while orders are working or shortly
+        after a fill.
+        """
+        if self.working_orders:
+            return True
+        return monotonic() - self.last_fill_time < FILL_ACTIVE_SECONDS
+
+    def process_query_complete(self, job):
+        """"""
+        data = {
+            "name": job.name,
+            "duration": job.last_duration,
+            "interval": job.interval,
+        }
+        self.on_event(EVENT_SINOPAC_QUERY, data)
 
     def connect(self, setting: dict):
 
@@ -155,130 +369,709 @@ class SinopacGateway(BaseGateway):
             self.write_log(f"登入失败. [{exc}]")
             return
         self.write_log(f"登入成功. [{userid}]")
-        self.select_default_account(setting.get(
-            '預設現貨帳號', 0), setting.get('預設期貨帳號', 0))
-        self.query_contract()
-        self.write_log("合约查询成功")
-        self.query_position()
-        self.write_log("庫存部位查詢")
-        if setting['憑證檔案路徑'] != "":
-            self.activate_ca(setting['憑證檔案路徑'],
-                             setting['憑證密碼'], setting['身份證字號'])
+        if setting.get("合約快取", "開啟") == "開啟":
+            self.contract_snapshot = ContractSnapshot(
+                get_file_path("sinopac_contracts.pkl"))
 
+        self.init_startup(setting)
+        self.init_subscription(setting)
+        self.init_conflator(setting)
+        self.init_quote_decoder(setting)
+        self.init_recorder(setting)
+        self.init_latency_monitor(setting)
+        self.init_order_pipeline(setting)
+        self.init_order_book(setting)
+        self.init_bar_aggregator(setting)
+        self.init_option_chain(setting)
+        self.init_quote_workers(setting)
+        self.init_history(setting)
         self.api.quote.set_callback(self.quote_callback)
         self.write_log("交易行情 - 連線成功")
-        self.thread.start()
+        self.startup.start()
+
+    def init_startup(self, setting: dict):
+        """
+        Contracts, accounts and CA are loaded concurrently after login.
+        Positions need the default accounts and polling starts after the
+        first position snapshot, or once it failed.
+        """
+        self.startup.add_stage("contracts", self.query_contract)
+        self.startup.add_stage("accounts", lambda: self.select_default_account(
+            setting.get('預設現貨帳號', 0), setting.get('預設期貨帳號', 0)))
+        if setting['憑證檔案路徑'] != "":
+            self.startup.add_stage("ca", lambda: self.activate_ca(
+                setting['憑證檔案路徑'], setting['憑證密碼'], setting['身份證字號']))
+        self.startup.add_stage(
+            "positions", lambda: wait(self.snapshot_service.refresh()), ("accounts",))
+        self.startup.add_stage("polling", self.start_polling)
+
+    def start_polling(self):
+        """
+        Polling also retries the queries that failed during startup.
+        """
+        self.startup.wait("positions")
+        self.scheduler.start()
+
+    def process_startup_stage(self, stage):
+        """
+        Publish the timing of a finished startup stage and, once contracts
+        are loaded, subscribe the requests queued meanwhile.
+        """
+        duration = stage.end_time - stage.start_time
+        if stage.ready:
+            self.write_log(f"啟動步驟[{stage.name}] 完成 {duration:.3f} 秒")
+        else:
+            self.write_log(f"啟動步驟失敗[{stage.name}]. [{stage.error}]")
+
+        data = {
+            "name": stage.name,
+            "start": stage.start_time - self.startup.start_time,
+            "duration": duration,
+            "ready": stage.ready,
+        }
+        self.on_event(EVENT_SINOPAC_STARTUP, data)
+
+        if stage.name == "contracts":
+            with self.subscription_lock:
+                pending = self.pending_subscriptions
+                self.pending_subscriptions = []
+            for reqs, quote_type in pending:
+                self.subscribe_many(reqs, quote_type)
+
+    def get_startup_timings(self):
+        """
+        Offset and duration in seconds of every finished startup stage.
+        """
+        return self.startup.get_timings()
+
+    def init_quote_decoder(self, setting: dict):
+        """
+        Move quote decoding off the Shioaji callback thread if a queue
+        policy is selected.
+        """
+        policy = setting.get("行情佇列模式", "關閉")
+        if policy not in QUEUE_POLICIES:
+            return
+
+        capacity = int(setting.get("行情佇列大小", 65536))
+        buffer = QuoteRingBuffer(capacity, policy)
+        self.quote_decoder = QuoteDecoder(buffer, self.process_quote)
+        self.quote_decoder.start()
+        self.write_log(f"行情解碼執行緒啟動 [{policy}] 容量: {capacity}")
+
+    def init_subscription(self, setting: dict):
+        """"""
+        self.subscription_manager.limiter = RateLimiter(
+            float(setting.get("訂閱速率(次/秒)", 50)))
+        self.subscription_manager.capacity = int(setting.get("訂閱上限", 0))
+
+    def init_conflator(self, setting: dict):
+        """
+        Coalesce bid/ask updates per symbol if a window is configured.
+        """
+        window_ms = float(setting.get("行情合併視窗(毫秒)", 0))
+        if window_ms <= 0:
+            return
+
+        bypass_trades = setting.get("成交不合併", "是") == "是"
+        self.conflator = TickConflator(
+            window_ms, self.emit_tick, bypass_trades)
+        self.conflator.start()
+        self.write_log(f"行情合併啟動 視窗: {window_ms}ms")
+
+    def emit_tick(self, tick):
+        """"""
+        self.on_tick(snapshot(tick))
+
+    def init_recorder(self, setting: dict):
+        """
+        Record every raw quote payload to the daily column log.
+        """
+        if setting.get("行情錄製", "關閉") != "開啟":
+            return
+
+        folder = get_folder_path("sinopac_quotes")
+        self.recorder = QuoteRecorder(folder)
+        self.recorder.start()
+        self.write_log(f"行情錄製啟動 [{folder}]")
+
+    def init_latency_monitor(self, setting: dict):
+        """
+        Collect per-stage quote latency and publish a summary on
+        EVENT_TIMER every interval seconds.
+        """
+        interval = int(setting.get("延遲統計週期(秒)", 0))
+        if interval <= 0:
+            return
+
+        self.latency_interval = interval
+        self.latency_monitor = LatencyMonitor(self.timestamp_decoder)
+        self.event_engine.register(EVENT_TIMER, self.process_latency_timer)
+        self.write_log(f"行情延遲統計啟動 週期: {interval}秒")
+
+    def process_latency_timer(self, event):
+        """"""
+        self.latency_count += 1
+        if self.latency_count < self.latency_interval:
+            return
+        self.latency_count = 0
+
+        summary = self.latency_monitor.get_summary()
+        summary["queue"] = self.get_quote_stats()
+        self.on_event(EVENT_SINOPAC_LATENCY, summary)
+
+        total = [
+            item[STAGE_TOTAL] for item in summary["types"].values()
+        ]
+        p99 = max([item["p99"] for item in total], default=0)
+        latency_max = max([item["max"] for item in total], default=0)
+        self.write_log(
+            f"行情延遲 {summary['rate']:.0f}筆/秒 "
+            f"p99: {p99:.0f}us max: {latency_max:.0f}us 錯誤: {summary['errors']}")
+
+    def init_order_pipeline(self, setting: dict):
+        """
+        Broker order calls are limited to 下單速率 per second. Batch
+        operations run up to 批次下單併發數 calls at the same time.
+        """
+        self.order_limiter = RateLimiter(float(setting.get("下單速率(次/秒)", 25)))
+        self.order_executor.shutdown(wait=False)
+        self.order_executor = ThreadPoolExecutor(
+            max(int(setting.get("批次下單併發數", 8)), 1),
+            thread_name_prefix="SinopacBatch")
+
+        if setting.get("非同步下單", "關閉") != "開啟":
+            return
+
+        self.order_pipeline = OrderPipeline(
+            on_error=lambda exc: self.write_log(f"委託處理錯誤. [{exc}]"))
+        self.write_log("非同步下單啟動")
+
+    def init_order_book(self, setting: dict):
+        """
+        Keep the 5-level book of every symbol in gateway.order_book and
+        publish its metrics on EVENT_TIMER every interval seconds.
+        """
+        if setting.get("五檔簿", "關閉") != "開啟":
+            return
+
+        self.order_book = OrderBookStore()
+        self.write_log("五檔簿啟動")
+
+        interval = int(setting.get("五檔指標週期(秒)", 0))
+        if interval > 0:
+            self.book_interval = interval
+            self.event_engine.register(EVENT_TIMER, self.process_book_timer)
+
+    def process_book_timer(self, event):
+        """"""
+        self.book_count += 1
+        if self.book_count < self.book_interval:
+            return
+        self.book_count = 0
+
+        self.on_event(EVENT_SINOPAC_BOOK, self.order_book.get_metrics())
+
+    def init_bar_aggregator(self, setting: dict):
+        """
+        Build 1-second and N-minute bars of all symbols from trade prints.
+        Finished bars are published as EVENT_SINOPAC_BAR + "1s" and
+        EVENT_SINOPAC_BAR + f"{N}m".
+        """
+        if setting.get("K線合成", "關閉") != "開啟":
+            return
+
+        minutes = max(int(setting.get("K線週期(分鐘)", 1)), 1)
+        self.bar_aggregator = BarAggregator(
+            [1, minutes * 60], self.emit_bar, self.gateway_name)
+        self.event_engine.register(EVENT_TIMER, self.process_bar_timer)
+        self.write_log(f"K線合成啟動 週期: 1秒, {minutes}分鐘")
+
+    def emit_bar(self, length, bar):
+        """"""
+        if length % 60:
+            self.on_event(f"{EVENT_SINOPAC_BAR}{length}s", bar)
+        else:
+            self.on_event(f"{EVENT_SINOPAC_BAR}{length // 60}m", bar)
+
+    def process_bar_timer(self, event):
+        """"""
+        self.bar_aggregator.flush()
+
+    def init_option_chain(self, setting: dict):
+        """
+        Group subscribed options by underlying and delivery month and
+        publish IV and greeks of every quoted chain as EVENT_SINOPAC_CHAIN
+        every interval seconds.
+        """
+        if setting.get("選擇權鏈", "關閉") != "開啟":
+            return
+
+        self.option_chains = OptionChainEngine(
+            on_error=lambda code, exc: self.write_log(f"選擇權鏈略過[{code}]. [{exc}]"))
+        self.chain_interval = max(int(setting.get("選擇權鏈週期(秒)", 1)), 1)
+        self.event_engine.register(EVENT_TIMER, self.process_chain_timer)
+        self.write_log(f"選擇權鏈啟動 週期: {self.chain_interval}秒")
+
+    def process_chain_timer(self, event):
+        """"""
+        self.chain_count += 1
+        if self.chain_count < self.chain_interval:
+            return
+        self.chain_count = 0
+
+        for chain in self.option_chains.compute_dirty():
+            self.on_event(EVENT_SINOPAC_CHAIN, chain)
+
+    def init_quote_workers(self, setting: dict):
+        """
+        Run quote sessions and decoding in worker processes. Features fed by
+        raw payloads (queue, conflation, recording, latency, order book,
+        bars and option chains) only apply to quotes decoded in this
+        process.
+        """
+        workers = int(setting.get("行情進程數", 0))
+        if workers <= 0:
+            return
+
+        self.quote_workers = QuoteWorkerPool(
+            workers,
+            self.quote_api_factory,
+            (setting['身份證字號'], setting['密碼']),
+            self.process_shared_tick,
+            self.write_log
+        )
+        self.quote_workers.start()
+        self.write_log(f"行情進程啟動 數量: {workers}")
+
+    def init_history(self, setting: dict):
+        """"""
+        cache = None
+        if setting.get("歷史快取", "開啟") == "開啟":
+            cache = HistoryCache(get_folder_path("sinopac_history"))
+
+        self.history_loader = HistoryLoader(
+            self.fetch_history, cache, max(int(setting.get("歷史下載併發數", 4)), 1))
+
+    def process_shared_tick(self, code, values):
+        """
+        Push the tick of a row read from the quote workers.
+        """
+        tick = self.ticks.get(code, None)
+        if tick is None:
+            contract = self.contract_registry.get(code)
+            exchange = Exchange.TSE if contract.product == PRODUCT_STOCK else Exchange.TFE
+            tick = self.create_tick(code, exchange)
+
+        tick.__dict__.update(zip(SHARED_FIELDS[1:], values[1:]))
+        if values[0]:
+            tick.datetime = datetime.fromtimestamp(values[0])
+        self.on_tick(snapshot(tick))
+
+    def get_quote_stats(self):
+        """
+        Queue depth, drop and conflation counters of the quote path.
+        """
+        stats = {}
+        if self.quote_decoder:
+            stats.update(self.quote_decoder.get_stats())
+        if self.conflator:
+            stats["conflator"] = self.conflator.get_stats()
+        if self.recorder:
+            stats["recorder"] = self.recorder.get_stats()
+        if self.bar_aggregator:
+            stats["bar"] = self.bar_aggregator.get_stats()
+        if self.quote_workers:
+            stats["workers"] = self.quote_workers.get_stats()
+        return stats
 
     def select_default_account(self, select_stock_number, select_futures_number):
         stock_account_count = 0
         futures_account_count = 0
-        for acc in self.api.list_accounts():
+        accounts = self.api.list_accounts()
+        for acc in accounts:
             if isinstance(acc, StockAccount):
                 self.write_log(
                     f'股票帳號: [{stock_account_count}] - {acc.broker_id}-{acc.account_id} {acc.username}')
                 stock_account_count += 1
+                if not self.stock_account:
+                    self.stock_account = acc
             if isinstance(acc, FutureAccount):
                 self.write_log(
                     f'期貨帳號: [{futures_account_count}] - {acc.broker_id}-{acc.account_id} {acc.username}')
                 futures_account_count += 1
+                if not self.futures_account:
+                    self.futures_account = acc
 
         if stock_account_count >= 2:
-            acc = self.api.list_accounts()[int(select_stock_number)]
+            acc = accounts[int(select_stock_number)]
             self.api.set_default_account(acc)
+            self.stock_account = acc
             self.write_log(
                 f"***預設 現貨下單帳號 - [{select_stock_number}] {acc.broker_id}-{acc.account_id} {acc.username}")
 
         if futures_account_count >= 2:
-            acc = self.api.list_accounts()[int(select_futures_number)]
+            acc = accounts[int(select_futures_number)]
             self.api.set_default_account(acc)
+            self.futures_account = acc
             self.write_log(
                 f"***預設 期貨下單帳號 - [{select_futures_number}] {acc.broker_id}-{acc.account_id} {acc.username}")
 
     def proc_account(self, data):
         pass
 
-    def process_timer_event(self, event):
+    def query_contract(self):
+        """
+        Load the contract master, from the snapshot of the trading session
+        if one exists, and push ContractData in batches on a separate
+        thread. Only a complete contract master is saved.
+        """
+        session = get_trading_session()
+
+        rows = None
+        if self.contract_snapshot:
+            rows = self.contract_snapshot.load(session)
+
+        if rows is None:
+            rows = self.load_contract_rows()
+            if self.contract_snapshot and rows and self.is_contracts_fetched():
+                try:
+                    self.contract_snapshot.save(session, rows)
+                except OSError as exc:
+                    self.write_log(f"合約快取寫入失敗. [{exc}]")
+            self.write_log(f"合約載入 - API 共 {len(rows)} 檔")
+        else:
+            self.write_log(f"合約載入 - 快取 {session} 共 {len(rows)} 檔")
+
+        self.contract_registry.load(rows)
+
+        Thread(target=self.push_contracts, args=(rows,), daemon=True).start()
+
+    def is_contracts_fetched(self):
+        """
+        Whether Shioaji finished downloading api.Contracts, assumed when
+        the installed version has no fetch status.
+        """
+        status = getattr(self.api.Contracts, "status", None)
+        if status is None:
+            return True
+        return getattr(status, "value", status) == "Fetched"
+
+    def load_contract_rows(self):
+        """
+        Walk api.Contracts and extract one ContractRow per contract.
+        """
+        rows = []
+        for product, group in (
+            (PRODUCT_FUTURES, self.api.Contracts.Futures),
+            (PRODUCT_OPTION, self.api.Contracts.Options),
+            (PRODUCT_STOCK, self.api.Contracts.Stocks),
+        ):
+            for category in group:
+                for contract in category:
+                    rows.append(contract_to_row(contract, product))
+        return rows
+
+    def push_contracts(self, rows):
         """"""
-        self.count += 1
-        if self.count < self.interval:
-            return
-        self.count = 0
-        func = self.query_funcs.pop(0)
-        func()
-        self.query_funcs.append(func)
+        batch_size = self.contract_batch_size
+        for i in range(0, len(rows), batch_size):
+            for row in rows[i:i + batch_size]:
+                self.on_contract(self.to_contract_data(row))
+            sleep(0)
 
-    def query_contract(self):
-        for category in self.api.Contracts.Futures:
-            for contract in category:
-                data = ContractData(
-                    symbol=contract.code,
-                    exchange=Exchange.TFE,
-                    name=contract.name + contract.delivery_month,
-                    product=Product.FUTURES,
-                    size=200,
-                    pricetick=contract.unit,
-                    net_position=True,
-                    min_volume=1,
-                    gateway_name=self.gateway_name
-                )
-                self.on_contract(data)
-                self.code2contract[contract.code] = contract
+    def to_contract_data(self, row):
+        """"""
+        if row.product == PRODUCT_FUTURES:
+            return ContractData(
+                symbol=row.code,
+                exchange=Exchange.TFE,
+                name=row.name + row.delivery_month,
+                product=Product.FUTURES,
+                size=200,
+                pricetick=row.unit,
+                net_position=True,
+                min_volume=1,
+                gateway_name=self.gateway_name
+            )
+        elif row.product == PRODUCT_OPTION:
+            return ContractData(
+                symbol=row.code,
+                exchange=Exchange.TFE,
+                name=row.name + row.delivery_month,
+                product=Product.OPTION,
+                size=50,
+                net_position=True,
+                pricetick=row.unit,
+                min_volume=1,
+                gateway_name=self.gateway_name,
+                option_strike=row.strike_price,
+                option_underlying=row.underlying_code,
+                option_type=OptionType.CALL if row.option_right == "C" else OptionType.PUT,
+                option_expiry=None
+            )
+        else:
+            return ContractData(
+                symbol=row.code,
+                exchange=Exchange.TSE,
+                name=row.name,
+                product=Product.EQUITY,
+                size=1,
+                net_position=False,
+                pricetick=row.unit,
+                min_volume=1,
+                gateway_name=self.gateway_name
+            )
 
-        for category in self.api.Contracts.Options:
-            for contract in category:
-                data = ContractData(
-                    symbol=contract.code,
-                    exchange=Exchange.TFE,
-                    name=contract.name + contract.delivery_month,
-                    product=Product.OPTION,
-                    size=50,
-                    net_position=True,
-                    pricetick=contract.unit,
-                    min_volume=1,
-                    gateway_name=self.gateway_name,
-                    option_strike=contract.strike_price,
-                    option_underlying=contract.underlying_code,
-                    option_type=OptionType.CALL if contract.option_right == "C" else OptionType.PUT,
-                    option_expiry=None
-                )
-                self.on_contract(data)
-                self.code2contract[contract.code] = contract
-
-        for category in self.api.Contracts.Stocks:
-            for contract in category:
-                data = ContractData(
-                    symbol=contract.code,
-                    exchange=Exchange.TSE,
-                    name=contract.name,
-                    product=Product.EQUITY,
-                    size=1,
-                    net_position=False,
-                    pricetick=contract.unit,
-                    min_volume=1,
-                    gateway_name=self.gateway_name
-                )
-                self.on_contract(data)
-                self.code2contract[contract.code] = contract
+    def get_sj_contract(self, code):
+        """
+        Shioaji contract object of code, resolved from api.Contracts on
+        first use and cached only for the contracts actually traded or
+        subscribed.
+        """
+        contract = self.sj_contracts.get(code, None)
+        if contract is not None:
+            return contract
+
+        row = self.contract_registry.get(code)
+        if row is None:
+            return None
+
+        contract = find_sj_contract(self.api.Contracts, row)
+        if contract is not None:
+            self.sj_contracts[code] = contract
+        return contract
 
     def subscribe(self, req: SubscribeRequest):
         """"""
-        if req.symbol in self.subscribed:
+        failed = self.subscribe_many([req])
+        row = self.contract_registry.get(req.symbol)
+        # Failed, or queued until contracts are loaded
+        if req.symbol in failed or row is None:
+            return
+
+        self.write_log('訂閱 {} {} {}'.format(
+            req.exchange.value, row.code, row.name))
+
+    def subscribe_many(self, reqs, quote_type=QUOTE_TYPE_BOTH):
+        """
+        Subscribe a batch of symbols and return {symbol: reason} of the
+        failed ones. quote_type is "tick", "bidask", "both" or a dict of
+        symbol to quote type.
+
+        Requests made while contracts are still loading are queued and
+        subscribed once they are loaded.
+        """
+        with self.subscription_lock:
+            if not self.startup.is_done("contracts"):
+                self.pending_subscriptions.append((list(reqs), quote_type))
+                self.write_log(f"合約載入中, 訂閱排隊 {len(reqs)} 檔")
+                return {}
+
+        items = self.get_subscription_items(reqs, quote_type)
+        failed = self.subscription_manager.subscribe(items)
+
+        if len(items) > 1:
+            self.write_log(f"批次訂閱 {len(items) - len(failed)}/{len(items)} 檔")
+        for symbol, reason in failed.items():
+            self.write_log(f"訂閱失敗[{symbol}]. [{reason}]")
+        return failed
+
+    def unsubscribe(self, req: SubscribeRequest):
+        """"""
+        self.unsubscribe_many([req])
+
+    def unsubscribe_many(self, reqs, quote_type=QUOTE_TYPE_BOTH):
+        """
+        Unsubscribe a batch of symbols and return {symbol: reason} of the
+        failed ones.
+        """
+        items = self.get_subscription_items(reqs, quote_type)
+        failed = self.subscription_manager.unsubscribe(items)
+
+        self.write_log(f"取消訂閱 {len(items) - len(failed)}/{len(items)} 檔")
+        for symbol, reason in failed.items():
+            self.write_log(f"取消訂閱失敗[{symbol}]. [{reason}]")
+        return failed
+
+    @staticmethod
+    def get_subscription_items(reqs, quote_type):
+        """"""
+        if isinstance(quote_type, dict):
+            return {
+                req.symbol: quote_type.get(req.symbol, QUOTE_TYPE_BOTH)
+                for req in reqs
+            }
+        return {req.symbol: quote_type for req in reqs}
+
+    def subscribe_quote(self, code, quote_type):
+        """"""
+        if self.option_chains:
+            self.option_chains.add(self.contract_registry.get(code))
+
+        if self.quote_workers:
+            row = self.contract_registry.get(code)
+            if row is None:
+                raise LookupError("無此訂閱商品")
+            self.quote_workers.subscribe(row, quote_type)
             return
 
-        contract = self.code2contract.get(req.symbol, None)
-        if contract:
+        contract = self.get_sj_contract(code)
+        if contract is None:
+            raise LookupError("無此訂閱商品")
+
+        if quote_type == QUOTE_TYPE_TICK:
             self.api.quote.subscribe(contract)
-            self.api.quote.subscribe(contract, quote_type='bidask')
-            self.write_log('訂閱 {} {} {}'.format(
-                req.exchange.value, contract.code, contract.name))
-            self.subscribed.add(req.symbol)
         else:
-            self.write_log("無此訂閱商品[{}].".format(str(req)))
+            self.api.quote.subscribe(contract, quote_type=quote_type)
+
+    def unsubscribe_quote(self, code, quote_type):
+        """"""
+        if self.option_chains:
+            self.option_chains.remove(code)
+
+        if self.quote_workers:
+            row = self.contract_registry.get(code)
+            if row is None:
+                raise LookupError("無此訂閱商品")
+            self.quote_workers.unsubscribe(row, quote_type)
+            return
+
+        contract = self.get_sj_contract(code)
+        if contract is None:
+            raise LookupError("無此訂閱商品")
+
+        if quote_type == QUOTE_TYPE_TICK:
+            self.api.quote.unsubscribe(contract)
+        else:
+            self.api.quote.unsubscribe(contract, quote_type=quote_type)
 
     def send_order(self, req: OrderRequest):
+        """
+        With 非同步下單 the order is reported as submitting at once and
+        sent to the broker by the order pipeline.
+        """
+        self.order_logger.log("***send_order", req)
+        self.scheduler.wake()
+        if self.order_pipeline:
+            return self.send_order_async(req)
+
+        try:
+            order = self.create_sj_order(req)
+        except Exception as exc:
+            order = self.create_local_order(req)
+            with self.order_lock:
+                self.placing_orderids.discard(order.orderid)
+            order.status = Status.REJECTED
+            self.on_order(order)
+            self.write_log(f"委託失敗[{order.orderid}]. [{exc}]")
+            return order.vt_orderid
+
+        self.order_limiter.acquire()
+        trade = self.api.place_order(self.get_sj_contract(req.symbol), order)
+        self.sj_trades[trade.order.seqno] = trade
+        order = req.create_order_data(order.seqno, self.gateway_name)
+        self.order_logger.log(trade, order)
+        self.on_order(order)
+        return order.vt_orderid
+
+    def send_order_async(self, req: OrderRequest):
         """"""
-        self.write_log("***send_order")
-        self.write_log(str(req))
+        order = self.create_local_order(req)
+        account_key = "futures" if req.exchange == Exchange.TFE else "stock"
+        self.order_pipeline.submit(account_key, self.place_order, req, order)
+        return order.vt_orderid
+
+    def send_orders(self, reqs):
+        """
+        Send a batch of orders concurrently and return their vt_orderids.
+        Every order is reported as submitting at once and then with the
+        result of its broker call.
+        """
+        self.order_logger.log("***send_orders", *reqs)
+        self.scheduler.wake()
+
+        vt_orderids = []
+        for req in reqs:
+            order = self.create_local_order(req)
+            self.order_executor.submit(self.place_order, req, order)
+            vt_orderids.append(order.vt_orderid)
+        return vt_orderids
+
+    def create_local_order(self, req: OrderRequest):
+        """
+        Order with a local orderid, emitted as submitting.
+        """
+        with self.order_lock:
+            self.order_count += 1
+            orderid = f"{self.order_prefix}{self.order_count:06d}"
+            self.placing_orderids.add(orderid)
+
+        order = req.create_order_data(orderid, self.gateway_name)
+        self.on_order(order)
+        return order
+
+    def place_order(self, req: OrderRequest, order: OrderData):
+        """
+        Run on the order pipeline or the batch executor: send the order to
+        the broker and report the result of the order emitted by
+        create_local_order.
+        """
+        order = copy(order)
+        try:
+            contract = self.get_sj_contract(req.symbol)
+            if contract is None:
+                raise LookupError("無此商品")
+
+            sj_order = self.create_sj_order(req)
+            if getattr(sj_order, "seqno", None):
+                self.seqno_orderids[sj_order.seqno] = order.orderid
+            self.order_limiter.acquire()
+            trade = self.api.place_order(contract, sj_order)
+        except Exception as exc:
+            with self.order_lock:
+                self.placing_orderids.discard(order.orderid)
+                self.pending_cancels.discard(order.orderid)
+            order.status = Status.REJECTED
+            self.on_order(order)
+            self.write_log(f"委託失敗[{order.orderid}]. [{exc}]")
+            return
+
+        seqno = trade.order.seqno
+        status = trade.status.status
+
+        with self.order_lock:
+            self.seqno_orderids[seqno] = order.orderid
+            self.orderid_seqnos[order.orderid] = seqno
+            self.sj_trades[seqno] = trade
+            self.placing_orderids.discard(order.orderid)
+            cancel = order.orderid in self.pending_cancels
+            self.pending_cancels.discard(order.orderid)
+
+            # Already reported by the order sync
+            reported = seqno in self.order_states
+            if not reported:
+                self.order_states[seqno] = (status, 0.0)
+                if status not in SINOPAC_FINAL_STATUSES:
+                    self.working_orders.add(seqno)
+
+        if not reported:
+            order.status = STATUS_SINOPAC2VT.get(status, Status.SUBMITTING)
+            self.on_order(order)
+            self.order_logger.log(trade, order)
+
+        if cancel:
+            self.order_executor.submit(self.cancel_sj_trade, order.orderid, trade)
+
+    def create_sj_order(self, req: OrderRequest):
+        """
+        Orders sent during startup wait for the accounts and CA, and are
+        rejected if either failed or is still not done.
+        """
+        for name in TRADING_STAGES:
+            if not self.startup.wait(name, STARTUP_TIMEOUT):
+                raise RuntimeError(f"啟動步驟未完成[{name}]")
+
         if req.exchange == Exchange.TFE:
             action = constant.ACTION_BUY if req.direction == Direction.LONG else constant.ACTION_SELL
             price_type = constant.FUTURES_PRICE_TYPE_LMT
@@ -296,27 +1089,114 @@ class SinopacGateway(BaseGateway):
                                    price_type=price_type,
                                    order_type=order_type, first_sell=first_sell)
 
-        trade = self.api.place_order(self.code2contract[req.symbol], order)
-        self.write_log(str(trade))
-        order = req.create_order_data(order.seqno, self.gateway_name)
-        self.write_log(str(order))
-        self.on_order(order)
-        return order.vt_orderid
+        return order
 
     def cancel_order(self, req: CancelRequest):
         """"""
-        self.write_log("***cancel_order")
-        self.write_log(str(req))
+        self.cancel_orders([req])
+
+    def cancel_orders(self, reqs):
+        """
+        Cancel a batch of orders concurrently and return the futures of
+        the broker calls. Results are reported through on_order.
+
+        Shioaji trades are found by seqno in the index kept by the order
+        sync, list_trades is only queried once if some are missing. Orders
+        still waiting to be placed are cancelled by place_order as soon as
+        their seqno is known.
+        """
+        self.order_logger.log("***cancel_orders", *reqs)
+        self.scheduler.wake()
+
+        trades = {}
+        with self.order_lock:
+            for req in reqs:
+                if req.orderid in self.placing_orderids:
+                    self.pending_cancels.add(req.orderid)
+                else:
+                    trades[req.orderid] = self.find_sj_trade(req.orderid)
+
+        if None in trades.values():
+            try:
+                with self.trade_query_lock:
+                    items = self.api.list_trades()
+            except Exception as exc:
+                self.write_log(f"委託查詢失敗. [{exc}]")
+                items = []
+
+            listed = {item.order.seqno: item for item in items}
+            trades = {
+                orderid: trade or listed.get(self.orderid_seqnos.get(orderid, orderid), None)
+                for orderid, trade in trades.items()
+            }
+
+        futures = []
+        for orderid, trade in trades.items():
+            if trade is None:
+                self.write_log(f"撤單失敗[{orderid}]. [查無委託]")
+                continue
+            futures.append(self.order_executor.submit(self.cancel_sj_trade, orderid, trade))
+        return futures
+
+    def find_sj_trade(self, orderid):
+        """
+        Shioaji trade of a vnpy orderid: the seqno itself, or a local
+        orderid mapped to its seqno once the order was placed.
+        """
+        seqno = self.orderid_seqnos.get(orderid, orderid)
+        return self.sj_trades.get(seqno, None)
+
+    def cancel_sj_trade(self, orderid, trade):
+        """
+        Run on the batch executor. Shioaji only changes the status of the
+        trade once it is updated, the result is then reported through
+        update_trade.
+        """
+        try:
+            self.order_limiter.acquire()
+            trade = self.api.cancel_order(trade) or trade
+        except Exception as exc:
+            self.write_log(f"撤單失敗[{orderid}]. [{exc}]")
+            return
+
+        try:
+            with self.trade_query_lock:
+                self.api.update_status(trade=trade)
+        except Exception as exc:
+            self.write_log(f"委託查詢失敗. [{exc}]")
+
+        self.update_trade(trade)
 
     def query_account(self):
-        """"""
-        self.write_log("***query_account")
+        """
+        Refresh the account snapshot in the background.
+        """
+        self.snapshot_service.refresh(["futures_account"])
 
     def query_position(self):
+        """
+        Refresh all position and account snapshots concurrently, emitting
+        only the entries that changed. Run by the polling scheduler, which
+        times the whole refresh and counts it as failed if any source
+        failed.
+        """
+        done, _ = wait(self.snapshot_service.refresh())
+        for future in done:
+            future.result()
+
+    def get_snapshot_ages(self):
+        """
+        Seconds since each position/account snapshot was last updated.
+        """
+        return self.snapshot_service.get_ages()
+
+    def fetch_stock_positions(self):
         """"""
-        self.api.get_stock_account_unreal_profitloss().update()
-        data = self.api.get_stock_account_unreal_profitloss().data()["summary"]
-        for item in data:
+        profitloss = self.api.get_stock_account_unreal_profitloss()
+        profitloss.update()
+
+        positions = []
+        for item in profitloss.data()["summary"]:
             pos = PositionData(
                 symbol=f"{item['stock']} {item['stocknm']}",
                 exchange=EXCHANGE_SINOPAC2VT.get('TSE', Exchange.TSE),
@@ -330,10 +1210,174 @@ class SinopacGateway(BaseGateway):
                 yd_volume=float(item['qty']) / 1000,
                 gateway_name=self.gateway_name
             )
-            self.on_position(pos)
+            positions.append(pos)
+        return positions
+
+    def fetch_futures_positions(self):
+        """
+        Open position rows are per trade, merge them by code and side.
+        """
+        result = self.api.get_account_openposition()
+        result.update()
+
+        positions = {}
+        for item in result.data():
+            direction = Direction.LONG if item['OrderBS'] == "B" else Direction.SHORT
+            volume = float(item['Volume'])
+            price = float(item['ContractAverPrice'])
+            pnl = float(item.get('FlowProfitLoss', 0))
+
+            pos = positions.get((item['Code'], direction), None)
+            if pos is None:
+                pos = PositionData(
+                    symbol=item['Code'],
+                    exchange=Exchange.TFE,
+                    direction=direction,
+                    volume=volume,
+                    price=price,
+                    pnl=pnl,
+                    gateway_name=self.gateway_name
+                )
+                positions[(item['Code'], direction)] = pos
+            else:
+                cost = pos.price * pos.volume + price * volume
+                pos.volume += volume
+                pos.price = cost / pos.volume if pos.volume else 0
+                pos.pnl += pnl
+        return list(positions.values())
+
+    def fetch_futures_account(self):
+        """"""
+        result = self.api.get_account_margin()
+        result.update()
+
+        accounts = []
+        for item in result.data():
+            account = AccountData(
+                accountid=self.futures_account.account_id if self.futures_account else "futures",
+                balance=float(item['Equity']),
+                frozen=float(item.get('OrderPSecurity', 0)),
+                gateway_name=self.gateway_name
+            )
+            accounts.append(account)
+        return accounts
+
+    def query_history(self, req: HistoryRequest):
+        """
+        1-minute bars of req.symbol from req.start to req.end (now by
+        default).
+        """
+        if req.interval not in (None, Interval.MINUTE):
+            self.write_log(f"歷史資料只支援1分鐘K線[{req.symbol}]")
+            return []
+
+        result = self.load_history(KIND_KBAR, req)
+        if result is None:
+            return []
+        ts, values = result
+
+        bars = []
+        for dt, (open_price, high_price, low_price, close_price, volume, _) in zip(
+                to_datetimes(ts), values.tolist()):
+            bar = BarData(
+                symbol=req.symbol,
+                exchange=req.exchange,
+                datetime=dt,
+                interval=Interval.MINUTE,
+                volume=volume,
+                open_price=open_price,
+                high_price=high_price,
+                low_price=low_price,
+                close_price=close_price,
+                gateway_name=self.gateway_name
+            )
+            bars.append(bar)
+        return bars
+
+    def query_tick_history(self, req: HistoryRequest):
+        """
+        Ticks of req.symbol from req.start to req.end, volume accumulated
+        per day like realtime ticks.
+        """
+        result = self.load_history(KIND_TICK, req)
+        if result is None:
+            return []
+        ts, values = result
+
+        ticks = []
+        for dt, row, day_volume in zip(
+                to_datetimes(ts), values.tolist(), day_volume_sum(ts, values[:, 1]).tolist()):
+            last_price, _, bid_price, bid_volume, ask_price, ask_volume = row
+            tick = TickData(
+                symbol=req.symbol,
+                exchange=req.exchange,
+                datetime=dt,
+                volume=day_volume,
+                last_price=last_price,
+                bid_price_1=bid_price,
+                bid_volume_1=bid_volume,
+                ask_price_1=ask_price,
+                ask_volume_1=ask_volume,
+                gateway_name=self.gateway_name
+            )
+            ticks.append(tick)
+        return ticks
+
+    def load_history(self, kind, req: HistoryRequest):
+        """
+        (ts, values) arrays of the request, None if it failed.
+        """
+        if not self.history_loader:
+            self.write_log(f"歷史資料下載失敗[{req.symbol}]. [尚未連線]")
+            return None
+        self.startup.wait("contracts", STARTUP_TIMEOUT)
+
+        start = req.start.replace(tzinfo=None)
+        end = (req.end or datetime.now()).replace(tzinfo=None)
+
+        begin = monotonic()
+        try:
+            ts, values = self.history_loader.load(kind, req.symbol, start, end)
+        except Exception as exc:
+            self.write_log(f"歷史資料下載失敗[{req.symbol}]. [{exc}]")
+            return None
+
+        self.write_log(
+            f"歷史資料[{req.symbol}] 共 {len(ts)} 筆, {monotonic() - begin:.3f} 秒")
+        return ts, values
+
+    def fetch_history(self, kind, symbol, day):
+        """
+        Shioaji kbars/ticks of one day, run on the history loader.
+        """
+        contract = self.get_sj_contract(symbol)
+        if contract is None:
+            raise LookupError("無此商品")
+
+        text = day.strftime("%Y-%m-%d")
+        if kind == KIND_KBAR:
+            return self.api.kbars(contract, start=text, end=text)
+        return self.api.ticks(contract, date=text)
 
     def close(self):
         """"""
+        if self.quote_decoder:
+            self.quote_decoder.stop()
+        if self.conflator:
+            self.conflator.stop()
+        self.subscription_manager.close()
+        if self.recorder:
+            self.recorder.stop()
+        if self.order_pipeline:
+            self.order_pipeline.close()
+        self.order_executor.shutdown(wait=False)
+        self.order_logger.close()
+        self.snapshot_service.close()
+        self.scheduler.stop()
+        if self.quote_workers:
+            self.quote_workers.stop()
+        if self.history_loader:
+            self.history_loader.close()
 
     def quote_callback(self, topic, data):
         """
@@ -357,63 +1401,108 @@ class SinopacGateway(BaseGateway):
          'BidPrice': [247.5, 247.0, 246.5, 246.0, 245.5], 'BidVolume': [397, 389, 509, 703, 434],
          'Date': '2019/05/17', 'Time': '09:53:00.706928'}
         """
+        recv_ns = time_ns()
+        if self.recorder:
+            self.recorder.record(recv_ns, topic, data)
+
+        if self.quote_decoder:
+            self.quote_decoder.put(recv_ns, topic, data)
+        else:
+            self.process_quote(recv_ns, topic, data)
+
+    def process_quote(self, recv_ns, topic, data):
+        """
+        Decode one raw quote payload and push the tick.
+        """
+        monitor = self.latency_monitor
         try:
             topics = topic.split('/')
             realtime_type = topics[0]
-            tick = None
-            if realtime_type == "L":
-                tick = self.qutote_futures_L(data)
-            elif realtime_type == "Q":
-                tick = self.quote_futures_Q(data)
-            elif realtime_type == "MKT":
-                tick = self.quote_stock_MKT(topics[3], data)
-            elif realtime_type == "QUT":
-                tick = self.qute_stock_QUT(topics[3], data)
-            if tick:
-                tick.open_interest = 0
-                self.on_tick(copy(tick))
+            if self.conflator:
+                with self.conflator.lock:
+                    tick = self.decode_quote(realtime_type, topics, data)
+                    if monitor:
+                        decoded_ns = time_ns()
+                    if tick:
+                        self.conflator.submit(
+                            tick, realtime_type in TRADE_QUOTE_TYPES)
+            else:
+                tick = self.decode_quote(realtime_type, topics, data)
+                if monitor:
+                    decoded_ns = time_ns()
+                if tick:
+                    self.on_tick(snapshot(tick))
+            if monitor:
+                monitor.record(realtime_type, tick, data,
+                               recv_ns, decoded_ns, time_ns())
         except Exception as e:
+            if monitor:
+                monitor.record_error()
             exc_type, _, exc_tb = sys.exc_info()
             filename = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
             self.write_log('[{}][{}][{}][{}]'.format(
                 exc_type, filename, exc_tb.tb_lineno, str(e)))
             self.write_log(data)
 
+    def decode_quote(self, realtime_type, topics, data):
+        """
+        Update the cached tick of the quoted symbol.
+        """
+        tick = None
+        if realtime_type == "L":
+            tick = self.qutote_futures_L(data)
+        elif realtime_type == "Q":
+            tick = self.quote_futures_Q(data)
+        elif realtime_type == "MKT":
+            tick = self.quote_stock_MKT(topics[3], data)
+        elif realtime_type == "QUT":
+            tick = self.qute_stock_QUT(topics[3], data)
+        if tick:
+            if self.subscription_manager.capacity:
+                self.subscription_manager.touch(tick.symbol)
+            if self.order_book and realtime_type in BOOK_QUOTE_TYPES:
+                self.order_book.update(tick.symbol, data)
+            elif self.bar_aggregator and realtime_type in TRADE_QUOTE_TYPES:
+                self.bar_aggregator.update(
+                    tick.symbol, tick.exchange, tick.datetime,
+                    tick.last_price, tick.volume, data["Volume"][0])
+            if self.option_chains and realtime_type in FUTURES_QUOTE_TYPES:
+                self.option_chains.update(
+                    tick.symbol, tick, data.get("TargetKindPrice", 0))
+        return tick
+
+    def create_tick(self, code, exchange, **kwargs):
+        """
+        Tick template of a symbol. Handlers update it in place and
+        strategies only receive snapshots of it.
+        """
+        contract = self.contract_registry.get(code)
+        tick = TickData(
+            symbol=code,
+            exchange=exchange,
+            name=f"{contract.name}{contract.delivery_month}",
+            datetime=datetime.now(),
+            gateway_name=self.gateway_name,
+            **kwargs
+        )
+        self.ticks[code] = tick
+        return tick
+
     def quote_futures_Q(self, data):
         code = data.get('Code', None)
         if code is None:
             return
         tick = self.ticks.get(code, None)
         if tick is None:
-            contract = self.code2contract[code]
-            tick = TickData(
-                symbol=data['Code'],
-                exchange=Exchange.TFE,
-                name=f"{contract['name']}{contract['delivery_month']}",
-                datetime=datetime.now(),
-                gateway_name=self.gateway_name,
-            )
-            self.ticks[code] = tick
-        tick.bid_price_1 = data["BidPrice"][0]
-        tick.bid_price_2 = data["BidPrice"][1]
-        tick.bid_price_3 = data["BidPrice"][2]
-        tick.bid_price_4 = data["BidPrice"][3]
-        tick.bid_price_5 = data["BidPrice"][4]
-        tick.ask_price_1 = data["AskPrice"][0]
-        tick.ask_price_2 = data["AskPrice"][1]
-        tick.ask_price_3 = data["AskPrice"][2]
-        tick.ask_price_4 = data["AskPrice"][3]
-        tick.ask_price_5 = data["AskPrice"][4]
-        tick.bid_volume_1 = data["BidVolume"][0]
-        tick.bid_volume_2 = data["BidVolume"][1]
-        tick.bid_volume_3 = data["BidVolume"][2]
-        tick.bid_volume_4 = data["BidVolume"][3]
-        tick.bid_volume_5 = data["BidVolume"][4]
-        tick.ask_volume_1 = data["AskVolume"][0]
-        tick.ask_volume_2 = data["AskVolume"][1]
-        tick.ask_volume_3 = data["AskVolume"][2]
-        tick.ask_volume_4 = data["AskVolume"][3]
-        tick.ask_volume_5 = data["AskVolume"][4]
+            tick = self.create_tick(code, Exchange.TFE)
+        (tick.bid_price_1, tick.bid_price_2, tick.bid_price_3,
+         tick.bid_price_4, tick.bid_price_5) = data["BidPrice"]
+        (tick.ask_price_1, tick.ask_price_2, tick.ask_price_3,
+         tick.ask_price_4, tick.ask_price_5) = data["AskPrice"]
+        (tick.bid_volume_1, tick.bid_volume_2, tick.bid_volume_3,
+         tick.bid_volume_4, tick.bid_volume_5) = data["BidVolume"]
+        (tick.ask_volume_1, tick.ask_volume_2, tick.ask_volume_3,
+         tick.ask_volume_4, tick.ask_volume_5) = data["AskVolume"]
         return tick
 
     def qutote_futures_L(self, data):
@@ -422,26 +1511,16 @@ class SinopacGateway(BaseGateway):
             return
         tick = self.ticks.get(code, None)
         if tick is None:
-            contract = self.code2contract.get(code, None)
-            tick = TickData(
-                symbol=code,
-                exchange=Exchange.TFE,
-                name=f"{contract['name']}{contract['delivery_month']}",
-                datetime=datetime.now(),
-                gateway_name=self.gateway_name,
-            )
-            self.ticks[code] = tick
-        tick.datetime = datetime.strptime('{} {}'.format(
-            data['Date'], data['Time']), "%Y/%m/%d %H:%M:%S.%f")
+            tick = self.create_tick(code, Exchange.TFE)
+        close = data["Close"][0]
+        tick.datetime = self.timestamp_decoder.decode(
+            data['Date'], data['Time'])
         tick.volume = data["VolSum"][0]
-        tick.last_price = data["Close"][0]
-        tick.limit_up = 0
-        tick.open_interest = 0
-        tick.limit_down = 0
+        tick.last_price = close
         tick.open_price = data["Open"]
         tick.high_price = data["High"][0]
         tick.low_price = data["Low"][0]
-        tick.pre_close = data["Close"][0] - data["DiffPrice"][0]
+        tick.pre_close = close - data["DiffPrice"][0]
         return tick
 
     def quote_stock_MKT(self, code, data):
@@ -455,65 +1534,32 @@ class SinopacGateway(BaseGateway):
         {'Close': [248.0], 'Time': '09:53:00.706928',
             'VolSum': [7023], 'Volume': [1]}
         """
-
         tick = self.ticks.get(code, None)
         if tick is None:
-            contract = self.code2contract[code]
-            tick = TickData(
-                symbol=code,
-                exchange=Exchange.TSE,
-                name=f"{contract['name']}{contract['delivery_month']}",
-                datetime=datetime.now(),
-                gateway_name=self.gateway_name,
-                low_price=99999
-            )
-            self.ticks[code] = tick
-        tick.datetime = datetime.combine(datetime.today(),
-                                         datetime.strptime('{}'.format(data['Time']), "%H:%M:%S.%f").time())
+            tick = self.create_tick(code, Exchange.TSE, low_price=99999)
+        close = data["Close"][0]
+        tick.datetime = self.timestamp_decoder.decode_today(data['Time'])
         tick.volume = data["VolSum"][0]
-        tick.last_price = data["Close"][0]
-        tick.limit_up = 0
-        tick.open_interest = 0
-        tick.limit_down = 0
-        tick.open_price = data["Close"][0] if tick.open_price == 0 else tick.open_price
-        tick.high_price = data["Close"][0] if data["Close"][0] > tick.high_price else tick.high_price
-        tick.low_price = data["Close"][0] if data["Close"][0] < tick.low_price else tick.low_price
+        tick.last_price = close
+        if tick.open_price == 0:
+            tick.open_price = close
+        if close > tick.high_price:
+            tick.high_price = close
+        if close < tick.low_price:
+            tick.low_price = close
         tick.pre_close = tick.open_price
         return tick
 
     def qute_stock_QUT(self, code, data):
         tick = self.ticks.get(code, None)
         if tick is None:
-            contract = self.code2contract[code]
-            tick = TickData(
-                symbol=code,
-                exchange=Exchange.TSE,
-                name=f"{contract['name']}{contract['delivery_month']}",
-                datetime=datetime.now(),
-                gateway_name=self.gateway_name,
-            )
-            self.ticks[code] = tick
-        tick.bid_price_1 = data["BidPrice"][0]
-        tick.bid_price_2 = data["BidPrice"][1]
-        tick.bid_price_3 = data["BidPrice"][2]
-        tick.bid_price_4 = data["BidPrice"][3]
-        tick.bid_price_5 = data["BidPrice"][4]
-
-        tick.ask_price_1 = data["AskPrice"][0]
-        tick.ask_price_2 = data["AskPrice"][1]
-        tick.ask_price_3 = data["AskPrice"][2]
-        tick.ask_price_4 = data["AskPrice"][3]
-        tick.ask_price_5 = data["AskPrice"][4]
-
-        tick.bid_volume_1 = data["BidVolume"][0]
-        tick.bid_volume_2 = data["BidVolume"][1]
-        tick.bid_volume_3 = data["BidVolume"][2]
-        tick.bid_volume_4 = data["BidVolume"][3]
-        tick.bid_volume_5 = data["BidVolume"][4]
-
-        tick.ask_volume_1 = data["AskVolume"][0]
-        tick.ask_volume_2 = data["AskVolume"][1]
-        tick.ask_volume_3 = data["AskVolume"][2]
-        tick.ask_volume_4 = data["AskVolume"][3]
-        tick.ask_volume_5 = data["AskVolume"][4]
+            tick = self.create_tick(code, Exchange.TSE)
+        (tick.bid_price_1, tick.bid_price_2, tick.bid_price_3,
+         tick.bid_price_4, tick.bid_price_5) = data["BidPrice"]
+        (tick.ask_price_1, tick.ask_price_2, tick.ask_price_3,
+         tick.ask_price_4, tick.ask_price_5) = data["AskPrice"]
+        (tick.bid_volume_1, tick.bid_volume_2, tick.bid_volume_3,
+         tick.bid_volume_4, tick.bid_volume_5) = data["BidVolume"]
+        (tick.ask_volume_1, tick.ask_volume_2, tick.ask_volume_3,
+         tick.ask_volume_4, tick.ask_volume_5) = data["AskVolume"]
         return tick
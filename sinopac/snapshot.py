@@ -0,0 +1,111 @@
+# encoding: UTF-8
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import monotonic
+
+
+class SnapshotService:
+    """
+    Cached snapshots of account data fetched off the caller thread.
+
+    Every source has fetch() returning the complete list of its entries
+    and emit(data) for entries that changed. Sources run concurrently on a
+    thread pool, a source is never fetched twice at the same time and
+    entries are compared with the cached ones (by key) so that only new,
+    changed and, through clear(data), removed entries are emitted.
+    """
+
+    def __init__(self, max_workers: int = 4, on_error=None):
+        """"""
+        self.executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="SinopacSnapshot")
+        self.on_error = on_error
+
+        self.sources = {}
+        self.caches = {}
+        self.updated = {}
+        self.durations = {}
+        self.running = set()
+        self.lock = Lock()
+
+    def add_source(self, name: str, fetch, emit, key, clear=None):
+        """
+        key(data) identifies an entry, clear(data) returns what to emit
+        when an entry disappeared from the snapshot.
+        """
+        self.sources[name] = (fetch, emit, key, clear)
+        self.caches[name] = {}
+
+    def refresh(self, names: list = None) -> list:
+        """
+        Start fetching the given sources (all by default) and return the
+        futures of the ones started. Sources still running are skipped.
+        """
+        futures = []
+        for name in names or list(self.sources):
+            with self.lock:
+                if name in self.running or name not in self.sources:
+                    continue
+                self.running.add(name)
+            futures.append(self.executor.submit(self.run, name))
+        return futures
+
+    def run(self, name: str):
+        """
+        The error of a failed fetch is reported to on_error and raised
+        again for callers waiting on the future.
+        """
+        try:
+            self.update(name)
+        except Exception as exc:
+            if self.on_error:
+                self.on_error(name, exc)
+            raise
+        finally:
+            with self.lock:
+                self.running.discard(name)
+
+    def update(self, name: str):
+        """"""
+        fetch, emit, key, clear = self.sources[name]
+
+        start = monotonic()
+        entries = {key(data): data for data in fetch()}
+        self.durations[name] = monotonic() - start
+
+        cache = self.caches[name]
+        for entry_key, data in entries.items():
+            if cache.get(entry_key, None) != data:
+                emit(data)
+
+        if clear:
+            for entry_key, data in cache.items():
+                if entry_key not in entries:
+                    emit(clear(data))
+
+        self.caches[name] = entries
+        self.updated[name] = monotonic()
+
+    def get_snapshot(self, name: str) -> list:
+        """"""
+        return list(self.caches.get(name, {}).values())
+
+    def get_ages(self) -> dict:
+        """
+        Seconds since the last successful fetch of every source, None if
+        it never succeeded.
+        """
+        now = monotonic()
+        return {
+            name: now - self.updated[name] if name in self.updated else None
+            for name in self.sources
+        }
+
+    def get_durations(self) -> dict:
+        """"""
+        return dict(self.durations)
+
+    def close(self):
+        """"""
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,109 @@
+# encoding: UTF-8
+
+from threading import Event, Thread
+from time import monotonic
+
+
+class StartupStage:
+    """"""
+
+    def __init__(self, name: str, func, requires: tuple):
+        """"""
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+
+        self.done = Event()
+        self.ready = False
+        self.error = None
+        self.start_time = 0.0
+        self.end_time = 0.0
+
+
+class StartupPipeline:
+    """
+    Run the connect stages of the gateway concurrently, one thread per
+    stage, each starting as soon as the stages it requires are ready.
+
+    A stage is ready once its function returned. If it raised, the stage
+    and every stage requiring it are done but not ready. wait() lets any
+    thread block until a stage is done, on_stage(stage) is called as every
+    stage finishes, e.g. to publish its timing.
+    """
+
+    def __init__(self, on_stage=None):
+        """"""
+        self.on_stage = on_stage
+        self.stages = {}
+        self.start_time = 0.0
+
+    def add_stage(self, name: str, func, requires: tuple = ()):
+        """"""
+        self.stages[name] = StartupStage(name, func, requires)
+
+    def start(self):
+        """"""
+        self.start_time = monotonic()
+        for stage in self.stages.values():
+            Thread(
+                target=self.run_stage,
+                args=(stage,),
+                name=f"SinopacStartup-{stage.name}",
+                daemon=True
+            ).start()
+
+    def run_stage(self, stage: StartupStage):
+        """"""
+        for name in stage.requires:
+            required = self.stages[name]
+            required.done.wait()
+            if not required.ready:
+                stage.error = RuntimeError(f"前置步驟失敗[{name}]")
+                break
+
+        stage.start_time = monotonic()
+        if stage.error is None:
+            try:
+                stage.func()
+                stage.ready = True
+            except Exception as exc:
+                stage.error = exc
+        stage.end_time = monotonic()
+
+        stage.done.set()
+        if self.on_stage:
+            self.on_stage(stage)
+
+    def wait(self, name: str, timeout: float = None) -> bool:
+        """
+        Block until stage name is done, return whether it is ready.
+        Unknown stages count as ready.
+        """
+        stage = self.stages.get(name, None)
+        if stage is None:
+            return True
+        stage.done.wait(timeout)
+        return stage.ready
+
+    def is_done(self, name: str) -> bool:
+        """
+        Whether stage name finished, successfully or not. Unknown stages
+        count as done.
+        """
+        stage = self.stages.get(name, None)
+        return stage is None or stage.done.is_set()
+
+    def get_timings(self) -> dict:
+        """
+        Offset from the start of the pipeline and duration in seconds of
+        every finished stage.
+        """
+        return {
+            stage.name: {
+                "start": stage.start_time - self.start_time,
+                "duration": stage.end_time - stage.start_time,
+                "ready": stage.ready,
+            }
+            for stage in self.stages.values()
+            if stage.done.is_set()
+        }
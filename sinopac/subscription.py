@@ -0,0 +1,199 @@
+# encoding: UTF-8
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from .utility import RateLimiter
+
+
+QUOTE_TYPE_TICK = "tick"
+QUOTE_TYPE_BIDASK = "bidask"
+QUOTE_TYPE_BOTH = "both"
+
+QUOTE_TYPE_STREAMS = {
+    QUOTE_TYPE_TICK: (QUOTE_TYPE_TICK,),
+    QUOTE_TYPE_BIDASK: (QUOTE_TYPE_BIDASK,),
+    QUOTE_TYPE_BOTH: (QUOTE_TYPE_TICK, QUOTE_TYPE_BIDASK),
+}
+
+
+class SubscriptionManager:
+    """
+    Batch subscribe/unsubscribe of tick and bidask streams.
+
+    Broker calls of a batch are pipelined on a thread pool under a shared
+    rate limit. When a capacity is set, subscriptions are kept in LRU
+    order (refreshed by touch on every quote) and, once new symbols were
+    subscribed, the least recently active ones are unsubscribed to get
+    back within the capacity.
+    """
+
+    def __init__(
+        self,
+        subscribe_func,
+        unsubscribe_func,
+        rate: float = 50,
+        max_workers: int = 8,
+        capacity: int = 0
+    ):
+        """"""
+        self.subscribe_func = subscribe_func
+        self.unsubscribe_func = unsubscribe_func
+        self.limiter = RateLimiter(rate)
+        self.capacity = capacity
+
+        self.subscriptions = OrderedDict()
+        self.lock = Lock()
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="SinopacSubscription")
+
+    def __contains__(self, code: str) -> bool:
+        """"""
+        return code in self.subscriptions
+
+    def __len__(self) -> int:
+        """"""
+        return len(self.subscriptions)
+
+    def get_streams(self, code: str) -> set:
+        """"""
+        return set(self.subscriptions.get(code, ()))
+
+    def touch(self, code: str):
+        """
+        Mark code as recently active.
+        """
+        with self.lock:
+            if code in self.subscriptions:
+                self.subscriptions.move_to_end(code)
+
+    def subscribe(self, items: dict) -> dict:
+        """
+        Subscribe {code: quote_type} and return {code: reason} of failures.
+        """
+        failed = {}
+        calls = []
+
+        with self.lock:
+            items = self.check_capacity(items, failed)
+
+            for code, quote_type in items.items():
+                current = self.subscriptions.get(code, ())
+                for stream in QUOTE_TYPE_STREAMS[quote_type]:
+                    if stream not in current:
+                        calls.append((code, stream))
+
+        results = self.run(self.subscribe_func, calls)
+
+        with self.lock:
+            for (code, stream), error in zip(calls, results):
+                if error:
+                    failed[code] = error
+                    continue
+                self.subscriptions.setdefault(code, set()).add(stream)
+
+            for code in items:
+                if code in self.subscriptions:
+                    self.subscriptions.move_to_end(code)
+
+            evicted = self.select_evictions(items)
+
+        if evicted:
+            self.unsubscribe({code: QUOTE_TYPE_BOTH for code in evicted})
+
+        return failed
+
+    def unsubscribe(self, items: dict) -> dict:
+        """
+        Unsubscribe {code: quote_type} and return {code: reason} of failures.
+        """
+        calls = []
+        with self.lock:
+            for code, quote_type in items.items():
+                current = self.subscriptions.get(code, ())
+                for stream in QUOTE_TYPE_STREAMS[quote_type]:
+                    if stream in current:
+                        calls.append((code, stream))
+
+        results = self.run(self.unsubscribe_func, calls)
+
+        failed = {}
+        with self.lock:
+            for (code, stream), error in zip(calls, results):
+                if error:
+                    failed[code] = error
+                    continue
+
+                streams = self.subscriptions.get(code, None)
+                if streams is None:
+                    continue
+                streams.discard(stream)
+                if not streams:
+                    del self.subscriptions[code]
+
+        return failed
+
+    def check_capacity(self, items: dict, failed: dict) -> dict:
+        """
+        Drop the new symbols that cannot fit even after evicting every
+        existing subscription outside of the batch.
+        """
+        if self.capacity <= 0:
+            return items
+
+        accepted = {}
+        new_count = 0
+        for code, quote_type in items.items():
+            if code not in self.subscriptions:
+                if new_count >= self.capacity:
+                    failed[code] = "超過訂閱上限"
+                    continue
+                new_count += 1
+            accepted[code] = quote_type
+        return accepted
+
+    def select_evictions(self, items: dict) -> list:
+        """
+        Least recently active symbols outside of items to unsubscribe after
+        adding them.
+        """
+        if self.capacity <= 0:
+            return []
+
+        overflow = len(self.subscriptions) - self.capacity
+        if overflow <= 0:
+            return []
+
+        evicted = []
+        for code in self.subscriptions:
+            if code in items:
+                continue
+            evicted.append(code)
+            if len(evicted) >= overflow:
+                break
+        return evicted
+
+    def run(self, func, calls: list) -> list:
+        """
+        Run func(code, stream) for every call and return the error message
+        of each one, or an empty string on success.
+        """
+        futures = [
+            self.executor.submit(self.call, func, code, stream)
+            for code, stream in calls
+        ]
+        return [future.result() for future in futures]
+
+    def call(self, func, code: str, stream: str) -> str:
+        """"""
+        self.limiter.acquire()
+        try:
+            func(code, stream)
+        except Exception as exc:
+            return str(exc) or type(exc).__name__
+        return ""
+
+    def close(self):
+        """"""
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,235 @@
+# encoding: UTF-8
+
+from datetime import date, datetime, timedelta
+from threading import Event, Lock, Thread
+from time import monotonic, monotonic_ns, sleep, time
+
+
+class TickConflator:
+    """
+    Coalesce tick updates so that every symbol is pushed at most once per
+    window. Updates arriving inside the window overwrite the pending state
+    and only the latest one is flushed. Trade prints may bypass the window
+    so that no traded volume is hidden from strategies.
+    """
+
+    def __init__(self, window_ms: float, emit, bypass_trades: bool = True):
+        """"""
+        self.window_ns = int(window_ms * 1_000_000)
+        self.emit = emit
+        self.bypass_trades = bypass_trades
+
+        self.lock = Lock()
+        self.last_emit = {}
+        self.pending = {}
+
+        self.emitted = 0
+        self.conflated = 0
+
+        self.stop_event = Event()
+        self.thread = None
+
+    def submit(self, tick, is_trade: bool):
+        """
+        Must be called with the lock held, right after the tick was updated.
+        """
+        symbol = tick.symbol
+        now = monotonic_ns()
+
+        if (is_trade and self.bypass_trades) or \
+                now - self.last_emit.get(symbol, 0) >= self.window_ns:
+            self.pending.pop(symbol, None)
+            self.last_emit[symbol] = now
+            self.emitted += 1
+            self.emit(tick)
+            return
+
+        if symbol in self.pending:
+            self.conflated += 1
+        self.pending[symbol] = tick
+
+    def flush(self):
+        """
+        Push every pending tick whose window has elapsed.
+        """
+        with self.lock:
+            if not self.pending:
+                return
+
+            now = monotonic_ns()
+            window_ns = self.window_ns
+            last_emit = self.last_emit
+
+            for symbol, tick in list(self.pending.items()):
+                if now - last_emit[symbol] < window_ns:
+                    continue
+                del self.pending[symbol]
+                last_emit[symbol] = now
+                self.emitted += 1
+                self.emit(tick)
+
+    def start(self):
+        """"""
+        self.stop_event.clear()
+        self.thread = Thread(target=self.run, name="SinopacConflator", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """"""
+        if not self.thread:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+    def run(self):
+        """"""
+        interval = max(self.window_ns / 1e9, 0.001)
+        while not self.stop_event.wait(interval):
+            self.flush()
+
+    def get_stats(self) -> dict:
+        """"""
+        return {
+            "window_ms": self.window_ns / 1_000_000,
+            "pending": len(self.pending),
+            "emitted": self.emitted,
+            "conflated": self.conflated,
+        }
+
+
+class TimestampDecoder:
+    """
+    Decode the Date/Time fields of Shioaji quotes without strptime.
+
+    Dates are parsed once and cached per trading day, the fixed format
+    HH:MM:SS.ffffff time field is sliced directly. Anything that does not
+    match the fixed format falls back to strptime so results and errors
+    stay identical.
+    """
+
+    max_cached_dates = 64
+
+    def __init__(self):
+        """"""
+        self.dates = {}
+
+        self.today = None
+        self.today_start = 0.0
+        self.today_end = 0.0
+
+    def decode(self, date_text: str, time_text: str) -> datetime:
+        """
+        Same as datetime.strptime(f"{date_text} {time_text}",
+        "%Y/%m/%d %H:%M:%S.%f").
+        """
+        ymd = self.dates.get(date_text, None)
+        if ymd is not None:
+            dt = self.parse_time(ymd, time_text)
+            if dt:
+                return dt
+
+        dt = datetime.strptime(
+            f"{date_text} {time_text}", "%Y/%m/%d %H:%M:%S.%f")
+
+        if len(self.dates) >= self.max_cached_dates:
+            self.dates.clear()
+        self.dates[date_text] = (dt.year, dt.month, dt.day)
+        return dt
+
+    def decode_today(self, time_text: str) -> datetime:
+        """
+        Same as datetime.combine(datetime.today(),
+        datetime.strptime(time_text, "%H:%M:%S.%f").time()).
+        """
+        now = time()
+        if now >= self.today_end or now < self.today_start:
+            self.update_today()
+
+        dt = self.parse_time(self.today, time_text)
+        if dt:
+            return dt
+
+        t = datetime.strptime(time_text, "%H:%M:%S.%f")
+        return datetime.combine(date(*self.today), t.time())
+
+    def update_today(self):
+        """"""
+        today = date.today()
+        start = datetime.combine(today, datetime.min.time())
+        self.today = (today.year, today.month, today.day)
+        self.today_start = start.timestamp()
+        self.today_end = (start + timedelta(days=1)).timestamp()
+
+    @staticmethod
+    def parse_time(ymd: tuple, text: str):
+        """
+        Fast path for the fixed HH:MM:SS.ffffff format, None otherwise.
+        isdigit() alone also accepts non-ASCII digits like "²".
+        """
+        if (
+            len(text) == 15
+            and text.isascii()
+            and text[2] == ":"
+            and text[5] == ":"
+            and text[8] == "."
+            and text[:2].isdigit()
+            and text[3:5].isdigit()
+            and text[6:8].isdigit()
+            and text[9:].isdigit()
+        ):
+            return datetime(
+                ymd[0], ymd[1], ymd[2],
+                int(text[:2]), int(text[3:5]), int(text[6:8]), int(text[9:])
+            )
+        return None
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket allowing rate calls per second with bursts
+    of up to burst calls. A rate of zero disables the limit.
+    """
+
+    def __init__(self, rate: float, burst: int = 0):
+        """"""
+        self.rate = rate
+        self.burst = burst or max(int(rate), 1)
+
+        self.tokens = float(self.burst)
+        self.timestamp = monotonic()
+        self.lock = Lock()
+
+    def acquire(self):
+        """
+        Block until a call is allowed.
+        """
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self.lock:
+                now = monotonic()
+                self.tokens = min(
+                    self.burst,
+                    self.tokens + (now - self.timestamp) * self.rate
+                )
+                self.timestamp = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+
+            sleep(wait)
+
+
+def snapshot(data):
+    """
+    Shallow copy of a vnpy data object, e.g. a tick handed to strategies
+    while the original keeps being updated. Same result as copy.copy for
+    these plain dataclasses without its generic __reduce_ex__ round trip.
+    """
+    new_data = object.__new__(data.__class__)
+    new_data.__dict__ = data.__dict__.copy()
+    return new_data
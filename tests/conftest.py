@@ -0,0 +1,74 @@
+# encoding: UTF-8
+"""
+The gateway imports vnpy and shioaji, fall back to the stand-ins of the
+benchmarks for whichever is not installed.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import shim  # noqa: E402
+
+shim.install()
+
+from vnpy.event import EventEngine  # noqa: E402
+
+from sinopac import SinopacGateway  # noqa: E402
+from sinopac.contract_snapshot import ContractRow, PRODUCT_FUTURES, PRODUCT_STOCK  # noqa: E402
+from sinopac.replay import ReplayShioaji  # noqa: E402
+
+
+CONTRACT_ROWS = [
+    ContractRow("TXFF9", "TXFF9", PRODUCT_FUTURES, "TXF", "201906", 1.0, 0, "", ""),
+    ContractRow("2330", "2330", PRODUCT_STOCK, "", "", 0.01, 0, "", ""),
+]
+
+
+class RecordingEngine(EventEngine):
+    """
+    Keep every event instead of dispatching it.
+    """
+
+    def __init__(self):
+        """"""
+        super().__init__()
+        self.events = []
+
+    def put(self, event):
+        """"""
+        self.events.append(event)
+
+    def get_data(self, type: str) -> list:
+        """"""
+        return [event.data for event in self.events if event.type == type]
+
+    def get_logs(self) -> list:
+        """"""
+        return [log.msg for log in self.get_data("eLog")]
+
+
+@pytest.fixture
+def make_gateway():
+    """
+    Factory of gateways on a ReplayShioaji knowing TXFF9 and 2330,
+    closed after the test. Keyword arguments go to ReplayShioaji.
+    """
+    gateways = []
+
+    def make(**kwargs):
+        api = ReplayShioaji(contracts=CONTRACT_ROWS, **kwargs)
+        engine = RecordingEngine()
+        gateway = SinopacGateway(engine, api=api)
+        gateway.contract_registry.load(CONTRACT_ROWS)
+        gateways.append(gateway)
+        return gateway, engine
+
+    yield make
+
+    for gateway in gateways:
+        gateway.close()
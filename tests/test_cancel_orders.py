@@ -0,0 +1,106 @@
+# encoding: UTF-8
+"""
+Cancels of orders still waiting to be placed are kept until place_order
+knows their seqno, the others are sent at once.
+"""
+
+from concurrent.futures import wait
+from time import monotonic, sleep
+
+from vnpy.trader.constant import Direction, Exchange, Offset, OrderType, Status
+from vnpy.trader.object import CancelRequest, OrderRequest
+
+
+def make_request(price: float = 100) -> OrderRequest:
+    """"""
+    return OrderRequest(
+        symbol="2330",
+        exchange=Exchange.TSE,
+        direction=Direction.LONG,
+        type=OrderType.LIMIT,
+        volume=1,
+        price=price,
+        offset=Offset.OPEN,
+    )
+
+
+def make_cancel(vt_orderid: str) -> CancelRequest:
+    """"""
+    return CancelRequest(orderid=vt_orderid.split(".")[-1], symbol="2330", exchange=Exchange.TSE)
+
+
+def get_statuses(engine) -> dict:
+    """
+    Last status of every orderid.
+    """
+    return {order.orderid: order.status for order in engine.get_data("eOrder.")}
+
+
+def wait_for(condition, timeout: float = 5):
+    """"""
+    end = monotonic() + timeout
+    while not condition():
+        assert monotonic() < end, "timed out"
+        sleep(0.01)
+
+
+def test_cancel_queued_async_order(make_gateway):
+    gateway, engine = make_gateway(latency=0.2)
+    gateway.init_order_pipeline({"非同步下單": "開啟"})
+
+    orderid = make_cancel(gateway.send_order(make_request())).orderid
+    assert gateway.cancel_orders([make_cancel(orderid)]) == []
+    assert orderid in gateway.pending_cancels
+
+    wait_for(lambda: get_statuses(engine)[orderid] == Status.CANCELLED)
+    assert not gateway.pending_cancels
+    assert not gateway.placing_orderids
+    assert not gateway.working_orders
+
+
+def test_cancel_batch_while_placing(make_gateway):
+    gateway, engine = make_gateway(latency=0.01)
+
+    vt_orderids = gateway.send_orders([make_request(100 + i) for i in range(20)])
+    sleep(0.01)
+    wait(gateway.cancel_orders([make_cancel(vt_orderid) for vt_orderid in vt_orderids]))
+
+    orderids = [make_cancel(vt_orderid).orderid for vt_orderid in vt_orderids]
+    wait_for(lambda: all(
+        get_statuses(engine).get(orderid, None) == Status.CANCELLED for orderid in orderids))
+    assert not gateway.pending_cancels
+    assert not gateway.working_orders
+    assert not any("撤單失敗" in log for log in engine.get_logs())
+
+
+def test_cancel_sync_order(make_gateway):
+    gateway, engine = make_gateway()
+
+    vt_orderid = gateway.send_order(make_request())
+    wait(gateway.cancel_orders([make_cancel(vt_orderid)]))
+
+    assert get_statuses(engine)[make_cancel(vt_orderid).orderid] == Status.CANCELLED
+
+
+def test_cancel_unknown_order(make_gateway):
+    gateway, engine = make_gateway()
+
+    assert gateway.cancel_orders([make_cancel("nope")]) == []
+    assert "撤單失敗[nope]. [查無委託]" in engine.get_logs()
+    assert not gateway.pending_cancels
+
+
+def test_cancel_rejected_order(make_gateway):
+    gateway, engine = make_gateway()
+
+    def reject(req):
+        raise RuntimeError("啟動步驟未完成[accounts]")
+
+    gateway.create_sj_order = reject
+    vt_orderid = gateway.send_order(make_request())
+    orderid = make_cancel(vt_orderid).orderid
+    assert get_statuses(engine)[orderid] == Status.REJECTED
+
+    assert gateway.cancel_orders([make_cancel(vt_orderid)]) == []
+    assert f"撤單失敗[{orderid}]. [查無委託]" in engine.get_logs()
+    assert not gateway.pending_cancels
@@ -0,0 +1,54 @@
+# encoding: UTF-8
+
+from datetime import datetime
+
+from sinopac.contract_snapshot import (
+    ContractRow,
+    ContractSnapshot,
+    get_trading_session,
+    PRODUCT_STOCK
+)
+from sinopac.replay import ReplayShioaji
+
+
+ROWS = [
+    ContractRow("2330", "2330", PRODUCT_STOCK, "", "", 0.01, 0, "", ""),
+    ContractRow("2317", "2317", PRODUCT_STOCK, "", "", 0.01, 0, "", ""),
+]
+
+
+def test_trading_session():
+    assert get_trading_session(datetime(2019, 5, 16, 8, 45)) == "20190516-day"
+    assert get_trading_session(datetime(2019, 5, 16, 14, 59)) == "20190516-day"
+    assert get_trading_session(datetime(2019, 5, 16, 15, 0)) == "20190516-night"
+    assert get_trading_session(datetime(2019, 5, 16, 23, 59)) == "20190516-night"
+    assert get_trading_session(datetime(2019, 5, 17, 4, 59)) == "20190516-night"
+    assert get_trading_session(datetime(2019, 5, 17, 5, 0)) == "20190517-day"
+
+
+def test_load_same_session_only(tmp_path):
+    snapshot = ContractSnapshot(tmp_path / "contracts.pkl")
+    assert snapshot.load("20190516-day") is None
+
+    snapshot.save("20190516-day", ROWS)
+    assert snapshot.load("20190516-day") == ROWS
+    assert snapshot.load("20190516-night") is None
+
+
+def test_empty_snapshot_is_missing(tmp_path):
+    snapshot = ContractSnapshot(tmp_path / "contracts.pkl")
+    snapshot.save("20190516-day", [])
+    assert snapshot.load("20190516-day") is None
+
+
+def test_empty_contracts_not_saved(make_gateway, tmp_path):
+    gateway, engine = make_gateway()
+    gateway.api = ReplayShioaji()
+    gateway.contract_snapshot = ContractSnapshot(tmp_path / "contracts.pkl")
+
+    gateway.query_contract()
+    assert not (tmp_path / "contracts.pkl").exists()
+
+    gateway.api = ReplayShioaji(contracts=ROWS)
+    gateway.query_contract()
+    assert gateway.contract_snapshot.load(get_trading_session()) == ROWS
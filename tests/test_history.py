@@ -0,0 +1,65 @@
+# encoding: UTF-8
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+
+from sinopac.history import HistoryLoader, KIND_TICK, day_volume_sum
+
+
+SECOND = 1_000_000_000
+
+
+def to_ns(dt: datetime) -> int:
+    """"""
+    return int(np.datetime64(dt, "ns").astype(np.int64))
+
+
+def make_loader(ticks: dict) -> HistoryLoader:
+    """
+    ticks: {day: [(ts, close, volume)]}
+    """
+    def fetch(kind, symbol, day):
+        rows = ticks.get(day, [])
+        return SimpleNamespace(
+            ts=[row[0] for row in rows],
+            close=[row[1] for row in rows],
+            volume=[row[2] for row in rows],
+        )
+
+    return HistoryLoader(fetch)
+
+
+def test_same_ts_ticks_kept():
+    t = to_ns(datetime(2019, 5, 16, 9, 0))
+    day = datetime(2019, 5, 16).date()
+    loader = make_loader({day: [(t, 100, 5), (t, 101, 7), (t + SECOND, 102, 9)]})
+
+    ts, values = loader.load(
+        KIND_TICK, "2330", datetime(2019, 5, 16), datetime(2019, 5, 16, 23, 59))
+    loader.close()
+
+    assert ts.tolist() == [t, t, t + SECOND]
+    assert values[:, 0].tolist() == [100, 101, 102]
+    assert day_volume_sum(ts, values[:, 1]).tolist() == [5, 12, 21]
+
+
+def test_overlap_of_adjacent_days_dropped():
+    first = datetime(2019, 5, 16).date()
+    second = datetime(2019, 5, 17).date()
+    night = to_ns(datetime(2019, 5, 16, 23, 0))
+    morning = to_ns(datetime(2019, 5, 17, 9, 0))
+
+    # The second day repeats the night session ticks of the first one
+    loader = make_loader({
+        first: [(night, 100, 1), (night, 101, 2)],
+        second: [(night, 100, 1), (night, 101, 2), (morning, 102, 3), (morning, 103, 4)],
+    })
+
+    ts, values = loader.load(
+        KIND_TICK, "TXFF9", datetime(2019, 5, 16), datetime(2019, 5, 17, 23, 59))
+    loader.close()
+
+    assert ts.tolist() == [night, night, morning, morning]
+    assert values[:, 0].tolist() == [100, 101, 102, 103]
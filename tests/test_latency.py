@@ -0,0 +1,43 @@
+# encoding: UTF-8
+
+import os
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from sinopac.latency import LatencyMonitor
+from sinopac.utility import TimestampDecoder
+
+
+# 2019/05/16 09:00:00 in Taipei
+EXCHANGE_NS = 1557968400 * 1_000_000_000
+
+
+@pytest.fixture(params=["UTC", "America/New_York", "Asia/Taipei"])
+def host_timezone(request):
+    """"""
+    if not hasattr(time, "tzset"):
+        pytest.skip("time.tzset is not available")
+
+    previous = os.environ.get("TZ", None)
+    os.environ["TZ"] = request.param
+    time.tzset()
+    yield request.param
+
+    if previous is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = previous
+    time.tzset()
+
+
+def test_exchange_time_is_taipei(host_timezone):
+    monitor = LatencyMonitor(TimestampDecoder())
+
+    tick = SimpleNamespace(datetime=datetime(2019, 5, 16, 9, 0))
+    assert monitor.get_exchange_ns("L", tick, {}) == EXCHANGE_NS
+
+    data = {"Date": "2019/05/16", "Time": "09:00:00.000000"}
+    assert monitor.get_exchange_ns("Q", tick, data) == EXCHANGE_NS
@@ -0,0 +1,71 @@
+# encoding: UTF-8
+
+from datetime import datetime
+from threading import Event, Thread
+from types import SimpleNamespace
+
+from sinopac.contract_snapshot import ContractRow, PRODUCT_OPTION
+from sinopac import option_chain
+from sinopac.option_chain import OptionChainEngine, get_expiry
+from sinopac.replay import ReplayShioaji
+
+
+def make_option(code: str, delivery_month: str, strike: float = 17000) -> ContractRow:
+    """"""
+    return ContractRow(code, code, PRODUCT_OPTION, "TXO", delivery_month, 0.1, strike, "", "C")
+
+
+def test_get_expiry():
+    assert get_expiry("202611") == datetime(2026, 11, 18, 13, 30)
+    assert get_expiry("202611W1") == datetime(2026, 11, 4, 13, 30)
+
+
+def test_invalid_delivery_month_skipped():
+    errors = []
+    engine = OptionChainEngine(on_error=lambda code, exc: errors.append(code))
+
+    engine.add(make_option("TXO17000X", ""))
+    engine.add(make_option("TXO17000Y", "202613"))
+    engine.add(make_option("TXO17000K6", "202611"))
+
+    assert errors == ["TXO17000X", "TXO17000Y"]
+    assert list(engine.index) == ["TXO17000K6"]
+
+
+def test_subscribe_with_invalid_delivery_month(make_gateway):
+    gateway, engine = make_gateway()
+    row = make_option("TXO17000X", "")
+    gateway.contract_registry.add(row)
+    gateway.api = ReplayShioaji(contracts=[row])
+    gateway.init_option_chain({"選擇權鏈": "開啟"})
+
+    gateway.subscribe_quote(row.code, "tick")
+
+    assert any(log.startswith("選擇權鏈略過[TXO17000X]") for log in engine.get_logs())
+    assert gateway.api.quote.subscriptions
+
+
+def test_quote_kept_while_adding(monkeypatch):
+    engine = OptionChainEngine()
+    engine.add(make_option("TXO0", "202611", 0))
+    quote = SimpleNamespace(bid_price_1=1.0, ask_price_1=2.0, last_price=1.5)
+
+    # Let a quote arrive once add() copied bid but before it replaces it
+    quoted = Event()
+    append = option_chain.np.append
+    calls = []
+
+    def slow_append(array, values):
+        result = append(array, values)
+        calls.append(array)
+        if len(calls) == 3:
+            Thread(target=lambda: (engine.update("TXO0", quote, 17000), quoted.set())).start()
+            quoted.wait(0.2)
+        return result
+
+    monkeypatch.setattr(option_chain.np, "append", slow_append)
+    engine.add(make_option("TXO1", "202611", 1))
+    assert quoted.wait(1)
+
+    chain = engine.chains[("TXO", "202611")]
+    assert (chain.bid[0], chain.ask[0], chain.last[0]) == (1.0, 2.0, 1.5)
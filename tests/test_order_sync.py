@@ -0,0 +1,83 @@
+# encoding: UTF-8
+"""
+query_trade emits one trade per increase of the deal quantity and one
+order update per change of (status, deal quantity).
+"""
+
+from vnpy.trader.constant import Direction, Exchange, Offset, OrderType, Status
+from vnpy.trader.object import OrderRequest
+
+
+def make_request(volume: int = 3) -> OrderRequest:
+    """"""
+    return OrderRequest(
+        symbol="2330",
+        exchange=Exchange.TSE,
+        direction=Direction.LONG,
+        type=OrderType.LIMIT,
+        volume=volume,
+        price=100,
+        offset=Offset.OPEN,
+    )
+
+
+def count_updates(engine) -> int:
+    """
+    Order and trade events, logs are written by a background thread.
+    """
+    return len(engine.get_data("eOrder.")) + len(engine.get_data("eTrade."))
+
+
+def test_one_trade_per_fill(make_gateway):
+    gateway, engine = make_gateway(fill_on_update=True, fill_quantity=1)
+    orderid = gateway.send_order(make_request(3)).split(".")[1]
+
+    for _ in range(3):
+        gateway.query_trade()
+
+    trades = engine.get_data("eTrade.")
+    assert [trade.volume for trade in trades] == [1, 1, 1]
+    assert len({trade.tradeid for trade in trades}) == 3
+    assert {trade.orderid for trade in trades} == {orderid}
+
+    orders = [order for order in engine.get_data("eOrder.") if order.orderid == orderid]
+    assert [order.traded for order in orders[1:]] == [1, 2, 3]
+    assert orders[-1].status == Status.ALLTRADED
+    assert not gateway.working_orders
+
+
+def test_partial_fill_increments(make_gateway):
+    gateway, engine = make_gateway(fill_on_update=True, fill_quantity=2)
+    gateway.send_order(make_request(5))
+
+    for _ in range(3):
+        gateway.query_trade()
+
+    trades = engine.get_data("eTrade.")
+    assert [trade.volume for trade in trades] == [2, 2, 1]
+    assert len({trade.tradeid for trade in trades}) == 3
+    assert [order.status for order in engine.get_data("eOrder.")[1:]] == [
+        Status.PARTTRADED, Status.PARTTRADED, Status.ALLTRADED]
+
+
+def test_no_emit_when_unchanged(make_gateway):
+    gateway, engine = make_gateway()
+    gateway.send_order(make_request(3))
+
+    gateway.query_trade()
+    count = count_updates(engine)
+    assert engine.get_data("eOrder.")[-1].status == Status.NOTTRADED
+
+    gateway.query_trade()
+    gateway.query_trade()
+    assert count_updates(engine) == count
+
+    # Nor once the order is done
+    gateway.api.fill_on_update = True
+    gateway.api.fill_quantity = 3
+    gateway.query_trade()
+    count = count_updates(engine)
+    gateway.query_trade()
+    assert count_updates(engine) == count
+    assert len(engine.get_data("eTrade.")) == 1
+    assert engine.get_data("eOrder.")[-1].status == Status.ALLTRADED
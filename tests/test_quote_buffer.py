@@ -0,0 +1,64 @@
+# encoding: UTF-8
+"""
+Conflation only applies once the buffer is full and never to trade prints.
+"""
+
+from sinopac.quote_buffer import POLICY_CONFLATE, QuoteRingBuffer
+
+
+def drain(buffer: QuoteRingBuffer) -> list:
+    """"""
+    return [(topic, data) for _, topic, data in buffer.get_batch(1000, timeout=0)]
+
+
+def test_no_conflation_below_capacity():
+    buffer = QuoteRingBuffer(8, POLICY_CONFLATE)
+    for i in range(3):
+        buffer.put(i, "Q/TFE/TXFF9", i)
+
+    assert drain(buffer) == [("Q/TFE/TXFF9", 0), ("Q/TFE/TXFF9", 1), ("Q/TFE/TXFF9", 2)]
+    assert buffer.conflated == 0
+
+
+def test_conflation_when_full():
+    buffer = QuoteRingBuffer(3, POLICY_CONFLATE)
+    buffer.put(0, "Q/TFE/TXFF9", 0)
+    buffer.put(1, "Q/TFE/TXFF9", 1)
+    buffer.put(2, "QUT/idcdmzpcr01/TSE/2330", 2)
+    buffer.put(3, "Q/TFE/TXFF9", 3)
+
+    # The latest pending Q payload is replaced, the older one is kept
+    assert drain(buffer) == [
+        ("Q/TFE/TXFF9", 0),
+        ("Q/TFE/TXFF9", 3),
+        ("QUT/idcdmzpcr01/TSE/2330", 2),
+    ]
+    assert buffer.conflated == 1
+    assert buffer.dropped == 0
+    assert not buffer.pending
+
+
+def test_trade_prints_never_conflated():
+    buffer = QuoteRingBuffer(2, POLICY_CONFLATE)
+    buffer.put(0, "L/TFE/TXFF9", 0)
+    buffer.put(1, "MKT/idcdmzpcr01/TSE/2330", 1)
+    buffer.put(2, "L/TFE/TXFF9", 2)
+    buffer.put(3, "MKT/idcdmzpcr01/TSE/2330", 3)
+
+    assert drain(buffer) == [("L/TFE/TXFF9", 2), ("MKT/idcdmzpcr01/TSE/2330", 3)]
+    assert buffer.conflated == 0
+    assert buffer.dropped == 2
+
+
+def test_dropped_entry_keeps_newer_pending():
+    buffer = QuoteRingBuffer(2, POLICY_CONFLATE)
+    buffer.put(0, "Q/TFE/TXFF9", 0)
+    buffer.put(1, "Q/TFE/TXFF9", 1)
+    buffer.put(2, "Q/TFE/TXFF9", 2)
+    buffer.put(3, "QUT/idcdmzpcr01/TSE/2330", 3)
+    buffer.put(4, "Q/TFE/TXFF9", 4)
+
+    # Dropping Q 0 must not forget the pending Q that replaced Q 1
+    assert drain(buffer) == [("Q/TFE/TXFF9", 4), ("QUT/idcdmzpcr01/TSE/2330", 3)]
+    assert buffer.conflated == 2
+    assert buffer.dropped == 1
@@ -0,0 +1,149 @@
+# encoding: UTF-8
+"""
+TimestampDecoder must return the same datetimes as strptime and raise
+ValueError wherever strptime does.
+"""
+
+from datetime import date, datetime, timedelta
+from time import time
+
+import pytest
+
+from sinopac.utility import TimestampDecoder
+
+
+DATES = [
+    "2019/05/16",
+    "2019/12/31",
+    "2020/01/01",
+    "2020/02/28",
+    "2020/02/29",
+    "2020/03/01",
+    "2021/1/5",
+]
+
+TIMES = [
+    "00:00:00.000000",
+    "08:45:00.000001",
+    "11:15:11.911000",
+    "13:44:59.999999",
+    "23:59:59.999999",
+    "09:53:00.706928",
+    "9:53:00.706928",
+    "09:53:00.7",
+    "09:53:00.70692",
+]
+
+MALFORMED_TIMES = [
+    "",
+    "09:53:00",
+    "09:53:00.",
+    "24:00:00.000000",
+    "09:60:00.000000",
+    "09:53:61.000000",
+    "09-53-00.706928",
+    "09:53:00,706928",
+    "09:53:00.70692x",
+    "0²:53:00.706928",
+    "09:53:00.７06928",
+    "09:53:00.7069281",
+]
+
+MALFORMED_DATES = [
+    "2019/02/29",
+    "2019/13/01",
+    "2019-05-16",
+    "",
+]
+
+
+def strptime_decode(date_text: str, time_text: str) -> datetime:
+    """"""
+    return datetime.strptime(f"{date_text} {time_text}", "%Y/%m/%d %H:%M:%S.%f")
+
+
+def strptime_decode_today(time_text: str) -> datetime:
+    """"""
+    t = datetime.strptime(time_text, "%H:%M:%S.%f")
+    return datetime.combine(datetime.today(), t.time())
+
+
+@pytest.mark.parametrize("date_text", DATES)
+@pytest.mark.parametrize("time_text", TIMES)
+def test_decode(date_text, time_text):
+    decoder = TimestampDecoder()
+    expected = strptime_decode(date_text, time_text)
+
+    # First call fills the date cache, the second one takes the fast path
+    assert decoder.decode(date_text, time_text) == expected
+    assert decoder.decode(date_text, time_text) == expected
+
+
+@pytest.mark.parametrize("time_text", TIMES)
+def test_decode_today(time_text):
+    decoder = TimestampDecoder()
+    assert decoder.decode_today(time_text) == strptime_decode_today(time_text)
+
+
+@pytest.mark.parametrize("time_text", MALFORMED_TIMES)
+def test_malformed_time(time_text):
+    decoder = TimestampDecoder()
+    decoder.decode("2019/05/16", "09:00:00.000000")
+
+    with pytest.raises(ValueError):
+        strptime_decode("2019/05/16", time_text)
+    with pytest.raises(ValueError):
+        decoder.decode("2019/05/16", time_text)
+    with pytest.raises(ValueError):
+        decoder.decode_today(time_text)
+
+
+@pytest.mark.parametrize("date_text", MALFORMED_DATES)
+def test_malformed_date(date_text):
+    decoder = TimestampDecoder()
+
+    with pytest.raises(ValueError):
+        strptime_decode(date_text, "09:00:00.000000")
+    with pytest.raises(ValueError):
+        decoder.decode(date_text, "09:00:00.000000")
+    assert date_text not in decoder.dates
+
+
+def test_leading_space():
+    """
+    Valid after the date (a space in the format matches any whitespace),
+    invalid on its own.
+    """
+    decoder = TimestampDecoder()
+    time_text = " 9:53:00.706928"
+    assert decoder.decode("2019/05/16", time_text) == strptime_decode("2019/05/16", time_text)
+
+    with pytest.raises(ValueError):
+        strptime_decode_today(time_text)
+    with pytest.raises(ValueError):
+        decoder.decode_today(time_text)
+
+
+def test_day_rollover():
+    decoder = TimestampDecoder()
+    decoder.decode_today("09:00:00.000000")
+
+    # Pretend the cached day ended a second ago
+    yesterday = date.today() - timedelta(days=1)
+    decoder.today = (yesterday.year, yesterday.month, yesterday.day)
+    decoder.today_end = time() - 1
+
+    time_text = "00:00:00.000001"
+    assert decoder.decode_today(time_text) == strptime_decode_today(time_text)
+    assert decoder.today == tuple(date.today().timetuple()[:3])
+
+
+def test_date_cache_eviction():
+    decoder = TimestampDecoder()
+    start = date(2019, 1, 1)
+
+    for i in range(decoder.max_cached_dates * 2 + 1):
+        date_text = (start + timedelta(days=i)).strftime("%Y/%m/%d")
+        time_text = TIMES[i % len(TIMES)]
+        assert decoder.decode(date_text, time_text) == strptime_decode(date_text, time_text)
+        assert len(decoder.dates) <= decoder.max_cached_dates